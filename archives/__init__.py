@@ -0,0 +1,325 @@
+import os
+import shutil
+import subprocess
+import tarfile
+import threading
+import time
+import zipfile
+import zlib
+
+from System.operations import (
+    CHUNK_SIZE, CANCELLED, FAILED, FileOperation, JobCancelled, describe_paths, is_directory, queue_paths,
+    tree_size
+)
+from System.shared import format_size, is_inside
+
+TAR_GZ = 'tar.gz'
+TAR_ZST = 'tar.zst'
+ZIP = 'zip'
+FORMATS = [TAR_GZ, TAR_ZST, ZIP]
+# Расширения, по которым архив узнаётся при распаковке
+EXTENSIONS = {'.tar.gz': TAR_GZ, '.tgz': TAR_GZ, '.tar.zst': TAR_ZST, '.tzst': TAR_ZST, '.zip': ZIP}
+# Внешние многопоточные компрессоры: сжатие идёт в отдельном процессе на всех ядрах, tar только пишет поток
+COMPRESSORS = {
+    TAR_GZ: (['pigz', '-c'], ['pigz', '-dc']),
+    TAR_ZST: (['zstd', '-T0', '-q', '-c'], ['zstd', '-dc', '-q']),
+}
+
+
+def archive_format(path):
+    lowered = path.lower()
+    for suffix, format_name in EXTENSIONS.items():
+        if lowered.endswith(suffix):
+            return format_name
+    return None
+
+
+def strip_archive_extension(name):
+    for suffix in EXTENSIONS:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def compressor(format_name, decompress=False):
+    command = COMPRESSORS.get(format_name, (None, None))[decompress]
+    if command is None or shutil.which(command[0]) is None:
+        return None
+    return command
+
+
+def copy_stream(source, destination, job):
+    while True:
+        job.check()
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        destination.write(chunk)
+        job.advance(len(chunk))
+
+
+class ProgressReader:
+    # Файловый объект-обёртка: прочитанные байты идут в прогресс операции, между блоками проверяются пауза и отмена
+    def __init__(self, file, job, counted=True):
+        self.file = file
+        self.job = job
+        # Для распакованного потока прогресс уже считает подача архива декомпрессору
+        self.counted = counted
+
+    def read(self, size=-1):
+        self.job.check()
+        data = self.file.read(size)
+        if self.counted:
+            self.job.advance(len(data))
+        return data
+
+
+class ArchiveOperation(FileOperation):
+    def __init__(self, manager):
+        super().__init__(manager)
+        self.started = None
+        self.process = None
+
+    def run(self):
+        self.started = time.monotonic()
+        super().run()
+
+    def wait_process(self):
+        process, self.process = self.process, None
+        if process is None:
+            return
+        if self.cancelled.is_set():
+            process.kill()
+        error = process.stderr.read().decode(errors='replace').strip()
+        if process.wait() and not self.cancelled.is_set():
+            raise OSError(f'{process.args[0]}: {error or process.returncode}')
+
+    def throughput(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return f'{format_size(self.done_bytes / elapsed)}/с' if elapsed else ''
+
+
+class CompressJob(ArchiveOperation):
+    title = 'Сжатие'
+
+    def __init__(self, manager, sources, archive_path, format_name):
+        super().__init__(manager)
+        self.sources = sources
+        self.archive_path = archive_path
+        self.format_name = format_name
+
+    def prepare(self):
+        self.total_bytes = sum(tree_size(source) for source in self.sources)
+
+    def entries(self):
+        for source in self.sources:
+            base = os.path.dirname(source)
+            yield source, os.path.relpath(source, base)
+            if not is_directory(source):
+                continue
+            for dir_path, dir_names, file_names in os.walk(source):
+                dir_names.sort()
+                for name in dir_names + sorted(file_names):
+                    path = os.path.join(dir_path, name)
+                    yield path, os.path.relpath(path, base)
+
+    def execute(self):
+        # Архив пишется под временным именем и появляется на месте только целиком
+        temporary = os.path.join(os.path.dirname(self.archive_path), f'.{os.path.basename(self.archive_path)}.part')
+        try:
+            with open(temporary, 'wb') as archive_file:
+                if self.format_name == ZIP:
+                    self.write_zip(archive_file)
+                else:
+                    self.write_tar(archive_file)
+        except BaseException:
+            if os.path.lexists(temporary):
+                os.remove(temporary)
+            raise
+        os.rename(temporary, self.archive_path)
+        self.changed_paths.append(self.archive_path)
+
+    def write_tar(self, archive_file):
+        command = compressor(self.format_name)
+        if command is None and self.format_name == TAR_ZST:
+            raise OSError('Для tar.zst нужна программа zstd')
+
+        if command is not None:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=archive_file,
+                                            stderr=subprocess.PIPE)
+            stream, mode = self.process.stdin, 'w|'
+        else:
+            # pigz не установлен: gzip в этом потоке, zlib отпускает GIL на время сжатия
+            stream, mode = archive_file, 'w|gz'
+
+        try:
+            with tarfile.open(fileobj=stream, mode=mode) as tar:
+                for path, name in self.entries():
+                    self.check()
+                    info = tar.gettarinfo(path, name)
+                    if info is None:
+                        continue
+                    if info.isreg():
+                        # Файл открывается до записи заголовка: недоступный файл пропускается, не портя архив
+                        try:
+                            source = open(path, 'rb')
+                        except OSError as error:
+                            self.errors.append(f'{path}: {error.strerror}')
+                            continue
+                        self.start_file(path, info.size)
+                        with source:
+                            tar.addfile(info, ProgressReader(source, self))
+                    else:
+                        tar.addfile(info)
+                        if info.issym():
+                            self.advance(os.lstat(path).st_size)
+        finally:
+            if self.process is not None:
+                # Закрытый вход - сигнал компрессору дописать архив и выйти
+                if not self.process.stdin.closed:
+                    try:
+                        self.process.stdin.close()
+                    except BrokenPipeError:
+                        pass
+                self.wait_process()
+
+    def write_zip(self, archive_file):
+        # Для zip сжатие идёт по одному файлу в этом потоке: готовые блоки каждого файла пишутся сразу в архив
+        with zipfile.ZipFile(archive_file, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for path, name in self.entries():
+                self.check()
+                if os.path.islink(path) and is_directory(os.path.realpath(path)):
+                    continue
+                try:
+                    info = zipfile.ZipInfo.from_file(path, name)
+                    if info.is_dir():
+                        archive.writestr(info, b'')
+                        continue
+                    source = open(path, 'rb')
+                except OSError as error:
+                    self.errors.append(f'{path}: {error.strerror}')
+                    continue
+                info.compress_type = zipfile.ZIP_DEFLATED
+                self.start_file(path, info.file_size)
+                with source, archive.open(info, 'w', force_zip64=True) as destination:
+                    copy_stream(source, destination, self)
+
+    def report(self):
+        names = describe_paths(self.sources)
+        paths = queue_paths(self.sources)
+        if self.state == CANCELLED:
+            return f"COMPRESS_CANCELLED|{paths}", f"Сжатие {names} отменено.", "../logs/actions.log"
+        if self.state == FAILED:
+            return (f"COMPRESS_FAILED|{paths}", f"Сжатие {names} завершено с ошибками: {len(self.errors)}.",
+                    "../logs/actions.log")
+        return (f"COMPRESS_ITEM|{paths}|{self.archive_path}",
+                f"{names} сжато в {os.path.basename(self.archive_path)}: {format_size(self.done_bytes)} -> "
+                f"{format_size(os.path.getsize(self.archive_path))}, {self.throughput()}.", "../logs/actions.log")
+
+
+class ExtractJob(ArchiveOperation):
+    title = 'Распаковка'
+
+    def __init__(self, manager, archive_path, destination):
+        super().__init__(manager)
+        self.archive_path = archive_path
+        self.destination = destination
+        self.format_name = archive_format(archive_path)
+
+    def prepare(self):
+        if self.format_name == ZIP:
+            try:
+                with zipfile.ZipFile(self.archive_path) as archive:
+                    self.total_bytes = sum(info.file_size for info in archive.infolist())
+            except zipfile.BadZipFile as error:
+                raise OSError(f'{self.archive_path}: {error}')
+        else:
+            # В потоковом tar размер содержимого заранее неизвестен, прогресс идёт по прочитанной части архива
+            self.total_bytes = os.path.getsize(self.archive_path)
+
+    def execute(self):
+        os.makedirs(self.destination)
+        self.changed_paths.append(self.destination)
+        try:
+            try:
+                if self.format_name == ZIP:
+                    self.read_zip()
+                else:
+                    self.read_tar()
+            except (tarfile.TarError, zipfile.BadZipFile, RuntimeError, zlib.error, NotImplementedError,
+                    EOFError) as error:
+                # Оборванный при отмене поток tar выглядит как повреждённый архив. Зашифрованный zip и
+                # неподдерживаемый метод сжатия дают RuntimeError и NotImplementedError, битые данные - zlib.error
+                self.check()
+                raise OSError(f'{self.archive_path}: {error}')
+        except BaseException:
+            # Наполовину распакованный каталог не оставляем ни при отмене, ни при ошибке
+            shutil.rmtree(self.destination, ignore_errors=True)
+            raise
+
+    def feed(self, archive_file, stdin):
+        # Архив подаётся декомпрессору отдельным потоком: этот поток тем временем читает распакованный tar
+        try:
+            with stdin:
+                copy_stream(archive_file, stdin, self)
+        except (JobCancelled, OSError):
+            pass
+
+    def read_tar(self):
+        command = compressor(self.format_name, decompress=True)
+        if command is None and self.format_name == TAR_ZST:
+            raise OSError('Для tar.zst нужна программа zstd')
+
+        with open(self.archive_path, 'rb') as archive_file:
+            feeder = None
+            if command is not None:
+                self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                stderr=subprocess.PIPE)
+                feeder = threading.Thread(target=self.feed, args=(archive_file, self.process.stdin), daemon=True)
+                feeder.start()
+                stream, mode = ProgressReader(self.process.stdout, self, counted=False), 'r|'
+            else:
+                stream, mode = ProgressReader(archive_file, self), 'r|gz'
+
+            try:
+                with tarfile.open(fileobj=stream, mode=mode) as tar:
+                    for member in tar:
+                        self.check()
+                        self.start_file(member.name, 0)
+                        try:
+                            # Фильтр data отбрасывает абсолютные пути, выход за каталог через .. и опасные ссылки
+                            tar.extract(member, self.destination, filter='data')
+                        except tarfile.FilterError as error:
+                            self.errors.append(f'{member.name}: {error}')
+            finally:
+                if self.process is not None:
+                    self.process.stdout.close()
+                    self.wait_process()
+                if feeder is not None:
+                    feeder.join()
+
+    def read_zip(self):
+        with zipfile.ZipFile(self.archive_path) as archive:
+            for info in archive.infolist():
+                self.check()
+                target = os.path.normpath(os.path.join(self.destination, info.filename))
+                if not is_inside(target, self.destination):
+                    self.errors.append(f'{info.filename}: путь выходит за каталог распаковки')
+                    continue
+                if info.is_dir():
+                    os.makedirs(target, exist_ok=True)
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                self.start_file(target, info.file_size)
+                with archive.open(info) as source, open(target, 'wb') as destination:
+                    copy_stream(source, destination, self)
+
+    def report(self):
+        name = os.path.basename(self.archive_path)
+        if self.state == CANCELLED:
+            return f"EXTRACT_CANCELLED|{self.archive_path}", f"Распаковка {name} отменена.", "../logs/actions.log"
+        if self.state == FAILED:
+            return (f"EXTRACT_FAILED|{self.archive_path}",
+                    f"Распаковка {name} завершена с ошибками: {len(self.errors)}.", "../logs/actions.log")
+        return (f"EXTRACT_ITEM|{self.archive_path}|{self.destination}",
+                f"Архив {name} распакован в {self.destination}, {self.throughput()}.", "../logs/actions.log")
@@ -0,0 +1,264 @@
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Бенчмарк запускается без дисплея
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from System.shared import directory_size, estimate_directory_size, format_size, scan_directory_sizes
+
+REPAINTS = 50
+MODEL_TIMEOUT = 120.0
+COPY_SIZE = 256 * 1024 ** 2
+
+
+def create_deep_tree(root, scale):
+    # Одна длинная цепочка каталогов с несколькими файлами на каждом уровне
+    path = root
+    for level in range(int(200 * scale)):
+        path = os.path.join(path, f'level{level}')
+        os.makedirs(path)
+        for i in range(5):
+            with open(os.path.join(path, f'file{i}.txt'), 'wb') as f:
+                f.write(b'x' * 512)
+
+
+def create_wide_tree(root, scale):
+    for directory in range(int(2000 * scale)):
+        path = os.path.join(root, f'dir{directory}')
+        os.makedirs(path)
+        for i in range(5):
+            with open(os.path.join(path, f'file{i}.txt'), 'wb') as f:
+                f.write(b'x' * 512)
+
+
+def create_small_files_tree(root, scale):
+    for directory in range(50):
+        path = os.path.join(root, f'dir{directory}')
+        os.makedirs(path)
+        for i in range(int(400 * scale)):
+            with open(os.path.join(path, f'file{i}.txt'), 'wb') as f:
+                f.write(b'x' * 64)
+
+
+def create_huge_files_tree(root, scale):
+    # Разреженные файлы: размер большой, а места на диске почти не занимают
+    for i in range(max(1, int(8 * scale))):
+        with open(os.path.join(root, f'huge{i}.bin'), 'wb') as f:
+            f.truncate(2 * 1024 ** 3)
+
+
+TREES = {
+    'deep': create_deep_tree,
+    'wide': create_wide_tree,
+    'small_files': create_small_files_tree,
+    'huge_files': create_huge_files_tree,
+}
+
+
+def count_entries(root):
+    return sum(len(dir_names) + len(file_names) for _, dir_names, file_names in os.walk(root))
+
+
+def measure(func, *args, trace_memory=True):
+    if not trace_memory:
+        started = time.perf_counter()
+        result = func(*args)
+        return result, time.perf_counter() - started, 0
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def report(tree, name, elapsed, peak, entries):
+    throughput = entries / elapsed if elapsed else float('inf')
+    print(f"{tree:<12} {name:<28} {elapsed * 1000:>10.1f} ms {throughput:>14,.0f} entries/s "
+          f"{format_size(peak):>10} peak")
+
+
+def bench_sizing(tree, root, entries):
+    for name, func in [('directory_size', directory_size),
+                       ('scan_directory_sizes', scan_directory_sizes),
+                       ('estimate_directory_size', lambda path: estimate_directory_size(path, 0.5))]:
+        _, elapsed, peak = measure(func, root)
+        report(tree, name, elapsed, peak, entries)
+
+
+def bench_format_size():
+    sizes = [17 ** (i % 16) for i in range(200000)]
+    _, elapsed, peak = measure(lambda: [format_size(size) for size in sizes])
+    report('-', 'format_size', elapsed, peak, len(sizes))
+
+
+def bench_copy(scale, directory=None):
+    from System.operations import CopyJob
+
+    root = tempfile.mkdtemp(prefix='superapp-bench-copy-', dir=directory)
+    try:
+        source = os.path.join(root, 'source.bin')
+        with open(source, 'wb') as f:
+            for _ in range(max(1, int(COPY_SIZE * scale) // (1024 ** 2))):
+                f.write(os.urandom(1024 ** 2))
+        size = os.path.getsize(source)
+
+        def engine_copy(destination_folder):
+            os.makedirs(destination_folder)
+            job = CopyJob(None, [source], destination_folder)
+            job.execute()
+
+        def user_space_copy(destination_folder):
+            # Только чтение блоками - как было до копирования в ядре
+            import System.operations as operations
+            saved = operations.copy_range, operations.send_file, operations.reflink
+            operations.copy_range = operations.send_file = lambda _source, _destination, offset, _size, _job: offset
+            operations.reflink = lambda _source, _destination: False
+            try:
+                engine_copy(destination_folder)
+            finally:
+                operations.copy_range, operations.send_file, operations.reflink = saved
+
+        for name, func in [('shutil.copy2', lambda folder: (os.makedirs(folder), shutil.copy2(source, folder))),
+                           ('copy engine (read/write)', user_space_copy),
+                           ('copy engine', engine_copy)]:
+            folder = os.path.join(root, name.replace(' ', '_'))
+            _, elapsed, peak = measure(func, folder)
+            print(f"{'copy':<12} {name:<28} {elapsed * 1000:>10.1f} ms {format_size(size / elapsed):>12}/s "
+                  f"{format_size(peak):>10} peak")
+            shutil.rmtree(folder)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_copy_tree(scale, directory=None):
+    from System.operations import COPY_WORKERS, CopyJob
+
+    root = tempfile.mkdtemp(prefix='superapp-bench-copytree-', dir=directory)
+    try:
+        source = os.path.join(root, 'source')
+        os.makedirs(source)
+        create_small_files_tree(source, scale)
+        entries = count_entries(source)
+
+        def engine_copy(destination_folder, workers):
+            os.makedirs(destination_folder)
+            CopyJob(None, [source], destination_folder, workers).execute()
+
+        for name, func in [('shutil.copytree', lambda folder: shutil.copytree(source, os.path.join(folder, 'source'))),
+                           ('copy_tree x1', lambda folder: engine_copy(folder, 1)),
+                           (f'copy_tree x{COPY_WORKERS}', lambda folder: engine_copy(folder, COPY_WORKERS))]:
+            folder = os.path.join(root, name.replace(' ', '_'))
+            # tracemalloc перехватывает каждое выделение памяти во всех потоках и искажает замер параллельного копирования
+            _, elapsed, peak = measure(func, folder, trace_memory=False)
+            report('copytree', name, elapsed, peak, entries)
+            shutil.rmtree(folder)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def wait_until(app, condition, timeout=MODEL_TIMEOUT):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError('Модель не загрузилась за отведённое время')
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def bench_model(app, tree, root, entries):
+    from PyQt5.QtWidgets import QTreeView
+    from System.models import CustomFileSystemModel
+
+    model = CustomFileSystemModel()
+    view = QTreeView()
+    view.resize(800, 600)
+    view.setModel(model)
+
+    loaded = []
+    model.directoryLoaded.connect(loaded.append)
+
+    def populate():
+        model.setRootPath(root)
+        view.setRootIndex(model.index(root))
+        view.show()
+        wait_until(app, lambda: os.path.normpath(root) in map(os.path.normpath, loaded))
+
+    _, elapsed, peak = measure(populate)
+    root_index = model.index(root)
+    rows = model.rowCount(root_index)
+    report(tree, 'model population', elapsed, peak, rows)
+
+    calculator = model.size_calculator
+
+    def calculate_sizes():
+        for row in range(rows):
+            model.data(model.index(row, 1, root_index))
+        wait_until(app, lambda: not calculator.jobs and not calculator.waiting)
+
+    _, elapsed, peak = measure(calculate_sizes)
+    report(tree, 'model sizes (cold cache)', elapsed, peak, entries)
+
+    def read_sizes():
+        for row in range(rows):
+            model.data(model.index(row, 1, root_index))
+
+    _, elapsed, peak = measure(read_sizes)
+    report(tree, 'model data (warm cache)', elapsed, peak, rows)
+
+    def repaint():
+        for _ in range(REPAINTS):
+            view.viewport().repaint()
+
+    _, elapsed, peak = measure(repaint)
+    report(tree, f'repaint x{REPAINTS}', elapsed, peak, rows * REPAINTS)
+
+    view.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк подсчёта размеров и дерева файлов')
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель размера синтетических деревьев')
+    parser.add_argument('--trees', nargs='+', choices=sorted(TREES), default=sorted(TREES))
+    parser.add_argument('--no-model', action='store_true', help='не измерять модель Qt')
+    parser.add_argument('--no-copy', action='store_true', help='не измерять копирование файлов')
+    parser.add_argument('--copy-dir', help='каталог на проверяемом диске для замера копирования')
+    args = parser.parse_args()
+
+    app = None
+    if not args.no_model:
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication(sys.argv)
+
+    bench_format_size()
+    if not args.no_copy:
+        bench_copy(args.scale, args.copy_dir)
+        bench_copy_tree(args.scale, args.copy_dir)
+
+    for tree in args.trees:
+        root = tempfile.mkdtemp(prefix=f'superapp-bench-{tree}-')
+        try:
+            TREES[tree](root, args.scale)
+            entries = count_entries(root)
+            print(f"{tree}: {entries} записей")
+
+            bench_sizing(tree, root, entries)
+            if app is not None:
+                bench_model(app, tree, root, entries)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"Пиковый RSS процесса: {format_size(max_rss * 1024)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import time
+
+import psutil
+
+from System.operations import CANCELLED, FAILED, FileOperation, copy_file, format_duration
+from System.shared import DEFAULT_DIR_CATALOG, format_size
+
+MANIFEST_PATH = os.path.join(DEFAULT_DIR_CATALOG, 'System', '.imports.db')
+# Сколько ждать, пока система смонтирует только что подключённое устройство
+MOUNT_TIMEOUT = 30
+MOUNT_POLL_INTERVAL = 0.5
+# Ограничение скорости копирования, байт/с; 0 - без ограничения
+IMPORT_RATE = 64 * 1024 ** 2
+# Манифест фиксируется пачками: после отмены или извлечения устройства уже скопированное не копируется заново
+MANIFEST_BATCH = 200
+
+
+def find_mountpoint(device_node):
+    device_node = os.path.realpath(device_node)
+    for partition in psutil.disk_partitions(all=True):
+        if partition.device and os.path.realpath(partition.device) == device_node:
+            return partition.mountpoint
+    return None
+
+
+class DeviceImportJob(FileOperation):
+    title = 'Импорт с устройства'
+    # Импорт ограничен по скорости и может идти долго: вставка и удаление не должны ждать его в очереди
+    background = True
+
+    def __init__(self, manager, label, device_node, destination, rate=IMPORT_RATE, manifest_path=MANIFEST_PATH):
+        super().__init__(manager)
+        self.label = label
+        self.device_node = device_node
+        self.destination = destination
+        self.rate = rate
+        self.manifest_path = manifest_path
+        self.mountpoint = None
+        self.files = []
+        self.skipped = 0
+        self.copied = 0
+        self.started = None
+        self.elapsed = None
+        self.db = None
+
+    def wait_mountpoint(self):
+        deadline = time.monotonic() + MOUNT_TIMEOUT
+        while True:
+            self.check()
+            mountpoint = find_mountpoint(self.device_node)
+            if mountpoint is not None:
+                return mountpoint
+            if time.monotonic() > deadline:
+                raise OSError(f'{self.device_node}: устройство не смонтировано')
+            # Пауза через отмену: cancel прерывает ожидание сразу
+            self.cancelled.wait(MOUNT_POLL_INTERVAL)
+
+    def open_manifest(self):
+        # Соединение создаётся в потоке операции и используется только в нём
+        self.db = sqlite3.connect(self.manifest_path)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                label TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                PRIMARY KEY (label, path)
+            )
+        ''')
+        self.db.commit()
+
+    def prepare(self):
+        self.mountpoint = self.wait_mountpoint()
+        self.start_file(self.mountpoint, 0)
+        self.open_manifest()
+        imported = {path: (size, mtime) for path, size, mtime in self.db.execute(
+            'SELECT path, size, mtime FROM files WHERE label = ?', (self.label,))}
+
+        # Обход только читает метаданные; копируются файлы, у которых размер или время изменения
+        # отличаются от прошлого импорта, или копия которых пропала из каталога
+        stack = [self.mountpoint]
+        while stack:
+            self.check()
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue
+                            stat = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        relative_path = os.path.relpath(entry.path, self.mountpoint)
+                        if (imported.get(relative_path) == (stat.st_size, stat.st_mtime)
+                                and os.path.exists(os.path.join(self.destination, relative_path))):
+                            self.skipped += 1
+                            continue
+                        self.files.append((relative_path, stat.st_size, stat.st_mtime))
+            except OSError as error:
+                self.errors.append(f'{directory}: {error.strerror}')
+
+        self.total_bytes = sum(size for _path, size, _mtime in self.files)
+
+    def execute(self):
+        self.started = time.monotonic()
+        pending = []
+        try:
+            for relative_path, size, mtime in self.files:
+                self.check()
+                source = os.path.join(self.mountpoint, relative_path)
+                destination = os.path.join(self.destination, relative_path)
+                # Копия идёт под временным именем рядом: прежняя копия в каталоге пропадает, только когда новая
+                # записана целиком, а не при извлечении устройства или ошибке чтения посреди файла
+                temporary = os.path.join(os.path.dirname(destination), f'.{os.path.basename(destination)}.importing')
+                try:
+                    os.makedirs(os.path.dirname(destination), exist_ok=True)
+                    copy_file(source, temporary, self)
+                    os.replace(temporary, destination)
+                except OSError as error:
+                    self.errors.append(f'{source}: {error.strerror}')
+                    continue
+                self.copied += 1
+                pending.append((self.label, relative_path, size, mtime))
+                if len(pending) >= MANIFEST_BATCH:
+                    self.save_manifest(pending)
+        finally:
+            self.save_manifest(pending)
+            self.changed_paths.append(self.destination)
+            self.elapsed = time.monotonic() - self.started
+
+    def save_manifest(self, pending):
+        self.db.executemany('INSERT OR REPLACE INTO files (label, path, size, mtime) VALUES (?, ?, ?, ?)', pending)
+        self.db.commit()
+        pending.clear()
+
+    def advance(self, count):
+        super().advance(count)
+        if not self.rate:
+            return
+        # Не быстрее rate байт в секунду от начала копирования: карта и шина остаются доступны другим программам
+        ahead = self.done_bytes / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            self.cancelled.wait(ahead)
+
+    def run(self):
+        try:
+            super().run()
+        finally:
+            if self.db is not None:
+                self.db.close()
+
+    def report(self):
+        summary = (f"скопировано {self.copied} шт. ({format_size(self.done_bytes)}), "
+                   f"без изменений {self.skipped} шт.")
+        if self.elapsed is not None:
+            summary += f", за {format_duration(self.elapsed)}"
+        if self.state == CANCELLED:
+            return (f"IMPORT_CANCELLED|{self.label}", f"Импорт с устройства {self.label} прерван: {summary}.",
+                    "../logs/actions.log")
+        if self.state == FAILED:
+            return (f"IMPORT_FAILED|{self.label}",
+                    f"Импорт с устройства {self.label} завершён с ошибками: {len(self.errors)}; {summary}.",
+                    "../logs/actions.log")
+        return (f"IMPORT_ITEM|{self.label}|{self.copied}|{self.skipped}",
+                f"Импорт с устройства {self.label} в {self.destination}: {summary}.", "../logs/actions.log")
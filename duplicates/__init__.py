@@ -0,0 +1,279 @@
+import hashlib
+import os
+import threading
+
+from PyQt5.QtCore import QObject, QThread, Qt, pyqtSignal
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTreeWidget, QTreeWidgetItem, QHeaderView
+)
+
+from System.shared import DEFAULT_DIR_CATALOG, format_size, is_inside, parallel_map
+
+# Частичный хеш берётся от первого и последнего блока: у разных файлов одного размера они почти всегда различаются
+PARTIAL_BLOCK = 64 * 1024
+HASH_CHUNK = 1024 * 1024
+HASH_WORKERS = 4
+
+
+def hash_file(path, partial=False):
+    digest = hashlib.blake2b(digest_size=20)
+    try:
+        with open(path, 'rb') as f:
+            if partial:
+                digest.update(f.read(PARTIAL_BLOCK))
+                size = os.fstat(f.fileno()).st_size
+                if size > PARTIAL_BLOCK:
+                    f.seek(max(PARTIAL_BLOCK, size - PARTIAL_BLOCK))
+                    digest.update(f.read(PARTIAL_BLOCK))
+            else:
+                # Потоковое чтение в один буфер; hashlib отпускает GIL, поэтому потоки хешируют параллельно
+                buffer = bytearray(HASH_CHUNK)
+                view = memoryview(buffer)
+                while True:
+                    read = f.readinto(buffer)
+                    if not read:
+                        break
+                    digest.update(view[:read])
+    except OSError:
+        return None
+    return digest.digest()
+
+
+def files_by_size(root, skip=(), cancel_event=None):
+    sizes = {}
+    seen = set()
+    stack = [root]
+    while stack:
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.') or entry.path in skip:
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            # Жёсткие ссылки на один inode место не занимают, их копиями не считаем
+                            if stat.st_size == 0 or (stat.st_dev, stat.st_ino) in seen:
+                                continue
+                            seen.add((stat.st_dev, stat.st_ino))
+                            sizes.setdefault(stat.st_size, []).append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return sizes
+
+
+def regroup(groups, key, workers, cancel_event=None):
+    # Группы дробятся по ключу, посчитанному для всех путей сразу на пуле потоков; одиночки отбрасываются
+    paths = [path for group in groups for path in group]
+    keys = parallel_map(key, paths, workers, cancel_event)
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+
+    result = []
+    position = 0
+    for group in groups:
+        by_key = {}
+        for path in group:
+            path_key = keys[position]
+            position += 1
+            if path_key is not None:
+                by_key.setdefault(path_key, []).append(path)
+        result.extend(paths for paths in by_key.values() if len(paths) > 1)
+    return result
+
+
+def find_duplicates(root, skip=(), workers=HASH_WORKERS, cancel_event=None, progress=None):
+    # Размер -> хеш первого и последнего блоков -> полный хеш: каждый следующий этап дороже,
+    # но получает только то, что не отсеяли предыдущие
+    sizes = files_by_size(root, skip, cancel_event)
+    if sizes is None:
+        return None
+    groups = [paths for paths in sizes.values() if len(paths) > 1]
+    size_of = {path: size for size, paths in sizes.items() if len(paths) > 1 for path in paths}
+    if progress is not None:
+        progress(f'Одинаковый размер: {sum(map(len, groups))} файлов в {len(groups)} группах')
+
+    groups = regroup(groups, lambda path: hash_file(path, partial=True), workers, cancel_event)
+    if groups is None:
+        return None
+
+    # Файлы не длиннее двух блоков частичный хеш уже прочитал целиком
+    small = [group for group in groups if size_of[group[0]] <= 2 * PARTIAL_BLOCK]
+    large = [group for group in groups if size_of[group[0]] > 2 * PARTIAL_BLOCK]
+    if progress is not None:
+        progress(f'Совпадают начало и конец: {sum(map(len, groups))} файлов, полное сравнение {sum(map(len, large))}')
+
+    large = regroup(large, hash_file, workers, cancel_event)
+    if large is None:
+        return None
+
+    duplicates = [(size_of[group[0]], sorted(group)) for group in small + large]
+    duplicates.sort(key=lambda group: group[0] * (len(group[1]) - 1), reverse=True)
+    return duplicates
+
+
+def modification_time(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
+
+def oldest_copy(paths):
+    # Копия, которая остаётся: самая старая по времени изменения
+    return min(paths, key=modification_time)
+
+
+class DuplicateScanner(QObject):
+    progress = pyqtSignal(str)
+    scanned = pyqtSignal(object)
+
+    def __init__(self, root, skip, cancel_event):
+        super().__init__()
+        self.root = root
+        self.skip = skip
+        self.cancel_event = cancel_event
+
+    def run(self):
+        duplicates = find_duplicates(self.root, self.skip, cancel_event=self.cancel_event,
+                                     progress=self.progress.emit)
+        # stat всех копий - тоже обращение к диску, он делается здесь, а не в потоке интерфейса
+        if duplicates is not None:
+            duplicates = [(size, paths, oldest_copy(paths)) for size, paths in duplicates]
+        self.scanned.emit(duplicates)
+
+
+class DuplicatesWindow(QWidget):
+    trash_requested = pyqtSignal(list)
+
+    def __init__(self, root=DEFAULT_DIR_CATALOG):
+        super().__init__()
+
+        self.root = os.path.normpath(root)
+        self.skip = {os.path.join(self.root, 'Корзина')}
+        self.thread = None
+        self.scanner = None
+        self.cancel_event = None
+        # Окно открыли снова, пока прерывается прошлое сканирование: новое начнётся, когда оно завершится
+        self.rescan_pending = False
+
+        self.setWindowTitle('Поиск дубликатов')
+        self.setGeometry(200, 200, 800, 600)
+
+        layout = QVBoxLayout()
+
+        controls = QHBoxLayout()
+        self.status_label = QLabel()
+        controls.addWidget(self.status_label)
+        controls.addStretch()
+        self.refresh_button = QPushButton('Обновить')
+        self.refresh_button.clicked.connect(self.scan)
+        controls.addWidget(self.refresh_button)
+        self.trash_button = QPushButton('Отмеченные в корзину')
+        self.trash_button.clicked.connect(self.trash_checked)
+        controls.addWidget(self.trash_button)
+        layout.addLayout(controls)
+
+        self.groups_tree = QTreeWidget()
+        self.groups_tree.setHeaderLabels(['Файл', 'Размер'])
+        self.groups_tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(self.groups_tree)
+
+        self.setLayout(layout)
+
+        self.scan()
+
+    def scan(self):
+        if self.thread is not None and self.thread.isRunning():
+            # Идущее сканирование продолжает присылать результаты в это окно
+            if self.cancel_event.is_set():
+                self.rescan_pending = True
+                self.status_label.setText('Сканирование…')
+            return
+        self.rescan_pending = False
+
+        self.status_label.setText('Сканирование…')
+        self.refresh_button.setEnabled(False)
+        self.trash_button.setEnabled(False)
+
+        self.cancel_event = threading.Event()
+        self.scanner = DuplicateScanner(self.root, self.skip, self.cancel_event)
+        self.thread = QThread()
+        self.scanner.moveToThread(self.thread)
+        self.thread.started.connect(self.scanner.run)
+        self.scanner.progress.connect(self.status_label.setText)
+        self.scanner.scanned.connect(self.show_scan)
+        self.scanner.scanned.connect(self.thread.quit)
+        self.thread.finished.connect(self.finish_scan)
+        self.thread.start()
+
+    def finish_scan(self):
+        if self.rescan_pending:
+            self.scan()
+
+    def show_scan(self, duplicates):
+        self.refresh_button.setEnabled(True)
+        if duplicates is None:
+            if not self.rescan_pending:
+                self.status_label.setText('Сканирование прервано')
+            return
+
+        self.groups_tree.clear()
+        reclaimable = 0
+        for size, paths, keep in duplicates:
+            reclaimable += size * (len(paths) - 1)
+            group_item = QTreeWidgetItem(['', format_size(size)])
+            group_item.setData(1, Qt.UserRole, size)
+            # Оставляем самую старую копию, остальные отмечены для удаления
+            for path in paths:
+                item = QTreeWidgetItem([os.path.relpath(path, self.root), format_size(size)])
+                item.setData(0, Qt.UserRole, path)
+                item.setCheckState(0, Qt.Unchecked if path == keep else Qt.Checked)
+                group_item.addChild(item)
+            self.update_group_title(group_item)
+            self.groups_tree.addTopLevelItem(group_item)
+            group_item.setExpanded(True)
+
+        self.trash_button.setEnabled(bool(duplicates))
+        self.status_label.setText(f'Групп дубликатов: {len(duplicates)}, можно освободить {format_size(reclaimable)}')
+
+    def update_group_title(self, group_item):
+        reclaimable = group_item.data(1, Qt.UserRole) * (group_item.childCount() - 1)
+        group_item.setText(0, f'Копий: {group_item.childCount()}, можно освободить {format_size(reclaimable)}')
+
+    def trash_checked(self):
+        paths = []
+        for group_row in range(self.groups_tree.topLevelItemCount()):
+            group_item = self.groups_tree.topLevelItem(group_row)
+            for row in range(group_item.childCount()):
+                item = group_item.child(row)
+                if item.checkState(0) == Qt.Checked:
+                    paths.append(item.data(0, Qt.UserRole))
+        if paths:
+            self.trash_requested.emit(paths)
+
+    def update_paths(self, paths):
+        # Удалённые или перемещённые копии убираются из групп; группа из одного файла больше не дубликат
+        paths = [os.path.normpath(path) for path in paths]
+        for group_row in reversed(range(self.groups_tree.topLevelItemCount())):
+            group_item = self.groups_tree.topLevelItem(group_row)
+            for row in reversed(range(group_item.childCount())):
+                path = group_item.child(row).data(0, Qt.UserRole)
+                if not os.path.exists(path) and any(path == p or is_inside(path, p) for p in paths):
+                    group_item.removeChild(group_item.child(row))
+            if group_item.childCount() < 2:
+                self.groups_tree.takeTopLevelItem(group_row)
+            else:
+                self.update_group_title(group_item)
+
+    def closeEvent(self, event):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        super().closeEvent(event)
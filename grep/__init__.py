@@ -0,0 +1,249 @@
+import mmap
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+from multiprocessing.connection import Connection, wait
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from System.shared import DEFAULT_DIR_CATALOG
+
+# Файлы крупнее порога отображаются в память, а не читаются в строку Python
+MMAP_THRESHOLD = 1024 * 1024
+BINARY_PROBE = 8192
+COUNT_PIECE = 16 * 1024 * 1024
+MAX_LINE_LENGTH = 200
+MAX_HITS_PER_FILE = 100
+MAX_HITS = 10000
+BATCH_FILES = 64
+BATCH_BYTES = 64 * 1024 * 1024
+# Процессы поиска запускаются из каталога, где лежит пакет System: так в них импортируется только этот модуль,
+# а не main.py с его очередью сообщений и журналом, и пакет System/queue не перекрывает стандартный queue
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WORKER_COMMAND = 'import sys; from System.grep import serve_worker; serve_worker(int(sys.argv[1]))'
+
+
+def count_lines(data, start, end):
+    # Перевод строк считается кусками, чтобы срез большого mmap не копировал файл целиком
+    count = 0
+    while start < end:
+        piece_end = min(end, start + COUNT_PIECE)
+        count += data[start:piece_end].count(b'\n')
+        start = piece_end
+    return count
+
+
+def search_data(path, data, regex):
+    hits = []
+    line_number = 1
+    line_checked = 0
+    for match in regex.finditer(data):
+        position = match.start()
+        line_number += count_lines(data, line_checked, position)
+        line_checked = position
+
+        line_start = data.rfind(b'\n', 0, position) + 1
+        line_end = data.find(b'\n', position)
+        if line_end < 0:
+            line_end = len(data)
+        line = data[line_start:min(line_end, line_start + MAX_LINE_LENGTH)]
+        hits.append((path, line_number, line.decode('utf-8', errors='replace').strip()))
+
+        if len(hits) >= MAX_HITS_PER_FILE:
+            break
+    return hits
+
+
+def search_file(path, regex):
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return []
+
+            # Нулевой байт в начале файла - признак двоичного файла, такие пропускаются
+            if b'\0' in f.read(BINARY_PROBE):
+                return []
+
+            if size <= MMAP_THRESHOLD:
+                f.seek(0)
+                return search_data(path, f.read(), regex)
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return search_data(path, data, regex)
+    except (OSError, ValueError):
+        return []
+
+
+def compile_pattern(query, ignore_case=True):
+    if not ignore_case:
+        return re.compile(re.escape(query.encode('utf-8')))
+    # re.IGNORECASE у байтового шаблона сворачивает регистр только для ASCII, поэтому каждый символ
+    # заменяется альтернативой из его написаний в UTF-8: так без учёта регистра ищется и кириллица
+    parts = []
+    for char in query:
+        variants = sorted({variant.encode('utf-8') for variant in (char, char.lower(), char.upper())},
+                          key=len, reverse=True)
+        if len(variants) == 1:
+            parts.append(re.escape(variants[0]))
+        else:
+            parts.append(b'(?:' + b'|'.join(re.escape(variant) for variant in variants) + b')')
+    return re.compile(b''.join(parts))
+
+
+def serve_worker(fd):
+    connection = Connection(fd)
+    query, ignore_case = connection.recv()
+    regex = compile_pattern(query, ignore_case)
+    while True:
+        batch = connection.recv()
+        if batch is None:
+            break
+        hits = []
+        for path in batch:
+            hits.extend(search_file(path, regex))
+        connection.send(hits)
+    connection.close()
+
+
+def iter_files(root, skip_hidden=False):
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if skip_hidden and entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield entry.path, entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def iter_batches(root, skip_hidden=False):
+    batch = []
+    batch_bytes = 0
+    for path, size in iter_files(root, skip_hidden):
+        batch.append(path)
+        batch_bytes += size
+        if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+            yield batch
+            batch = []
+            batch_bytes = 0
+    if batch:
+        yield batch
+
+
+class ContentSearchJob:
+    def __init__(self, query, searcher, workers, ignore_case=True, skip_hidden=False):
+        self.query = query
+        self.searcher = searcher
+        self.workers = workers
+        self.ignore_case = ignore_case
+        self.skip_hidden = skip_hidden
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def run(self):
+        # multiprocessing.Pool и очереди импортируют модуль queue стандартной библиотеки, а при запуске
+        # из папки System его перекрывает пакет System/queue, поэтому процессы раздаются вручную через сокеты.
+        # Процессы spawn из multiprocessing заново импортируют __main__, поэтому процессы запускаются напрямую
+        processes = []
+        connections = []
+        for _ in range(self.workers):
+            parent_socket, child_socket = socket.socketpair()
+            with child_socket:
+                process = subprocess.Popen([sys.executable, '-c', WORKER_COMMAND, str(child_socket.fileno())],
+                                           cwd=PACKAGE_PARENT, pass_fds=(child_socket.fileno(),))
+            connection = Connection(parent_socket.detach())
+            connection.send((self.query, self.ignore_case))
+            processes.append(process)
+            connections.append(connection)
+
+        batches = iter_batches(self.searcher.root, self.skip_hidden)
+        active = []
+        for connection in connections:
+            batch = next(batches, None)
+            connection.send(batch)
+            if batch is not None:
+                active.append(connection)
+
+        found = 0
+        try:
+            # Свободный процесс сразу получает следующую порцию - крупные файлы не тормозят остальных
+            while active and not self.cancelled.is_set():
+                for connection in wait(active, timeout=0.1):
+                    hits = connection.recv()
+                    if hits:
+                        found += len(hits)
+                        self.searcher.job_matches.emit(hits, self)
+                    batch = next(batches, None) if found < MAX_HITS else None
+                    connection.send(batch)
+                    if batch is None:
+                        active.remove(connection)
+        except (EOFError, OSError):
+            pass
+        finally:
+            for process in processes:
+                if self.cancelled.is_set() or active:
+                    process.terminate()
+                process.wait()
+            for connection in connections:
+                connection.close()
+
+        if not self.cancelled.is_set():
+            self.searcher.job_finished.emit(self)
+
+
+class ContentSearcher(QObject):
+    matches_found = pyqtSignal(list)
+    search_finished = pyqtSignal(str, int)
+    job_matches = pyqtSignal(list, object)
+    job_finished = pyqtSignal(object)
+
+    # Поиск по содержимому дорогой, запускается только явно, а не при наборе текста
+    live = False
+
+    def __init__(self, root=DEFAULT_DIR_CATALOG, workers=None, skip_hidden=False):
+        super().__init__()
+
+        self.root = root
+        self.workers = workers or os.cpu_count() or 1
+        # Пропускать ли скрытые файлы и папки (в том числе служебные файлы приложения)
+        self.skip_hidden = skip_hidden
+        self.job = None
+        self.count = 0
+
+        self.job_matches.connect(self.forward_matches)
+        self.job_finished.connect(self.finish_job)
+
+    def start(self, query):
+        self.cancel()
+        self.count = 0
+        self.job = ContentSearchJob(query, self, self.workers, skip_hidden=self.skip_hidden)
+        self.job.thread.start()
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancelled.set()
+            self.job = None
+
+    def forward_matches(self, hits, job):
+        if job is self.job:
+            self.count += len(hits)
+            self.matches_found.emit(hits)
+
+    def finish_job(self, job):
+        if job is self.job:
+            self.job = None
+            self.search_finished.emit(job.query, self.count)
@@ -0,0 +1,376 @@
+import os
+import sqlite3
+import threading
+
+from PyQt5.QtCore import QFileSystemWatcher, QObject, QTimer
+
+from System.shared import DEFAULT_DIR_CATALOG, path_range
+
+INDEX_PATH = os.path.join(DEFAULT_DIR_CATALOG, 'System', '.index.db')
+SCHEMA_VERSION = 2
+# Фильтрованный запрос возвращает не больше стольких записей
+FIND_LIMIT = 10000
+# Как часто весь каталог сверяется с диском, мс: изменения в ненаблюдаемых каталогах видны не позже этого
+REVALIDATE_INTERVAL = 10 * 60 * 1000
+# Перезапись файла на месте не меняет mtime каталога, поэтому сверка каталогов её не видит. Такие изменения
+# догоняет фоновая сверка файлов: не больше RESTAT_BATCH файлов за раз, раз в RESTAT_INTERVAL мс
+RESTAT_BATCH = 2000
+RESTAT_INTERVAL = 30 * 1000
+
+
+def extension(name):
+    return os.path.splitext(name)[1][1:].lower()
+
+
+class MetadataIndex:
+    def __init__(self, root=DEFAULT_DIR_CATALOG, db_path=INDEX_PATH):
+        self.root = os.path.normpath(root)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        self.create_schema()
+
+        # Отдельное соединение для чтения: в режиме WAL читатели не ждут долгой перестройки индекса
+        self.read_lock = threading.Lock()
+        self.reader = sqlite3.connect(db_path, check_same_thread=False)
+        # LIKE и lower() в SQLite сворачивают регистр только у ASCII; для кириллицы имя сравнивается через casefold
+        self.reader.create_function('casefold', 1, str.casefold, deterministic=True)
+
+        self.pending = set()
+        # Путь, на котором остановилась фоновая сверка файлов
+        self.restat_cursor = ''
+        self.updated_callback = None
+        # Подписчик на добавленные/удалённые записи; списки изменений собираются, только пока он задан
+        self.changes_callback = None
+        self.added = None
+        self.removed = None
+        self.condition = threading.Condition()
+        self.worker = None
+
+    def create_schema(self):
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self.db.execute('DROP TABLE IF EXISTS entries')
+
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                path TEXT PRIMARY KEY,
+                parent TEXT,
+                name TEXT NOT NULL,
+                is_dir INTEGER NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0,
+                mtime REAL NOT NULL,
+                inode INTEGER NOT NULL,
+                ext TEXT NOT NULL DEFAULT ''
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS entries_parent ON entries(parent)')
+        # Вторичные индексы для фильтров: диапазон по размеру или времени читается по индексу уже упорядоченным
+        self.db.execute('CREATE INDEX IF NOT EXISTS entries_size ON entries(size)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS entries_mtime ON entries(mtime)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS entries_ext ON entries(ext)')
+        self.db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self.db.commit()
+
+    def revalidate(self, start=None, cancel_event=None, refresh=False):
+        start = os.path.normpath(start) if start else self.root
+
+        with self.lock:
+            if self.changes_callback is not None:
+                self.added, self.removed = [], []
+
+            stored = dict(self.db.execute('SELECT path, mtime FROM entries WHERE is_dir = 1'))
+            changed = []
+            stack = [start]
+
+            while stack:
+                if cancel_event is not None and cancel_event.is_set():
+                    self.db.rollback()
+                    self.added = self.removed = None
+                    return None
+
+                directory = stack.pop()
+                try:
+                    stat = os.stat(directory)
+                except OSError:
+                    continue
+
+                # mtime каталога меняется только при создании/удалении/переименовании записей в нём,
+                # изменение содержимого файла его не трогает - при refresh начальный каталог сканируется всегда,
+                # а в неизменившиеся подкаталоги спускаться незачем
+                if stored.get(directory) == stat.st_mtime and not (refresh and directory == start):
+                    if refresh:
+                        continue
+                    stack.extend(path for path, in self.db.execute(
+                        'SELECT path FROM entries WHERE parent = ? AND is_dir = 1', (directory,)))
+                else:
+                    stack.extend(self.rescan_directory(directory, stat))
+                    changed.append(directory)
+
+            sizes = self.aggregate(changed)
+            self.db.commit()
+
+            if self.changes_callback is not None and (self.added or self.removed):
+                self.changes_callback(self.added, self.removed)
+            self.added = self.removed = None
+
+        return sizes
+
+    def rescan_directory(self, directory, stat):
+        existing = {name: (is_dir, mtime) for name, is_dir, mtime in self.db.execute(
+            'SELECT name, is_dir, mtime FROM entries WHERE parent = ?', (directory,))}
+        subdirectories = []
+        files = []
+
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        entry_stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+
+                    previous, previous_mtime = existing.pop(entry.name, (None, None))
+                    if previous is not None and previous != is_dir:
+                        self.delete_entry(entry.path)
+                        previous = None
+                    # Изменённые файлы тоже попадают в added: подписчикам нужен их новый mtime
+                    if self.added is not None and (previous is None or
+                                                   (not is_dir and previous_mtime != entry_stat.st_mtime)):
+                        self.added.append((entry.path, is_dir, entry_stat.st_mtime))
+
+                    if is_dir:
+                        subdirectories.append(entry.path)
+                        # Свой mtime подкаталог получит при собственном сканировании, -1 заставит его пересканировать
+                        self.db.execute(
+                            'INSERT OR IGNORE INTO entries (path, parent, name, is_dir, mtime, inode) '
+                            'VALUES (?, ?, ?, 1, -1, ?)',
+                            (entry.path, directory, entry.name, entry_stat.st_ino))
+                    else:
+                        files.append((entry.path, directory, entry.name, entry_stat.st_size,
+                                      entry_stat.st_mtime, entry_stat.st_ino, extension(entry.name)))
+        except OSError:
+            pass
+
+        self.db.executemany(
+            'INSERT OR REPLACE INTO entries (path, parent, name, is_dir, size, mtime, inode, ext) '
+            'VALUES (?, ?, ?, 0, ?, ?, ?, ?)', files)
+
+        for name in existing:
+            self.delete_entry(os.path.join(directory, name))
+
+        self.db.execute(
+            'INSERT INTO entries (path, parent, name, is_dir, mtime, inode) VALUES (?, ?, ?, 1, ?, ?) '
+            'ON CONFLICT(path) DO UPDATE SET mtime = excluded.mtime, inode = excluded.inode',
+            (directory, None if directory == self.root else os.path.dirname(directory),
+             os.path.basename(directory), stat.st_mtime, stat.st_ino))
+
+        return subdirectories
+
+    def restat_batch(self, limit=RESTAT_BATCH):
+        # Очередная порция файлов по порядку путей; дойдя до конца, сверка начинается сначала
+        with self.lock:
+            rows = self.db.execute('SELECT path, parent, size, mtime FROM entries WHERE is_dir = 0 AND path > ? '
+                                   'ORDER BY path LIMIT ?', (self.restat_cursor, limit)).fetchall()
+            self.restat_cursor = rows[-1][0] if len(rows) == limit else ''
+
+            updated = []
+            changed = set()
+            for path, parent, size, mtime in rows:
+                try:
+                    stat = os.lstat(path)
+                except OSError:
+                    # Удалённый файл - забота сверки каталогов
+                    continue
+                if stat.st_size != size or stat.st_mtime != mtime:
+                    updated.append((stat.st_size, stat.st_mtime, path))
+                    changed.add(parent)
+            if not updated:
+                return None
+
+            self.db.executemany('UPDATE entries SET size = ?, mtime = ? WHERE path = ?', updated)
+            sizes = self.aggregate(changed)
+            self.db.commit()
+
+            if self.changes_callback is not None:
+                self.changes_callback([(path, False, mtime) for _size, mtime, path in updated], [])
+        return sizes
+
+    def delete_entry(self, path):
+        low, high = path_range(path)
+        if self.removed is not None:
+            self.removed.append(path)
+            self.removed.extend(removed for removed, in self.db.execute(
+                'SELECT path FROM entries WHERE path >= ? AND path < ?', (low, high)))
+        self.db.execute('DELETE FROM entries WHERE path = ? OR (path >= ? AND path < ?)', (path, low, high))
+
+    def aggregate(self, changed):
+        affected = set()
+        for directory in changed:
+            while directory not in affected:
+                affected.add(directory)
+                if directory == self.root:
+                    break
+                directory = os.path.dirname(directory)
+
+        # Сначала самые глубокие каталоги, тогда размеры детей уже пересчитаны
+        sizes = {}
+        for directory in sorted(affected, key=lambda p: p.count(os.sep), reverse=True):
+            size = self.db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM entries WHERE parent = ?', (directory,)).fetchone()[0]
+            self.db.execute('UPDATE entries SET size = ? WHERE path = ?', (size, directory))
+            sizes[directory] = size
+        return sizes
+
+    def directory_sizes(self):
+        with self.read_lock:
+            return dict(self.reader.execute('SELECT path, size FROM entries WHERE is_dir = 1 AND mtime >= 0'))
+
+    def entry(self, path):
+        with self.read_lock:
+            return self.reader.execute(
+                'SELECT path, is_dir, size, mtime, inode FROM entries WHERE path = ?',
+                (os.path.normpath(path),)).fetchone()
+
+    def child_count(self, path, limit=-1):
+        # С limit подсчёт обрывается на нём: чтобы сравнить с порогом, все записи огромного каталога читать не нужно
+        with self.read_lock:
+            return self.reader.execute(
+                'SELECT COUNT(*) FROM (SELECT 1 FROM entries WHERE parent = ? LIMIT ?)',
+                (os.path.normpath(path), limit)).fetchone()[0]
+
+    def find(self, min_size=None, max_size=None, min_mtime=None, max_mtime=None, extensions=(), is_dir=None,
+             under=None, name=None, limit=FIND_LIMIT):
+        clauses = ['parent IS NOT NULL']
+        parameters = []
+        if min_size is not None:
+            clauses.append('size >= ?')
+            parameters.append(min_size)
+        if max_size is not None:
+            clauses.append('size <= ?')
+            parameters.append(max_size)
+        if min_mtime is not None:
+            clauses.append('mtime >= ?')
+            parameters.append(min_mtime)
+        if max_mtime is not None:
+            # mtime = -1 у каталогов, которые ещё не сканировались
+            clauses.append('mtime <= ? AND mtime >= 0')
+            parameters.append(max_mtime)
+        if extensions:
+            clauses.append(f"ext IN ({', '.join('?' * len(extensions))})")
+            parameters.extend(extensions)
+        if is_dir is not None:
+            clauses.append('is_dir = ?')
+            parameters.append(int(is_dir))
+        if under is not None:
+            low, high = path_range(os.path.normpath(under))
+            clauses.append('path >= ? AND path < ?')
+            parameters.extend((low, high))
+        if name:
+            clauses.append('instr(casefold(name), ?) > 0')
+            parameters.append(name.casefold())
+
+        # Порядок по тому полю, по которому задан диапазон: тогда выборка идёт по индексу и обрывается на limit
+        if min_size is not None or max_size is not None:
+            order = 'size DESC'
+        elif min_mtime is not None or max_mtime is not None:
+            order = 'mtime DESC'
+        else:
+            order = 'path'
+
+        with self.read_lock:
+            return [path for path, in self.reader.execute(
+                f"SELECT path FROM entries WHERE {' AND '.join(clauses)} ORDER BY {order} LIMIT ?",
+                parameters + [limit])]
+
+    def subscribe(self, callback, initialize):
+        # Снимок и подписка делаются под одной блокировкой, чтобы между ними не потерялось ни одно изменение
+        with self.lock:
+            initialize(self.db.execute('SELECT path, is_dir, mtime FROM entries WHERE parent IS NOT NULL'))
+            self.changes_callback = callback
+
+    def schedule_refresh(self, path):
+        # path - изменившаяся запись, пересканировать нужно содержащий её каталог
+        self.schedule_directory_refresh(os.path.dirname(os.path.normpath(path)))
+
+    def schedule_directory_refresh(self, path):
+        path = os.path.normpath(path)
+        while not os.path.isdir(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return
+
+        with self.condition:
+            self.pending.add(path)
+            self.condition.notify()
+
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.process_refreshes)
+            self.worker.daemon = True
+            self.worker.start()
+
+    def process_refreshes(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                path = self.pending.pop()
+
+            sizes = self.revalidate(path, refresh=True)
+            if sizes and self.updated_callback is not None:
+                self.updated_callback(sizes)
+
+    def close(self):
+        with self.lock, self.read_lock:
+            self.db.close()
+            self.reader.close()
+
+
+class CatalogWatcher(QObject):
+    def __init__(self, metadata_index, interval=REVALIDATE_INTERVAL, restat_interval=RESTAT_INTERVAL):
+        super().__init__()
+
+        self.metadata_index = metadata_index
+        self.worker = None
+        # inotify ограничен max_user_watches, поэтому наблюдаются только корень и раскрытые в дереве каталоги,
+        # остальные догоняет периодическая сверка индекса с диском
+        self.watcher = QFileSystemWatcher([metadata_index.root], self)
+        self.watcher.directoryChanged.connect(self.metadata_index.schedule_directory_refresh)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.revalidate)
+        self.timer.start()
+
+        self.restat_timer = QTimer(self)
+        self.restat_timer.setInterval(restat_interval)
+        self.restat_timer.timeout.connect(self.restat)
+        self.restat_timer.start()
+
+    def watch(self, directory):
+        if os.path.isdir(directory):
+            self.watcher.addPath(directory)
+
+    def unwatch(self, directory):
+        if directory != self.metadata_index.root and directory in self.watcher.directories():
+            self.watcher.removePath(directory)
+
+    def revalidate(self):
+        self.start_worker(self.metadata_index.revalidate)
+
+    def restat(self):
+        self.start_worker(self.metadata_index.restat_batch)
+
+    def start_worker(self, target):
+        # Сверки по таймеру не накапливаются: пока идёт одна, следующая пропускается
+        if self.worker is not None and self.worker.is_alive():
+            return
+        self.worker = threading.Thread(target=self.run_worker, args=(target,), daemon=True)
+        self.worker.start()
+
+    def run_worker(self, target):
+        sizes = target()
+        if sizes and self.metadata_index.updated_callback is not None:
+            self.metadata_index.updated_callback(sizes)
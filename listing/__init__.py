@@ -0,0 +1,219 @@
+import datetime
+import itertools
+import os
+from array import array
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtWidgets import QFileIconProvider, QLabel, QTreeView, QVBoxLayout, QWidget
+
+from System.shared import format_size
+from System.sizes import SIZE_PLACEHOLDER, format_estimate
+
+# Каталоги с большим числом записей открываются в отдельном окне с порционной загрузкой
+LARGE_DIRECTORY_THRESHOLD = 10000
+FETCH_BATCH = 1000
+
+HEADERS = ['Имя', 'Размер', 'Тип', 'Дата изменения']
+
+
+class DirectoryListingModel(QAbstractTableModel):
+    def __init__(self, path, size_cache, size_calculator):
+        super().__init__()
+
+        self.path = os.path.normpath(path)
+        self.size_cache = size_cache
+        self.size_calculator = size_calculator
+        self.size_calculator.sizes_calculated.connect(self.update_directory_sizes)
+        self.size_calculator.size_estimated.connect(self.update_directory_estimate)
+
+        # Строки хранятся по колонкам: имя, признак каталога, размер и mtime (-1 - ещё не прочитаны)
+        self.names = []
+        self.kinds = bytearray()
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.directory_rows = {}
+
+        self.icons = QFileIconProvider()
+        # Каталог мог исчезнуть или оказаться недоступным: модель остаётся пустой, ошибку показывает окно
+        self.error = None
+        try:
+            self.entries = os.scandir(self.path)
+            self.exhausted = False
+        except OSError as error:
+            self.entries = None
+            self.exhausted = True
+            self.error = error.strerror
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent):
+        if parent.isValid() or self.exhausted:
+            return
+
+        batch = []
+        try:
+            for entry in itertools.islice(self.entries, FETCH_BATCH):
+                try:
+                    batch.append((entry.name, entry.is_dir(follow_symlinks=False)))
+                except OSError:
+                    continue
+        except OSError as error:
+            # Чтение оборвалось посреди каталога: уже прочитанное остаётся
+            self.error = error.strerror
+            self.finish_listing()
+
+        if len(batch) < FETCH_BATCH:
+            self.finish_listing()
+        if not batch:
+            return
+
+        first = len(self.names)
+        self.beginInsertRows(QModelIndex(), first, first + len(batch) - 1)
+        for row, (name, is_dir) in enumerate(batch, first):
+            self.names.append(name)
+            self.kinds.append(is_dir)
+            if is_dir:
+                self.directory_rows[name] = row
+        self.sizes.extend([-1] * len(batch))
+        self.mtimes.extend([-1] * len(batch))
+        self.endInsertRows()
+
+    def finish_listing(self):
+        if not self.exhausted:
+            self.exhausted = True
+            self.entries.close()
+
+    def release(self):
+        self.finish_listing()
+        self.size_calculator.cancel_descendants(self.path)
+        self.size_calculator.sizes_calculated.disconnect(self.update_directory_sizes)
+        self.size_calculator.size_estimated.disconnect(self.update_directory_estimate)
+
+    def file_path(self, row):
+        return os.path.join(self.path, self.names[row])
+
+    def load_stat(self, row):
+        # stat делается только для строк, которые вид действительно запросил
+        if self.mtimes[row] < 0:
+            try:
+                stat = os.lstat(self.file_path(row))
+                self.sizes[row] = stat.st_size
+                self.mtimes[row] = stat.st_mtime
+            except OSError:
+                self.sizes[row] = 0
+                self.mtimes[row] = 0
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row, column = index.row(), index.column()
+        is_dir = self.kinds[row]
+
+        if role == Qt.DecorationRole and column == 0:
+            return self.icons.icon(QFileIconProvider.Folder if is_dir else QFileIconProvider.File)
+
+        if role != Qt.DisplayRole:
+            return None
+
+        if column == 0:
+            return self.names[row]
+        if column == 1:
+            if is_dir:
+                return self.directory_size(row)
+            self.load_stat(row)
+            return format_size(self.sizes[row])
+        if column == 2:
+            return 'Папка' if is_dir else 'Файл'
+        if column == 3:
+            self.load_stat(row)
+            return datetime.datetime.fromtimestamp(self.mtimes[row]).strftime("%Y-%m-%d %H:%M:%S")
+        return None
+
+    def directory_size(self, row):
+        path = self.file_path(row)
+        size = self.size_cache.get(path)
+        if size is not None:
+            return format_size(size)
+
+        self.size_calculator.request(path)
+        estimate = self.size_cache.get_estimate(path)
+        return format_estimate(estimate) if estimate else SIZE_PLACEHOLDER
+
+    def update_directory_sizes(self, _sizes, resolved_paths):
+        for path in resolved_paths:
+            self.update_directory_estimate(path)
+
+    def update_directory_estimate(self, path, _estimate=None):
+        if os.path.dirname(path) != self.path:
+            return
+
+        row = self.directory_rows.get(os.path.basename(path))
+        if row is not None:
+            index = self.index(row, 1)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+
+class LargeDirectoryWindow(QWidget):
+    def __init__(self, path, size_cache, size_calculator):
+        super().__init__()
+
+        self.size_cache = size_cache
+        self.size_calculator = size_calculator
+        self.model = None
+
+        self.setGeometry(150, 150, 700, 500)
+
+        layout = QVBoxLayout()
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        self.view = QTreeView()
+        self.view.setRootIsDecorated(False)
+        # Одинаковая высота строк избавляет вид от замера каждой строки при прокрутке
+        self.view.setUniformRowHeights(True)
+        self.view.doubleClicked.connect(self.open_directory)
+        layout.addWidget(self.view)
+
+        self.setLayout(layout)
+
+        self.open_path(path)
+
+    def open_path(self, path):
+        if self.model is not None:
+            self.model.release()
+
+        self.model = DirectoryListingModel(path, self.size_cache, self.size_calculator)
+        self.model.rowsInserted.connect(self.update_status)
+        self.view.setModel(self.model)
+
+        self.setWindowTitle(f'Папка {path}')
+        self.update_status()
+
+    def update_status(self):
+        if self.model.error is not None:
+            self.status_label.setText(f'Не удалось открыть папку: {self.model.error}')
+            return
+        suffix = '' if self.model.exhausted else '…'
+        self.status_label.setText(f'Загружено записей: {self.model.rowCount()}{suffix}')
+
+    def open_directory(self, index):
+        if self.model.kinds[index.row()]:
+            self.open_path(self.model.file_path(index.row()))
+
+    def closeEvent(self, event):
+        self.model.release()
+        super().closeEvent(event)
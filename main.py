@@ -1,5 +1,4 @@
 import datetime
-import shutil
 import os
 import subprocess
 import logging
@@ -8,17 +7,31 @@ import pyudev
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QTreeView, QVBoxLayout, QWidget, QAction,
-    QMenu, QMessageBox, QInputDialog, QFileSystemModel, QLineEdit, QPushButton, QToolBar, QShortcut,
-    QTextEdit, QFileDialog
+    QMenu, QMessageBox, QInputDialog, QLineEdit, QPushButton, QToolBar, QShortcut,
+    QTextEdit, QFileDialog, QDockWidget, QComboBox, QAbstractItemView, QCheckBox
 )
-from PyQt5.QtCore import QModelIndex, Qt, QFileInfo, QDir
+from PyQt5.QtCore import Qt, QDir, pyqtSignal
 from PyQt5.QtGui import QKeySequence, QDrag
 
+from System.grep import ContentSearcher
+from System.archives import CompressJob, ExtractJob, FORMATS, archive_format, strip_archive_extension
+from System.devices import DeviceImportJob
+from System.duplicates import DuplicatesWindow
 from System.folders import create_trash, create_system_folder, create_initial_folders, create_logs
+from System.index import MetadataIndex, CatalogWatcher
+from System.listing import LargeDirectoryWindow
 from System.logs import LogFileDialog, create_logs_with_msg
+from System.models import CustomFileSystemModel
+from System.operations import (
+    FileOperationManager, OperationsPanel, CopyJob, DeleteJob, TrashJob, RenameJob, MoveJob, describe_paths,
+    queue_paths, unique_path, REPLACE, KEEP_BOTH, SKIP
+)
 from System.queue import send_message
-from System.shared import DEFAULT_DIR_CATALOG, directory_size
+from System.search import FilenameIndex, Searcher, MetadataSearcher, SearchPanel, GLOB, REGEX, FUZZY, parse_size
+from System.shared import DEFAULT_DIR_CATALOG, format_size, is_inside
 from System.tasks import DataWindow, UserTableWindow
+from System.trash import DEFAULT_MAX_AGE, DEFAULT_MAX_SIZE, TrashIndex, TrashReaper, TrashSweeper
+from System.usage import DiskUsageWindow
 from System.terminal import TerminalWindow
 
 import sys
@@ -31,26 +44,22 @@ from sysv_ipc import IPC_CREAT, MessageQueue
 KEYS = [1234, 1235, 1236, 1237]
 
 
-class CustomFileSystemModel(QFileSystemModel):
-    def data(self, index, role=Qt.DisplayRole):
-        if role == Qt.DisplayRole and index.column() == 1:
-            file_info = QFileInfo(self.filePath(index))
-            if file_info.isDir():
-                return directory_size(file_info.absoluteFilePath())
-        return super().data(index, role)
-
-
 logging.basicConfig(filename='../superapp.log', level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
 
 class SuperApp(QMainWindow):
+    metadata_updated = pyqtSignal(object)
+    trash_evicted = pyqtSignal(list)
+    device_attached = pyqtSignal(str, object)
+
     def __init__(self):
         super().__init__()
 
         self.queues = None
         self.windows = None
         self.data_thread = None
+        self.index_thread = None
         self.show_tasks_signal = None
         self.dialog = None
         self.add_tasks = None
@@ -66,12 +75,31 @@ class SuperApp(QMainWindow):
         self.terminalButton = None
         self.timer = None
         self.searchButton = None
+        self.submitted_search = None
         self.searchInput = None
+        self.searcher = None
+        self.contentSearcher = None
+        self.searchMode = None
+        self.searchPanel = None
         self.tree = None
         self.model = None
+        self.metadata_index = None
+        self.filename_index = None
+        self.catalog_watcher = None
+        self.large_directory_windows = []
+        self.disk_usage_window = None
+        self.duplicates_window = None
+        self.operations = None
+        self.operationsPanel = None
         self.contextMenu = None
-        self.clipboard_path: str | None = None
+        self.clipboard_paths: list[str] = []
+        self.trash_index = None
+        self.trash_reaper = None
+        self.trash_sweeper = None
         self.original_paths = {}
+        self.device_imports = {}
+        # device_imports меняют поток pyudev и поток интерфейса
+        self.device_lock = threading.Lock()
         self.processListWidget = None
 
         self.init_ui()
@@ -84,6 +112,13 @@ class SuperApp(QMainWindow):
         create_system_folder()
         create_initial_folders()
         create_logs()
+        self.trash_index = TrashIndex()
+        self.trash_reaper = TrashReaper()
+        self.trash_reaper.reap()
+        self.trash_sweeper = TrashSweeper(self.trash_index, self.trash_reaper)
+        self.trash_sweeper.evicted_callback = self.trash_evicted.emit
+        self.trash_evicted.connect(self.log_trash_evictions)
+        self.trash_sweeper.start()
 
         main_menu = self.menuBar()
         file_menu = main_menu.addMenu('Файл')
@@ -120,19 +155,45 @@ class SuperApp(QMainWindow):
         create_root_file_action = QAction('Создать файл в корневой', self)
         create_root_file_action.triggered.connect(self.create_root_file)
 
+        disk_usage_action = QAction('Использование диска', self)
+        disk_usage_action.triggered.connect(self.show_disk_usage)
+
         file_menu.addAction(create_root_folder_action)
         file_menu.addAction(create_root_file_action)
+        duplicates_action = QAction('Поиск дубликатов', self)
+        duplicates_action.triggered.connect(self.show_duplicates)
+
+        file_menu.addAction(disk_usage_action)
+        file_menu.addAction(duplicates_action)
 
         self.contextMenu = QMenu(self)
 
         self.model = CustomFileSystemModel()
+
+        # Размеры из индекса прошлого запуска доступны сразу, сверка с диском идёт в фоне
+        self.metadata_index = MetadataIndex()
+        self.metadata_index.updated_callback = self.metadata_updated.emit
+        self.metadata_updated.connect(self.model.update_directory_sizes)
+        self.model.size_cache.update(self.metadata_index.directory_sizes())
+        self.model.metadata_index = self.metadata_index
+
+        # Поиск по имени обслуживает индекс имён, его держат в актуальном состоянии уведомления inotify
+        # о раскрытых каталогах и периодическая сверка индекса
+        self.filename_index = FilenameIndex()
+        self.catalog_watcher = CatalogWatcher(self.metadata_index)
+
         self.model.setRootPath(DEFAULT_DIR_CATALOG)
 
         self.tree = QTreeView()
         self.tree.setModel(self.model)
         self.tree.setRootIndex(self.model.index(DEFAULT_DIR_CATALOG))
         self.tree.setContextMenuPolicy(3)
+        self.tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.tree.customContextMenuRequested.connect(self.show_context_menu)
+        self.tree.collapsed.connect(self.model.cancel_size_jobs)
+        self.tree.doubleClicked.connect(self.open_large_directory)
+        self.tree.expanded.connect(lambda index: self.catalog_watcher.watch(self.model.filePath(index)))
+        self.tree.collapsed.connect(lambda index: self.catalog_watcher.unwatch(self.model.filePath(index)))
         self.tree.setDragEnabled(True)
         self.tree.setAcceptDrops(True)
         self.tree.setDropIndicatorShown(True)
@@ -151,15 +212,52 @@ class SuperApp(QMainWindow):
         self.searchInput.setPlaceholderText("Поиск по имени файла")
         toolbar.addWidget(self.searchInput)
 
+        self.searchMode = QComboBox()
+        self.searchMode.addItems(["Имя", "Шаблон", "Регулярное выражение", "Нечёткий", "Свойства", "Содержимое"])
+        toolbar.addWidget(self.searchMode)
+
         self.searchButton = QPushButton("Поиск")
         toolbar.addWidget(self.searchButton)
         self.searchButton.clicked.connect(self.search_item)
 
+        # Поиск идёт в фоне, результаты приходят в панель по мере нахождения
+        self.searcher = Searcher(self.filename_index)
+        # Поиск по содержимому раздаёт файлы нескольким процессам
+        self.contentSearcher = ContentSearcher()
+        searchers = {"Имя": self.searcher,
+                     "Шаблон": Searcher(self.filename_index, GLOB),
+                     "Регулярное выражение": Searcher(self.filename_index, REGEX),
+                     "Нечёткий": Searcher(self.filename_index, FUZZY),
+                     "Свойства": MetadataSearcher(self.metadata_index),
+                     "Содержимое": self.contentSearcher}
+        for searcher in searchers.values():
+            searcher.search_finished.connect(self.log_search)
+        self.searchPanel = SearchPanel(searchers)
+        self.searchPanel.result_activated.connect(self.show_path)
+        search_dock = QDockWidget("Результаты поиска", self)
+        search_dock.setWidget(self.searchPanel)
+        self.addDockWidget(Qt.RightDockWidgetArea, search_dock)
+
+        # Копирование и удаление идут в фоновых потоках, ход операций виден в отдельной панели
+        self.operations = FileOperationManager()
+        self.operations.job_finished.connect(self.finish_operation)
+        self.operationsPanel = OperationsPanel(self.operations)
+        operations_dock = QDockWidget("Операции", self)
+        operations_dock.setWidget(self.operationsPanel)
+        self.addDockWidget(Qt.BottomDockWidgetArea, operations_dock)
+
+        self.searchInput.textChanged.connect(self.searchPanel.schedule)
+        self.searchInput.returnPressed.connect(self.search_item)
+        self.searchMode.currentTextChanged.connect(self.change_search_mode)
+
+        next_match_shortcut = QShortcut(QKeySequence("F3"), self)
+        next_match_shortcut.activated.connect(self.searchPanel.select_next)
+
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
 
-        self.clipboard_path = None
+        self.clipboard_paths = []
 
         delete_shortcut = QShortcut(QKeySequence.Delete, self)
         delete_shortcut.activated.connect(self.delete_item)
@@ -208,6 +306,7 @@ class SuperApp(QMainWindow):
         self.udev_context = pyudev.Context()
         self.monitor = pyudev.Monitor.from_netlink(self.udev_context)
         self.monitor.filter_by(subsystem='block')
+        self.device_attached.connect(self.import_device)
         self.observer = pyudev.MonitorObserver(self.monitor, self.handle_device_event)
         self.observer.start()
 
@@ -221,6 +320,17 @@ class SuperApp(QMainWindow):
         self.data_thread.daemon = True
         self.data_thread.start()
 
+        self.index_thread = threading.Thread(target=self.revalidate_metadata_index)
+        self.index_thread.daemon = True
+        self.index_thread.start()
+
+    def import_device(self, device_directory, job):
+        # Устанавливаем созданный каталог как корневой для модели
+        self.model.setRootPath(device_directory)
+
+        # Если устройство успели извлечь, отменённая операция сразу завершится и уйдёт из device_imports
+        self.operations.start(job)
+
     def open_windows(self):
         if not self.windows:
             for i in range(4):
@@ -231,6 +341,19 @@ class SuperApp(QMainWindow):
                 self.windows.append(window)
                 window.show()
 
+    def revalidate_metadata_index(self):
+        sizes = self.metadata_index.revalidate()
+        if sizes:
+            self.metadata_updated.emit(sizes)
+
+        self.metadata_index.subscribe(self.apply_index_changes, self.build_filename_index)
+
+    def build_filename_index(self, entries):
+        self.filename_index.build(entries)
+
+    def apply_index_changes(self, added, removed):
+        self.filename_index.apply_changes(added, removed)
+
     def collect_data(self):
         while True:
             w_output = subprocess.check_output(["w"]).decode("utf-8")
@@ -268,8 +391,12 @@ class SuperApp(QMainWindow):
                 device_directory = os.path.join(app_directory, device_name)
                 os.makedirs(device_directory, exist_ok=True)
 
-                # Устанавливаем созданный каталог как корневой для модели
-                self.model.setRootPath(device_directory)
+                # Операция регистрируется сразу, чтобы извлечение, пришедшее раньше её запуска, могло её отменить.
+                # Обработчик вызывается в потоке pyudev: модель и очередь операций трогаем только из потока интерфейса
+                job = DeviceImportJob(self.operations, device_name, device_path, device_directory)
+                with self.device_lock:
+                    self.device_imports[device_name] = job
+                self.device_attached.emit(device_directory, job)
 
                 print(f"Подключено устройство: {device_name} ({device_path})")
 
@@ -278,10 +405,19 @@ class SuperApp(QMainWindow):
                 if path == device.device_node:
                     del self.original_paths[name]
 
-                    # Удаляем каталог для устройства
+                    # Недокопированное догонит следующий импорт по манифесту
+                    with self.device_lock:
+                        job = self.device_imports.pop(name, None)
+                    if job is not None:
+                        job.cancel()
+
+                    # В каталоге устройства лежит импортированная копия, удаляем его, только если он пуст
                     app_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
                     device_directory = os.path.join(app_directory, name)
-                    shutil.rmtree(device_directory, ignore_errors=True)
+                    try:
+                        os.rmdir(device_directory)
+                    except OSError:
+                        pass
 
                     print(f"Отключено устройство: {name} ({path})")
                     break
@@ -323,6 +459,11 @@ class SuperApp(QMainWindow):
         create_logs_with_msg(log_message_with_time, log_path)
         send_message(queue_message)
 
+    def refresh_paths(self, *paths):
+        # QFileSystemModel сам отслеживает загруженные каталоги, поэтому вместо сброса всей модели
+        # достаточно сбросить размеры изменившихся записей и их предков и обновить индекс
+        self.model.invalidate_sizes([path for path in paths if path])
+
     def select_log_file(self):
         dialog = LogFileDialog()
         if dialog.exec_():
@@ -332,19 +473,33 @@ class SuperApp(QMainWindow):
             with open(log_file_path, 'r') as file:
                 self.log_widget.setText(file.read())
 
+    def selected_paths(self):
+        paths = {self.model.filePath(index) for index in self.tree.selectionModel().selectedRows()}
+        if not paths and self.tree.currentIndex().isValid():
+            paths = {self.model.filePath(self.tree.currentIndex())}
+
+        selected = []
+        for path in sorted(paths):
+            # Вложенные объекты отбрасываются: их и так затронет операция над выбранной папкой
+            parent = os.path.dirname(path)
+            while parent not in paths and os.path.dirname(parent) != parent:
+                parent = os.path.dirname(parent)
+            if path and parent not in paths:
+                selected.append(path)
+        return selected
+
     def copy_item(self):
-        index = self.tree.currentIndex()
-        file_path = self.model.filePath(index)
+        file_paths = self.selected_paths()
 
-        if file_path:
-            if file_path.endswith('/System') or file_path.endswith('/Корзина'):
+        if file_paths:
+            if any(path.endswith('/System') or path.endswith('/Корзина') for path in file_paths):
                 QMessageBox.warning(self, 'Ошибка', 'Эту папку нельзя скопировать!')
                 return
 
-            self.clipboard_path = file_path
+            self.clipboard_paths = file_paths
 
-            queue_message = f"MOVE_FILE|{file_path}"
-            log_message = f"Файл {os.path.basename(file_path)} успешно скопирован."
+            queue_message = f"MOVE_FILE|{queue_paths(file_paths)}"
+            log_message = f"Файл {describe_paths(file_paths)} успешно скопирован."
             log_path = "../logs/actions.log"
 
             self.update_processes(queue_message, log_message, log_path)
@@ -352,7 +507,7 @@ class SuperApp(QMainWindow):
             QMessageBox.warning(self, 'Ошибка', 'Не выбран элемент для копирования!')
 
     def paste_item(self):
-        if not self.clipboard_path:
+        if not self.clipboard_paths:
             QMessageBox.warning(self, 'Ошибка', 'Нечего вставлять!')
             return
 
@@ -362,27 +517,34 @@ class SuperApp(QMainWindow):
             QMessageBox.warning(self, 'Ошибка', 'Выберите папку для вставки!')
             return
 
-        destination_path = os.path.join(destination_folder, os.path.basename(self.clipboard_path))
-
-        if os.path.exists(destination_path):
-            QMessageBox.warning(self, 'Ошибка', 'Файл или папка с таким именем уже существует!')
+        conflicts = [path for path in self.clipboard_paths
+                     if os.path.exists(os.path.join(destination_folder, os.path.basename(path)))]
+        if conflicts:
+            QMessageBox.warning(self, 'Ошибка', 'Файл или папка с таким именем уже существует: '
+                                              f'{describe_paths(conflicts)}')
             return
 
-        if os.path.isfile(self.clipboard_path):
-            shutil.copy2(self.clipboard_path, destination_path)
-        elif os.path.isdir(self.clipboard_path):
-            shutil.copytree(self.clipboard_path, destination_path)
+        self.operations.start(CopyJob(self.operations, self.clipboard_paths, destination_folder))
 
-        root_path = self.model.rootPath()
-        self.model.setRootPath('')
-        self.model.setRootPath(root_path)
-
-        queue_message = f"PASTE_ITEM||{destination_path}"
-        log_message = f"Файл {os.path.basename(self.clipboard_path)} успешно вставлен в {destination_folder}."
-        log_path = "../logs/actions.log"
+    def finish_operation(self, job):
+        self.refresh_paths(*job.changed_paths)
 
+        queue_message, log_message, log_path = job.report()
         self.update_processes(queue_message, log_message, log_path)
 
+        if isinstance(job, DeleteJob) and self.trash_index.forget(job.paths):
+            # Размеры папок корзины, из которых удалили часть, измерит проход очистки
+            self.trash_sweeper.wake()
+        if isinstance(job, TrashJob):
+            self.trash_sweeper.wake()
+        if isinstance(job, DeviceImportJob):
+            with self.device_lock:
+                if self.device_imports.get(job.label) is job:
+                    del self.device_imports[job.label]
+
+        if job.errors:
+            QMessageBox.warning(self, 'Ошибка', f"{log_message}\n\n" + '\n'.join(job.errors[:10]))
+
     def open_terminal(self):
         self.terminal = TerminalWindow()
         self.terminal.show()
@@ -429,7 +591,7 @@ class SuperApp(QMainWindow):
         event.accept()
 
     def dropEvent(self, event):
-        source_indexes = self.tree.selectedIndexes()
+        source_paths = self.selected_paths()
         target_index = self.tree.indexAt(event.pos())
         target_path = self.model.filePath(target_index)
 
@@ -437,27 +599,64 @@ class SuperApp(QMainWindow):
         if not os.path.isdir(target_path) or target_path == self.model.rootPath():
             target_path = DEFAULT_DIR_CATALOG
 
-        if not self.is_valid_move(source_indexes, target_path):
+        if not self.is_valid_move(source_paths, target_path):
             QMessageBox.warning(self, "Invalid Operation", "Cannot move or rename 'Система' or 'Корзина' folders.")
             event.setDropAction(Qt.IgnoreAction)
             event.ignore()
             return
 
-        for source_index in source_indexes:
-            source_path = self.model.filePath(source_index)
-            base_name = os.path.basename(source_path)
-            new_path = os.path.join(target_path, base_name)
-            if os.path.exists(new_path):
-                return
-            os.rename(source_path, new_path)
+        # Объекты, которые уже лежат в целевой папке, перемещать некуда
+        source_paths = [path for path in source_paths
+                        if os.path.dirname(path).rstrip(os.sep) != target_path.rstrip(os.sep)]
+        if not source_paths:
+            return
 
-        self.model.setRootPath(DEFAULT_DIR_CATALOG)
+        resolutions = self.resolve_conflicts(source_paths, target_path)
+        if resolutions is None:
+            event.ignore()
+            return
 
-    def is_valid_move(self, source_indexes, target_path):
+        self.operations.start(MoveJob(self.operations, source_paths, target_path, resolutions))
+
+    def resolve_conflicts(self, source_paths, target_path):
+        conflicts = [path for path in source_paths
+                     if os.path.lexists(os.path.join(target_path, os.path.basename(path)))]
+        resolutions = {}
+        apply_to_all = None
+
+        for number, source_path in enumerate(conflicts):
+            if apply_to_all is not None:
+                resolutions[source_path] = apply_to_all
+                continue
+
+            box = QMessageBox(self)
+            box.setIcon(QMessageBox.Question)
+            box.setWindowTitle('Совпадение имён')
+            box.setText(f'В папке {target_path} уже есть объект {os.path.basename(source_path)}.')
+            buttons = {
+                box.addButton('Заменить', QMessageBox.AcceptRole): REPLACE,
+                box.addButton('Оставить оба', QMessageBox.AcceptRole): KEEP_BOTH,
+                box.addButton('Пропустить', QMessageBox.RejectRole): SKIP,
+            }
+            box.addButton('Отменить перемещение', QMessageBox.DestructiveRole)
+            remaining = len(conflicts) - number - 1
+            if remaining:
+                box.setCheckBox(QCheckBox(f'Применить к остальным совпадениям ({remaining})'))
+            box.exec_()
+
+            resolution = buttons.get(box.clickedButton())
+            if resolution is None:
+                return None
+            resolutions[source_path] = resolution
+            if remaining and box.checkBox().isChecked():
+                apply_to_all = resolution
+
+        return resolutions
+
+    def is_valid_move(self, source_paths, target_path):
         restricted_folders = ['System', 'Корзина']
 
-        for source_index in source_indexes:
-            source_path = self.model.filePath(source_index)
+        for source_path in source_paths:
             source_folder_name = os.path.basename(source_path)
             if source_folder_name in restricted_folders:
                 return False
@@ -490,7 +689,8 @@ class SuperApp(QMainWindow):
                                 'CTRL + N: Создание файла в выбранной папке\n'
                                 'CTRL + SHIFT + ALT + T: Открытие терминала\n'
                                 'CTRL + R: Переименование объекта (файл, папка)\n'
-                                'CTRL + I: Восстановить объекта (файл, папка)\n')
+                                'CTRL + I: Восстановить объекта (файл, папка)\n'
+                                'F3: Следующий результат поиска\n')
 
         queue_message = "SHORTCUTS"
         log_message = f"Вкладка 'Горячие клавиши' успешно открыта."
@@ -524,10 +724,15 @@ class SuperApp(QMainWindow):
         self.contextMenu.clear()
 
         if file_path.endswith('/Корзина'):
-            clear_trash_action = QAction('Очистить корзину', self)
+            clear_trash_action = QAction(f'Очистить корзину ({self.trash_index.count} шт., '
+                                         f'{format_size(self.trash_index.total_size)})', self)
             clear_trash_action.triggered.connect(self.clear_trash)
 
+            trash_policy_action = QAction('Правила хранения', self)
+            trash_policy_action.triggered.connect(self.edit_trash_policy)
+
             self.contextMenu.addAction(clear_trash_action)
+            self.contextMenu.addAction(trash_policy_action)
         else:
             if file_path.startswith(f'{DEFAULT_DIR_CATALOG}/Корзина'):
                 restore_action = QAction('Восстановить (CTRL + I)', self)
@@ -553,11 +758,21 @@ class SuperApp(QMainWindow):
                     rename_action = QAction('Переименовать CTRL + R', self)
                     rename_action.triggered.connect(self.rename_item)
 
+                    compress_action = QAction('Сжать', self)
+                    compress_action.triggered.connect(self.compress_item)
+
                     self.contextMenu.addAction(open_action)
                     self.contextMenu.addAction(delete_action)
                     self.contextMenu.addAction(delete_immediately_action)
                     self.contextMenu.addAction(rename_action)
+                    self.contextMenu.addAction(compress_action)
+                    if archive_format(file_path):
+                        extract_action = QAction('Распаковать', self)
+                        extract_action.triggered.connect(lambda: self.extract_item(file_path))
+                        self.contextMenu.addAction(extract_action)
                 else:
+                    open_large_action = QAction('Открыть постранично', self)
+                    open_large_action.triggered.connect(lambda: self.show_large_directory(file_path))
                     create_folder_action = QAction('Создать папку', self)
                     create_folder_action.triggered.connect(self.create_folder_item)
                     create_file_action = QAction('Создать файл CTRL + N', self)
@@ -569,17 +784,92 @@ class SuperApp(QMainWindow):
                     delete_immediately_action = QAction('Удалить сразу CTRL + DELETE', self)
                     delete_immediately_action.triggered.connect(self.delete_immediately_item)
 
+                    self.contextMenu.addAction(open_large_action)
                     self.contextMenu.addAction(create_folder_action)
                     self.contextMenu.addAction(create_file_action)
                     self.contextMenu.addAction(rename_action)
                     self.contextMenu.addAction(delete_action)
                     self.contextMenu.addAction(delete_immediately_action)
+                    compress_action = QAction('Сжать', self)
+                    compress_action.triggered.connect(self.compress_item)
+                    self.contextMenu.addAction(compress_action)
 
         message = f"CONTEXT_MENU|{file_path}"
         send_message(message)
 
         self.contextMenu.exec_(self.tree.mapToGlobal(pos))
 
+    def compress_item(self):
+        file_paths = self.selected_paths()
+        if not file_paths:
+            return
+
+        format_name, ok = QInputDialog.getItem(self, "Сжатие", "Формат архива:", FORMATS, 0, False)
+        if not ok:
+            return
+
+        name = os.path.basename(file_paths[0]) if len(file_paths) == 1 else 'Архив'
+        archive_path = unique_path(os.path.join(os.path.dirname(file_paths[0]), f'{name}.{format_name}'))
+        self.operations.start(CompressJob(self.operations, file_paths, archive_path, format_name))
+
+    def extract_item(self, archive_path):
+        # Содержимое распаковывается в новую папку рядом с архивом, а не вперемешку с соседними файлами
+        destination = unique_path(strip_archive_extension(archive_path))
+        self.operations.start(ExtractJob(self.operations, archive_path, destination))
+
+    def open_large_directory(self, index):
+        if self.model.is_large_directory(index.sibling(index.row(), 0)):
+            self.show_large_directory(self.model.filePath(index))
+
+    def show_large_directory(self, path):
+        window = LargeDirectoryWindow(path, self.model.size_cache, self.model.size_calculator)
+        self.large_directory_windows = [w for w in self.large_directory_windows if w.isVisible()] + [window]
+        window.show()
+
+        queue_message = f"OPEN_LARGE_DIRECTORY|{path}"
+        log_message = f"Папка {path} открыта в режиме постраничной загрузки."
+        log_path = "../logs/actions.log"
+
+        self.update_processes(queue_message, log_message, log_path)
+
+    def show_disk_usage(self):
+        if self.disk_usage_window is None:
+            self.disk_usage_window = DiskUsageWindow()
+            self.model.paths_changed.connect(self.disk_usage_window.update_paths)
+            self.metadata_updated.connect(self.disk_usage_window.update_directory_sizes)
+        self.disk_usage_window.show()
+
+        queue_message = "DISK_USAGE"
+        log_message = "Окно 'Использование диска' успешно открыто."
+        log_path = "../logs/actions.log"
+
+        self.update_processes(queue_message, log_message, log_path)
+
+    def show_duplicates(self):
+        if self.duplicates_window is None:
+            self.duplicates_window = DuplicatesWindow()
+            self.duplicates_window.trash_requested.connect(self.trash_duplicates)
+            self.model.paths_changed.connect(self.duplicates_window.update_paths)
+        else:
+            self.duplicates_window.scan()
+        self.duplicates_window.show()
+
+        queue_message = "FIND_DUPLICATES"
+        log_message = "Окно 'Поиск дубликатов' успешно открыто."
+        log_path = "../logs/actions.log"
+
+        self.update_processes(queue_message, log_message, log_path)
+
+    def trash_duplicates(self, paths):
+        reply = QMessageBox.question(self, 'Поиск дубликатов',
+                                     f'Переместить в корзину копий: {len(paths)}?',
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+
+        self.operations.start(TrashJob(self.operations, [path for path in paths if os.path.exists(path)],
+                                       self.trash_index.move_to_trash))
+
     def create_root_folder(self):
         new_folder_name, ok = QInputDialog.getText(self, "Создание папки в корневой директории", "Введите имя папки:")
         if ok and new_folder_name:
@@ -587,8 +877,7 @@ class SuperApp(QMainWindow):
             new_folder_path = os.path.join(root_path, new_folder_name)
             if not os.path.exists(new_folder_path):
                 os.makedirs(new_folder_path)
-                self.model.setRootPath('')
-                self.model.setRootPath(root_path)
+                self.refresh_paths(new_folder_path)
 
                 queue_message = "CREATE_ROOT_FOLDER"
                 log_message = f"Папка {new_folder_name} успешно создана в корневой директории."
@@ -605,8 +894,7 @@ class SuperApp(QMainWindow):
             root_path = self.model.rootPath()
             new_file_path = os.path.join(root_path, new_file_name)
             open(new_file_path, 'a').close()
-            self.model.setRootPath('')
-            self.model.setRootPath(root_path)
+            self.refresh_paths(new_file_path)
 
             queue_message = "CREATE_ROOT_FILE"
             log_message = f"Файл {new_file_name} успешно создан в корневой директории."
@@ -627,9 +915,7 @@ class SuperApp(QMainWindow):
                 return
 
             os.makedirs(full_folder_path)
-            root_path = self.model.rootPath()
-            self.model.setRootPath('')
-            self.model.setRootPath(root_path)
+            self.refresh_paths(full_folder_path)
 
             queue_message = f"CREATE_FOLDER_ITEM|{file_path}"
             log_message = f"Папка {new_folder_name} успешно создана в {file_path}."
@@ -653,9 +939,7 @@ class SuperApp(QMainWindow):
                 return
 
             open(full_file_path, 'a').close()
-            root_path = self.model.rootPath()
-            self.model.setRootPath('')
-            self.model.setRootPath(root_path)
+            self.refresh_paths(full_file_path)
 
             queue_message = f"CREATE_FILE_ITEM|{file_path}"
             log_message = f"Файл {new_file_name} успешно создан в {file_path}."
@@ -664,78 +948,70 @@ class SuperApp(QMainWindow):
             self.update_processes(queue_message, log_message, log_path)
 
     def rename_item(self):
-        index = self.tree.currentIndex()
-        file_path = self.model.filePath(index)
+        file_paths = self.selected_paths()
+        if not file_paths:
+            return
 
-        if file_path.endswith('/System') or file_path.endswith('/Корзина'):
+        if any(path.endswith('/System') or path.endswith('/Корзина') for path in file_paths):
             QMessageBox.warning(self, 'Ошибка', 'Эту папку нельзя переименовать!')
             return
 
-        new_name, ok = QInputDialog.getText(self, "Переименование", "Введите новое имя:")
-        if ok and new_name:
-            os.rename(file_path, os.path.join(os.path.dirname(file_path), new_name))
-            root_path = self.model.rootPath()
-            self.model.setRootPath('')
-            self.model.setRootPath(root_path)
+        if len(file_paths) == 1:
+            new_name, ok = QInputDialog.getText(self, "Переименование", "Введите новое имя:")
+        else:
+            new_name, ok = QInputDialog.getText(self, "Переименование",
+                                                f"Введите новое имя для {len(file_paths)} объектов "
+                                                "({n} заменяется номером):")
+        if not (ok and new_name):
+            return
 
-            queue_message = f"RENAME_ITEM|{file_path}"
-            log_message = f"Объект успешно переименован в {new_name}."
-            log_path = "files.log"
+        renames = []
+        for number, file_path in enumerate(file_paths, 1):
+            if len(file_paths) == 1:
+                name = new_name
+            elif '{n}' in new_name:
+                name = new_name.replace('{n}', str(number))
+            else:
+                stem, extension = os.path.splitext(new_name)
+                name = f"{stem} ({number}){extension}"
+            renames.append((file_path, os.path.join(os.path.dirname(file_path), name)))
 
-            self.update_processes(queue_message, log_message, log_path)
+        self.operations.start(RenameJob(self.operations, renames))
 
-    def protect_source(self):
-        index = self.tree.currentIndex()
-        file_path = self.model.filePath(index)
+    def protect_sources(self):
+        file_paths = self.selected_paths()
 
-        if '/System' in file_path or file_path.endswith('/Корзина'):
+        if any('/System' in path or path.endswith('/Корзина') for path in file_paths):
             QMessageBox.warning(self, 'Ошибка', 'Эту папку нельзя удалить!')
-            return
+            return []
 
-        return file_path
+        return file_paths
 
     def delete_item(self):
-        index = self.tree.currentIndex()
-        file_path = self.protect_source()
-
-        trash_path = os.path.join(DEFAULT_DIR_CATALOG, 'Корзина')
-        trash_file_path = os.path.join(trash_path, os.path.basename(file_path))
-
-        self.original_paths[trash_file_path] = file_path
-
-        os.rename(file_path, trash_file_path)
-
-        queue_message = f"DELETE_ITEM|{file_path}"
-        log_message = f"Файл или папка {os.path.basename(file_path)} успешно удалены."
-        log_path = "delete.log"
+        file_paths = self.protect_sources()
+        if not file_paths:
+            return
 
-        self.update_processes(queue_message, log_message, log_path)
+        # Из самой корзины объекты удаляются навсегда, а не переносятся в неё повторно
+        trashed_paths = [path for path in file_paths if is_inside(path, self.trash_index.trash_path)]
+        file_paths = [path for path in file_paths if path not in trashed_paths]
+        if trashed_paths:
+            self.operations.start(DeleteJob(self.operations, trashed_paths))
+        if file_paths:
+            self.operations.start(TrashJob(self.operations, file_paths, self.trash_index.move_to_trash))
 
     def delete_immediately_item(self):
-        index = self.tree.currentIndex()
-        file_path = self.protect_source()
-
-        if os.path.isfile(file_path) or os.path.islink(file_path):
-            os.remove(file_path)
-        elif os.path.isdir(file_path):
-            import shutil
-            shutil.rmtree(file_path)
-
-        root_path = self.model.rootPath()
-        self.model.setRootPath('')
-        self.model.setRootPath(root_path)
-
-        queue_message = f"DELETE_IMMEDIATELY_ITEM|{file_path}"
-        log_message = f"Файл или папка {os.path.basename(file_path)} успешно удалены навсегда."
-        log_path = "delete.log"
+        file_paths = self.protect_sources()
+        if not file_paths:
+            return
 
-        self.update_processes(queue_message, log_message, log_path)
+        self.operations.start(DeleteJob(self.operations, file_paths))
 
     def restore_item(self):
         index = self.tree.currentIndex()
         file_path = self.model.filePath(index)
 
-        original_path = self.original_paths.get(file_path, None)
+        original_path = self.trash_index.original_path(file_path)
         if not original_path:
             QMessageBox.warning(self, 'Ошибка', 'Не удалось определить исходный путь файла!')
             return
@@ -743,17 +1019,12 @@ class SuperApp(QMainWindow):
         new_name, ok = QInputDialog.getText(self, "Восстановление",
                                             "Введите новое имя (или оставьте пустым для оригинального имени):")
         if ok:
-            if not new_name:
-                new_name = os.path.basename(original_path)
-            new_file_path = os.path.join(original_path, new_name)
-
-            if not os.path.exists(os.path.dirname(new_file_path)):
-                os.makedirs(os.path.dirname(new_file_path))
-
-            os.rename(file_path, new_file_path)
-            root_path = self.model.rootPath()
-            self.model.setRootPath('')
-            self.model.setRootPath(root_path)
+            try:
+                new_file_path = self.trash_index.restore(file_path, new_name)
+            except OSError as error:
+                QMessageBox.warning(self, 'Ошибка', f'Не удалось восстановить объект: {error.strerror}')
+                return
+            self.refresh_paths(file_path, new_file_path)
 
             queue_message = f"RESTORE_ITEM|{file_path}"
             log_message = f"Объект успешно восстановлен в {new_file_path}."
@@ -766,17 +1037,14 @@ class SuperApp(QMainWindow):
                                      'Уверены ли вы, что хотите очистить корзину?',
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.Yes:
-            trash_path = os.path.join(DEFAULT_DIR_CATALOG, 'Корзина')
-            for filename in os.listdir(trash_path):
-                file_path = os.path.join(trash_path, filename)
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.remove(file_path)
-                elif os.path.isdir(file_path):
-                    import shutil
-                    shutil.rmtree(file_path)
-            root_path = self.model.rootPath()
-            self.model.setRootPath('')
-            self.model.setRootPath(root_path)
+            try:
+                self.trash_index.empty()
+            except OSError as error:
+                QMessageBox.warning(self, 'Ошибка', f'Не удалось очистить корзину: {error.strerror}')
+                return
+            # Содержимое удаляется в фоне, корзина уже пуста
+            self.trash_reaper.reap()
+            self.refresh_paths(self.trash_index.trash_path)
 
             queue_message = "CLEAR_TRASH"
             log_message = "Корзина успешно очищена."
@@ -786,50 +1054,88 @@ class SuperApp(QMainWindow):
         else:
             return
 
-    def search_item(self):
-        search_text = self.searchInput.text().strip()
-        if not search_text:
-            root_path = self.model.rootPath()
-            self.model.setRootPath('')
-            self.model.setRootPath(root_path)
+    def edit_trash_policy(self):
+        # Пока правила не сохранены, в диалоге предлагаются значения по умолчанию
+        max_size, max_age = self.trash_index.policy() or (DEFAULT_MAX_SIZE, DEFAULT_MAX_AGE)
+
+        size_text, ok = QInputDialog.getText(self, "Правила хранения",
+                                             "Наибольший размер корзины (например 10G, 0 - без ограничения):",
+                                             text=format_size(max_size).replace('B', '').strip() if max_size else '0')
+        if not ok:
+            return
+        try:
+            max_size = parse_size(size_text)
+        except ValueError as error:
+            QMessageBox.warning(self, 'Ошибка', str(error))
             return
 
-        matches = self.find_items(search_text, Qt.MatchContains | Qt.MatchRecursive, 0)
+        days, ok = QInputDialog.getInt(self, "Правила хранения",
+                                       "Сколько дней хранить объекты в корзине (0 - без ограничения):",
+                                       max_age // (24 * 60 * 60), 0, 36500)
+        if not ok:
+            return
 
-        if matches:
-            first_match = matches[0]
-            self.tree.setCurrentIndex(first_match)
-            self.tree.scrollTo(first_match)
+        self.trash_index.set_policy(max_size, days * 24 * 60 * 60)
+        self.trash_sweeper.wake()
 
-            queue_message = f"SEARCH_ITEM|{search_text}"
-            log_message = f"Поиск завершен. Найдено {len(matches)} совпадений."
-            log_path = "trash.log"
+        queue_message = f"TRASH_POLICY|{max_size}|{days}"
+        size_limit = format_size(max_size) if max_size else 'без ограничения'
+        age_limit = f'{days} дн.' if days else 'без ограничения'
+        log_message = f"Правила хранения корзины: размер {size_limit}, срок {age_limit}."
+        log_path = "trash.log"
 
-            self.update_processes(queue_message, log_message, log_path)
-        else:
-            QMessageBox.information(self, 'Поиск', f'Файл или папка с именем "{search_text}" не найдены.')
+        self.update_processes(queue_message, log_message, log_path)
 
-    def find_items(self, text, _flags, _column):
-        matches = []
-        stack = [self.model.index(0, 0, QModelIndex())]
+    def log_trash_evictions(self, evicted):
+        self.refresh_paths(self.trash_index.trash_path)
+
+        # Каждый вытесненный объект - отдельной строкой лога, в очередь уходит только сводка
+        total_size = sum(size for _name, _original_path, _deleted_at, size, _reason in evicted)
+        lines = []
+        for name, original_path, deleted_at, size, reason in evicted:
+            # Время удаления объектов, найденных сверкой корзины, неизвестно
+            deleted = (datetime.datetime.fromtimestamp(deleted_at).strftime('%Y-%m-%d %H:%M:%S')
+                       if deleted_at is not None else 'неизвестно когда')
+            lines.append(f"  {original_path or name} ({format_size(size)}, удалён {deleted}, причина: {reason})")
+
+        queue_message = f"TRASH_EVICT|{len(evicted)}|{total_size}"
+        log_message = '\n'.join([f"Из корзины удалено по правилам хранения {len(evicted)} шт. "
+                                 f"({format_size(total_size)}):"] + lines)
+        log_path = "trash.log"
 
-        while stack:
-            index = stack.pop()
-            if index.isValid():
-                text_data = self.model.data(index, Qt.DisplayRole)
-                if text_data and text in text_data:
-                    matches.append(index)
+        self.update_processes(queue_message, log_message, log_path)
 
-                if self.model.hasChildren(index):
-                    for row in range(self.model.rowCount(index)):
-                        stack.append(self.model.index(row, 0, index))
+    def search_item(self):
+        # В лог попадают только поиски, запущенные кнопкой или Enter, а не промежуточные при наборе
+        self.submitted_search = self.searchInput.text().strip()
+        self.searchPanel.start(self.submitted_search)
+
+    def change_search_mode(self, mode):
+        self.searchPanel.set_mode(mode)
+        placeholders = {"Шаблон": "Шаблон имени, например *.txt",
+                        "Регулярное выражение": "Регулярное выражение для имени",
+                        "Нечёткий": "Буквы имени по порядку",
+                        "Свойства": "size>1G mtime<7d ext:mp4 type:file in:folder2",
+                        "Содержимое": "Поиск по содержимому файлов"}
+        self.searchInput.setPlaceholderText(placeholders.get(mode, "Поиск по имени файла"))
+        self.searchPanel.schedule(self.searchInput.text())
+
+    def show_path(self, path):
+        index = self.model.index(path)
+        if index.isValid():
+            self.tree.setCurrentIndex(index)
+            self.tree.scrollTo(index)
+
+    def log_search(self, search_text, count):
+        if search_text != self.submitted_search:
+            return
+        self.submitted_search = None
 
-        queue_message = f"FIND_ITEMS|{matches}"
-        log_message = f"Поиск завершен. Найдено {len(matches)} совпадений."
+        queue_message = f"SEARCH_ITEM|{search_text}|{count}"
+        log_message = f"Поиск завершен. Найдено {count} совпадений."
         log_path = "trash.log"
 
         self.update_processes(queue_message, log_message, log_path)
-        return matches
 
 
 if __name__ == '__main__':
@@ -0,0 +1,144 @@
+import os
+
+from PyQt5.QtCore import QModelIndex, Qt, pyqtSignal
+from PyQt5.QtWidgets import QFileSystemModel
+
+from System.listing import LARGE_DIRECTORY_THRESHOLD
+from System.shared import format_size
+from System.sizes import DirectorySizeCache, DirectorySizeCalculator, SIZE_PLACEHOLDER, format_estimate
+
+LARGE_DIRECTORY_NOTE = f' (больше {LARGE_DIRECTORY_THRESHOLD} записей, открыть - двойной щелчок)'
+
+
+class CustomFileSystemModel(QFileSystemModel):
+    paths_changed = pyqtSignal(list)
+
+    def __init__(self):
+        super().__init__()
+
+        self.size_cache = DirectorySizeCache()
+        self.size_calculator = DirectorySizeCalculator()
+        self.size_calculator.sizes_calculated.connect(self.set_directory_sizes)
+        self.size_calculator.size_estimated.connect(self.set_directory_estimate)
+        self.metadata_index = None
+        # Каталоги, размер которых вид уже запрашивал: только у них есть узлы модели, которые стоит перерисовать
+        self.displayed_paths = set()
+        # canFetchMore вызывается очень часто, поэтому ответ "большой ли каталог" запоминается
+        self.large_directories = {}
+
+        # Сигналы rowsInserted и dataChanged приходят и при обычной ленивой загрузке каталогов, и при наших
+        # собственных обновлениях размеров, поэтому размеры сбрасываются только по настоящим изменениям:
+        # переименованию через модель, завершённым операциям (invalidate_sizes) и наблюдателю индекса
+        self.fileRenamed.connect(self.invalidate_renamed)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.column() == 1 and self.isDir(index):
+            path = self.filePath(index)
+            self.displayed_paths.add(path)
+            size = self.size_cache.get(path)
+            if size is None:
+                self.size_calculator.request(path)
+                estimate = self.size_cache.get_estimate(path)
+                return format_estimate(estimate) if estimate else SIZE_PLACEHOLDER
+            return format_size(size)
+        if role == Qt.DisplayRole and index.column() == 0 and self.is_large_directory(index):
+            # Вместо пустого раскрывающегося узла - подпись, что содержимое открывается отдельно
+            return super().data(index, role) + LARGE_DIRECTORY_NOTE
+        return super().data(index, role)
+
+    def hasChildren(self, parent=QModelIndex()):
+        # Каталоги с огромным числом записей не загружаем в дерево целиком, они открываются в LargeDirectoryWindow
+        if self.is_large_directory(parent):
+            return False
+        return super().hasChildren(parent)
+
+    def canFetchMore(self, parent):
+        if self.is_large_directory(parent):
+            return False
+        return super().canFetchMore(parent)
+
+    def is_large_directory(self, index):
+        if not index.isValid() or not self.isDir(index):
+            return False
+        path = self.filePath(index)
+        large = self.large_directories.get(path)
+        if large is None:
+            large = self.large_directories[path] = self.count_children(path) > LARGE_DIRECTORY_THRESHOLD
+        return large
+
+    def count_children(self, path):
+        # Записи считаются только до порога
+        entry = self.metadata_index.entry(path) if self.metadata_index is not None else None
+        if entry is not None and entry[3] >= 0:
+            return self.metadata_index.child_count(path, LARGE_DIRECTORY_THRESHOLD + 1)
+
+        # Каталог ещё не проиндексирован (mtime = -1 или записи нет)
+        count = 0
+        try:
+            with os.scandir(path) as entries:
+                for _entry in entries:
+                    count += 1
+                    if count > LARGE_DIRECTORY_THRESHOLD:
+                        break
+        except OSError:
+            pass
+        return count
+
+    def setRootPath(self, path):
+        self.size_calculator.cancel_all()
+        return super().setRootPath(path)
+
+    def set_directory_sizes(self, sizes, resolved_paths):
+        self.size_cache.update(sizes)
+
+        # Поддерево может содержать тысячи каталогов, оповещаем только о тех, что запросил вид
+        for path in resolved_paths:
+            index = self.index(path, 1)
+            if index.isValid():
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def set_directory_estimate(self, path, estimate):
+        self.size_cache.set_estimate(path, estimate)
+
+        index = self.index(path, 1)
+        if index.isValid():
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def update_directory_sizes(self, sizes):
+        # index(path) создаёт узел для любого пути, а индекс присылает размеры всего каталога приложения,
+        # поэтому оповещаем только о каталогах, которые вид уже показывал
+        for path in sizes:
+            self.large_directories.pop(path, None)
+        self.set_directory_sizes(sizes, [path for path in sizes if path in self.displayed_paths])
+
+    def cancel_size_jobs(self, index):
+        self.size_calculator.cancel_descendants(self.filePath(index))
+
+    def invalidate_sizes(self, paths):
+        parents = set()
+        for path in paths:
+            path = os.path.normpath(path)
+            self.size_calculator.cancel_affected(path)
+            self.size_cache.invalidate(path)
+            self.large_directories.pop(path, None)
+            self.large_directories.pop(os.path.dirname(path), None)
+            if self.metadata_index is not None:
+                self.metadata_index.schedule_refresh(path)
+            parents.add(path)
+
+        self.paths_changed.emit(list(parents))
+
+        # Перерисовываем колонку размера у изменившихся каталогов и их предков, общих предков - один раз
+        notified = set()
+        for path in parents:
+            while path not in notified:
+                notified.add(path)
+                index = self.index(path, 1)
+                if index.isValid():
+                    self.dataChanged.emit(index, index, [Qt.DisplayRole])
+                if os.path.dirname(path) == path:
+                    break
+                path = os.path.dirname(path)
+
+    def invalidate_renamed(self, path, old_name, new_name):
+        self.invalidate_sizes([os.path.join(path, old_name), os.path.join(path, new_name)])
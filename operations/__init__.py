@@ -0,0 +1,797 @@
+import errno
+import fcntl
+import os
+import shutil
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QProgressBar, QHeaderView
+
+from System.shared import format_size, is_inside, parallel_map
+
+CHUNK_SIZE = 1024 * 1024
+# Копирование в ядре идёт крупными порциями, между ними проверяются пауза и отмена
+KERNEL_CHUNK = 16 * 1024 * 1024
+# ioctl FICLONE: файл-клон разделяет блоки с исходным (btrfs, xfs), копирование мгновенное
+FICLONE = 0x40049409
+# С этими ошибками способ копирования не поддерживается для пары файлов, пробуем следующий
+FALLBACK_ERRORS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF,
+                   errno.ENOTTY}
+OPERATION_WORKERS = 2
+# Долгие фоновые операции (импорт с устройств) идут в своём пуле и не занимают потоки операций пользователя
+BACKGROUND_WORKERS = 1
+# Сколько файлов одного дерева копируется одновременно: мелкие файлы упираются в задержку системных вызовов,
+# а не в пропускную способность диска
+COPY_WORKERS = 8
+PROGRESS_INTERVAL = 500
+# Вес нового замера в сглаженной скорости
+SPEED_SMOOTHING = 0.3
+
+QUEUED = 'В очереди'
+RUNNING = 'Выполняется'
+PAUSED = 'Приостановлено'
+FINISHED = 'Завершено'
+CANCELLED = 'Отменено'
+FAILED = 'Ошибка'
+
+# Как поступить, если в папке назначения уже есть объект с таким именем
+REPLACE = 'replace'
+KEEP_BOTH = 'keep_both'
+SKIP = 'skip'
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def queue_paths(paths):
+    # Размер сообщения в очереди System V ограничен (msgmax), поэтому пакет передаётся сводкой
+    if len(paths) == 1:
+        return paths[0]
+    return f"{len(paths)}|{os.path.commonpath(paths)}"
+
+
+def describe_paths(paths, limit=3):
+    names = [os.path.basename(path) for path in paths[:limit]]
+    if len(paths) > limit:
+        return f"{', '.join(names)} и ещё {len(paths) - limit} (всего {len(paths)})"
+    return ', '.join(names)
+
+
+def unique_path(path):
+    # Свободное имя вида "имя (n).расширение" рядом с занятым
+    folder, base_name = os.path.split(path)
+    name, extension = os.path.splitext(base_name)
+    copy_number = 1
+    while os.path.lexists(path):
+        path = os.path.join(folder, f"{name} ({copy_number}){extension}")
+        copy_number += 1
+    return path
+
+
+def is_directory(path):
+    return os.path.isdir(path) and not os.path.islink(path)
+
+
+def remove_path(path):
+    if is_directory(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def tree_size(path):
+    if os.path.islink(path) or not os.path.isdir(path):
+        return os.lstat(path).st_size
+    total = 0
+    for dir_path, _dir_names, file_names in os.walk(path):
+        for name in file_names:
+            try:
+                total += os.lstat(os.path.join(dir_path, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}'
+
+
+def reflink(source_fd, destination_fd):
+    try:
+        fcntl.ioctl(destination_fd, FICLONE, source_fd)
+    except OSError:
+        return False
+    return True
+
+
+def copy_range(source_fd, destination_fd, offset, size, job):
+    if not hasattr(os, 'copy_file_range'):
+        return offset
+    while offset < size:
+        job.check()
+        try:
+            # Явные смещения не двигают позиции файлов, следующий способ продолжит с offset
+            copied = os.copy_file_range(source_fd, destination_fd, min(KERNEL_CHUNK, size - offset), offset, offset)
+        except OSError as error:
+            if error.errno in FALLBACK_ERRORS:
+                return offset
+            raise
+        if not copied:
+            return offset
+        offset += copied
+        job.advance(copied)
+    return offset
+
+
+def send_file(source_fd, destination_fd, offset, size, job):
+    # sendfile пишет с текущей позиции приёмника
+    os.lseek(destination_fd, offset, os.SEEK_SET)
+    while offset < size:
+        job.check()
+        try:
+            sent = os.sendfile(destination_fd, source_fd, offset, min(KERNEL_CHUNK, size - offset))
+        except OSError as error:
+            if error.errno in FALLBACK_ERRORS:
+                return offset
+            raise
+        if not sent:
+            return offset
+        offset += sent
+        job.advance(sent)
+    return offset
+
+
+def copy_data(source_file, destination_file, size, job):
+    # Данные не проходят через буферы Python: клон, затем copy_file_range и sendfile внутри ядра,
+    # и только если ни один не подошёл - чтение блоками
+    source_fd, destination_fd = source_file.fileno(), destination_file.fileno()
+    if size and reflink(source_fd, destination_fd):
+        job.advance(size)
+        return
+
+    offset = 0
+    for transfer in copy_range, send_file:
+        offset = transfer(source_fd, destination_fd, offset, size, job)
+        if offset >= size:
+            return
+
+    source_file.seek(offset)
+    destination_file.seek(offset)
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    while True:
+        job.check()
+        read = source_file.readinto(buffer)
+        if not read:
+            break
+        destination_file.write(view[:read])
+        job.advance(read)
+
+
+def copy_file(source, destination, job):
+    with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+        size = os.fstat(source_file.fileno()).st_size
+        job.start_file(source, size)
+        try:
+            copy_data(source_file, destination_file, size, job)
+        except (JobCancelled, OSError):
+            # Недокопированный файл не оставляем
+            os.remove(destination)
+            raise
+    # Метаданные как у shutil.copy2: права, время доступа и изменения, расширенные атрибуты
+    shutil.copystat(source, destination)
+
+
+def copy_entry(source, destination, job):
+    try:
+        if os.path.islink(source):
+            os.symlink(os.readlink(source), destination)
+            job.advance(os.lstat(source).st_size)
+        else:
+            copy_file(source, destination, job)
+    except JobCancelled:
+        return None
+    except OSError as error:
+        return f'{source}: {error.strerror}'
+    return None
+
+
+def copy_tree(source, destination, job, workers=COPY_WORKERS):
+    # Сначала весь скелет каталогов, затем файлы параллельно: каталоги назначения к этому моменту уже есть
+    directories = [(source, destination)]
+    files = []
+    os.makedirs(destination)
+    for dir_path, dir_names, file_names in os.walk(source):
+        job.check()
+        target_dir = os.path.join(destination, os.path.relpath(dir_path, source))
+        for name in dir_names:
+            source_path = os.path.join(dir_path, name)
+            target_path = os.path.join(target_dir, name)
+            if os.path.islink(source_path):
+                os.symlink(os.readlink(source_path), target_path)
+            else:
+                os.mkdir(target_path)
+                directories.append((source_path, target_path))
+        files.extend((os.path.join(dir_path, name), os.path.join(target_dir, name)) for name in file_names)
+
+    parallel = workers > 1 and len(files) > 1
+    if parallel:
+        # Файлы копируются несколькими потоками сразу: прогресс одного файла теряет смысл, виден только общий
+        job.start_file(source, 0)
+        job.aggregate_only = True
+    try:
+        errors = parallel_map(lambda entry: copy_entry(entry[0], entry[1], job), files, workers, job.cancelled)
+    finally:
+        if parallel:
+            job.aggregate_only = False
+    job.check()
+    # Порядок завершения потоков случаен, а список ошибок должен быть одинаковым от запуска к запуску
+    job.errors.extend(sorted(error for error in errors if error is not None))
+
+    # Время изменения каталогов переносится последним: запись файлов в каталог его меняет
+    for source_path, target_path in reversed(directories):
+        shutil.copystat(source_path, target_path)
+
+
+class FileOperation(QRunnable):
+    title = 'Операция'
+    # Прогресс в объектах, а не в байтах: для переименований размер не важен
+    counts_items = False
+    # Долгая операция, запущенная не пользователем: выполняется в отдельном пуле менеджера
+    background = False
+
+    def __init__(self, manager):
+        super().__init__()
+
+        self.manager = manager
+        self.state = QUEUED
+        self.lock = threading.Lock()
+        self.total_bytes = 0
+        self.done_bytes = 0
+        self.current_file = ''
+        self.file_bytes = 0
+        self.file_done = 0
+        # Пока выставлен, start_file не меняет текущий файл: его прогресс разделяют параллельные потоки
+        self.aggregate_only = False
+        self.errors = []
+        # Пути, которые нужно обновить в модели после завершения, в том числе при отмене
+        self.changed_paths = []
+        self.cancelled = threading.Event()
+        self.resumed = threading.Event()
+        self.resumed.set()
+
+    def run(self):
+        # job_finished уходит при любом исходе, иначе операция навсегда осталась бы в панели выполняющейся
+        try:
+            if self.cancelled.is_set():
+                self.state = CANCELLED
+                return
+            self.state = RUNNING
+            try:
+                self.prepare()
+                self.execute()
+                self.state = FAILED if self.errors else FINISHED
+            except JobCancelled:
+                self.state = CANCELLED
+            except OSError as error:
+                self.errors.append(f'{error.filename}: {error.strerror}' if error.filename else str(error))
+                self.state = FAILED
+            except Exception as error:
+                self.errors.append(f'{type(error).__name__}: {error}')
+                self.state = FAILED
+        finally:
+            self.manager.job_finished.emit(self)
+
+    def prepare(self):
+        pass
+
+    def execute(self):
+        pass
+
+    def report(self):
+        # (сообщение в очередь, сообщение в лог, файл лога); подклассы дают свои коды и подробности
+        if self.state == CANCELLED:
+            return f"OPERATION_CANCELLED|{self.title}", f"Операция «{self.title}» отменена.", "../logs/actions.log"
+        if self.state == FAILED:
+            return (f"OPERATION_FAILED|{self.title}",
+                    f"Операция «{self.title}» завершена с ошибками: {len(self.errors)}.", "../logs/actions.log")
+        return f"OPERATION_ITEM|{self.title}", f"Операция «{self.title}» выполнена.", "../logs/actions.log"
+
+    def check(self):
+        # Точка остановки: пауза ждёт здесь, отмена прерывает операцию
+        self.resumed.wait()
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+    def start_file(self, path, size):
+        with self.lock:
+            if self.aggregate_only:
+                return
+            self.current_file = path
+            self.file_bytes = size
+            self.file_done = 0
+
+    def advance(self, count):
+        with self.lock:
+            self.done_bytes += count
+            self.file_done += count
+
+    def pause(self):
+        if self.state == RUNNING:
+            self.resumed.clear()
+            self.state = PAUSED
+
+    def resume(self):
+        if self.state == PAUSED:
+            self.state = RUNNING
+            self.resumed.set()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.resumed.set()
+
+    @property
+    def active(self):
+        return self.state in (QUEUED, RUNNING, PAUSED)
+
+
+class CopyJob(FileOperation):
+    title = 'Копирование'
+
+    def __init__(self, manager, sources, destination_folder, workers=COPY_WORKERS):
+        super().__init__(manager)
+        self.sources = sources
+        self.destination_folder = destination_folder
+        self.workers = workers
+
+    def prepare(self):
+        self.total_bytes = sum(tree_size(source) for source in self.sources)
+
+    def execute(self):
+        for source in self.sources:
+            self.check()
+            destination = os.path.join(self.destination_folder, os.path.basename(source))
+            self.changed_paths.append(destination)
+            # Ошибка одного объекта не обрывает остальные объекты выделения
+            try:
+                if os.path.isdir(source) and not os.path.islink(source):
+                    try:
+                        copy_tree(source, destination, self, self.workers)
+                    except JobCancelled:
+                        # Недокопированное дерево не оставляем; уже вставленные целиком объекты остаются
+                        shutil.rmtree(destination, ignore_errors=True)
+                        raise
+                else:
+                    copy_file(source, destination, self)
+            except OSError as error:
+                self.errors.append(f'{error.filename or source}: {error.strerror}')
+
+    def report(self):
+        names = describe_paths(self.sources)
+        destinations = queue_paths(self.changed_paths or [self.destination_folder])
+        if self.state == CANCELLED:
+            return (f"PASTE_CANCELLED||{destinations}",
+                    f"Вставка {names} в {self.destination_folder} отменена: недокопированный объект удалён, "
+                    f"вставленные до отмены оставлены.", "../logs/actions.log")
+        if self.state == FAILED:
+            return (f"PASTE_FAILED||{destinations}",
+                    f"Вставка {names} в {self.destination_folder} завершена с ошибками: {len(self.errors)}.",
+                    "../logs/actions.log")
+        return (f"PASTE_ITEM||{destinations}",
+                f"Файл {names} успешно вставлен в {self.destination_folder}.", "../logs/actions.log")
+
+
+class DeleteJob(FileOperation):
+    title = 'Удаление'
+
+    def __init__(self, manager, paths):
+        super().__init__(manager)
+        self.paths = paths
+
+    def prepare(self):
+        self.total_bytes = sum(tree_size(path) for path in self.paths)
+
+    def execute(self):
+        for path in self.paths:
+            self.check()
+            self.changed_paths.append(path)
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    self.delete_tree(path)
+                else:
+                    self.delete_file(path)
+            except OSError as error:
+                self.errors.append(f'{error.filename or path}: {error.strerror}')
+
+    def delete_file(self, path):
+        size = os.lstat(path).st_size
+        self.start_file(path, size)
+        os.remove(path)
+        self.advance(size)
+
+    def delete_tree(self, path):
+        errors = len(self.errors)
+        # Снизу вверх: к моменту удаления каталога его содержимое уже удалено
+        for dir_path, dir_names, file_names in os.walk(path, topdown=False):
+            for name in file_names:
+                self.check()
+                try:
+                    self.delete_file(os.path.join(dir_path, name))
+                except OSError as error:
+                    self.errors.append(f'{os.path.join(dir_path, name)}: {error.strerror}')
+            for name in dir_names:
+                dir_name = os.path.join(dir_path, name)
+                try:
+                    if os.path.islink(dir_name):
+                        os.remove(dir_name)
+                    else:
+                        os.rmdir(dir_name)
+                except OSError as error:
+                    self.errors.append(f'{dir_name}: {error.strerror}')
+        try:
+            os.rmdir(path)
+        except OSError as error:
+            # Если не удалось удалить что-то внутри, каталог не пуст - причина уже в списке ошибок
+            if len(self.errors) == errors:
+                self.errors.append(f'{path}: {error.strerror}')
+
+    def report(self):
+        names = describe_paths(self.paths)
+        paths = queue_paths(self.paths)
+        if self.state == CANCELLED:
+            return (f"DELETE_IMMEDIATELY_CANCELLED|{paths}", f"Удаление {names} отменено.", "delete.log")
+        if self.state == FAILED:
+            return (f"DELETE_IMMEDIATELY_FAILED|{paths}",
+                    f"Удаление {names} завершено с ошибками: {len(self.errors)}.", "delete.log")
+        return (f"DELETE_IMMEDIATELY_ITEM|{paths}",
+                f"Файл или папка {names} успешно удалены навсегда.", "delete.log")
+
+
+class TrashJob(FileOperation):
+    title = 'В корзину'
+    counts_items = True
+
+    def __init__(self, manager, paths, move):
+        super().__init__(manager)
+        self.paths = paths
+        # move(path) переносит объект в корзину и возвращает его новый путь
+        self.move = move
+
+    def prepare(self):
+        self.total_bytes = len(self.paths)
+
+    def execute(self):
+        for path in self.paths:
+            self.check()
+            self.start_file(path, 0)
+            try:
+                self.changed_paths.extend((path, self.move(path)))
+            except OSError as error:
+                self.errors.append(f'{path}: {error.strerror}')
+            self.advance(1)
+
+    def report(self):
+        names = describe_paths(self.paths)
+        paths = queue_paths(self.paths)
+        if self.state == CANCELLED:
+            return f"DELETE_CANCELLED|{paths}", f"Перемещение {names} в корзину отменено.", "delete.log"
+        if self.state == FAILED:
+            return (f"DELETE_FAILED|{paths}",
+                    f"Перемещение {names} в корзину завершено с ошибками: {len(self.errors)}.", "delete.log")
+        return f"DELETE_ITEM|{paths}", f"Файл или папка {names} успешно удалены.", "delete.log"
+
+
+class RenameJob(FileOperation):
+    title = 'Переименование'
+    counts_items = True
+
+    def __init__(self, manager, renames):
+        super().__init__(manager)
+        # Пары (старый путь, новый путь)
+        self.renames = renames
+
+    def prepare(self):
+        self.total_bytes = len(self.renames)
+
+    def execute(self):
+        for old_path, new_path in self.renames:
+            self.check()
+            self.start_file(old_path, 0)
+            if os.path.lexists(new_path):
+                self.errors.append(f'{new_path}: объект с таким именем уже существует')
+            else:
+                try:
+                    os.rename(old_path, new_path)
+                    self.changed_paths.extend((old_path, new_path))
+                except OSError as error:
+                    self.errors.append(f'{old_path}: {error.strerror}')
+            self.advance(1)
+
+    def report(self):
+        paths = queue_paths([old_path for old_path, _new_path in self.renames])
+        names = describe_paths([new_path for _old_path, new_path in self.renames])
+        if self.state == CANCELLED:
+            return f"RENAME_CANCELLED|{paths}", f"Переименование в {names} отменено.", "files.log"
+        if self.state == FAILED:
+            return (f"RENAME_FAILED|{paths}",
+                    f"Переименование в {names} завершено с ошибками: {len(self.errors)}.", "files.log")
+        return f"RENAME_ITEM|{paths}", f"Объект успешно переименован в {names}.", "files.log"
+
+
+class MoveJob(FileOperation):
+    title = 'Перемещение'
+
+    def __init__(self, manager, sources, destination_folder, resolutions=None, workers=COPY_WORKERS):
+        super().__init__(manager)
+        self.sources = sources
+        self.destination_folder = destination_folder
+        # Решение по каждому конфликту имён: REPLACE, KEEP_BOTH или SKIP (по умолчанию)
+        self.resolutions = resolutions or {}
+        self.workers = workers
+        self.skipped = []
+
+    def same_device(self, source):
+        return os.lstat(source).st_dev == os.stat(self.destination_folder).st_dev
+
+    def prepare(self):
+        # Внутри одной файловой системы перемещение - это rename, байты считаются только для копирования
+        self.total_bytes = sum(tree_size(source) for source in self.sources if not self.same_device(source))
+
+    def execute(self):
+        for source in self.sources:
+            self.check()
+            destination = os.path.join(self.destination_folder, os.path.basename(source))
+            if destination == source:
+                continue
+            if (self.destination_folder.rstrip(os.sep) == source or is_inside(self.destination_folder, source)
+                    or is_inside(source, destination)):
+                self.errors.append(f'{source}: нельзя переместить папку внутрь самой себя')
+                continue
+
+            replace = False
+            if os.path.lexists(destination):
+                resolution = self.resolutions.get(source, SKIP)
+                if resolution == SKIP:
+                    self.skipped.append(source)
+                    continue
+                if resolution == KEEP_BOTH:
+                    destination = unique_path(destination)
+                else:
+                    replace = True
+
+            try:
+                self.move_entry(source, destination, replace)
+            except OSError as error:
+                self.errors.append(f'{error.filename or source}: {error.strerror}')
+            self.changed_paths.extend((source, destination))
+
+    def temporary_path(self, source):
+        return unique_path(os.path.join(self.destination_folder, f'.{os.path.basename(source)}.moving'))
+
+    def put_in_place(self, temporary, destination, replace):
+        # Заменяемый объект удаляется один раз и только когда новый уже целиком лежит рядом под временным именем;
+        # его могли удалить и без нас
+        if replace and (is_directory(destination) or is_directory(temporary)) and os.path.lexists(destination):
+            remove_path(destination)
+        # Файл поверх файла заменяется атомарно
+        os.replace(temporary, destination)
+
+    def move_entry(self, source, destination, replace):
+        self.start_file(source, 0)
+        if self.same_device(source):
+            try:
+                if replace and (is_directory(destination) or is_directory(source)):
+                    # Каталог не заменяется через rename: источник сначала переносится рядом с назначением,
+                    # и если это другая точка монтирования, заменяемый объект ещё не тронут
+                    temporary = self.temporary_path(source)
+                    os.rename(source, temporary)
+                    try:
+                        self.put_in_place(temporary, destination, replace)
+                    except OSError:
+                        os.rename(temporary, source)
+                        raise
+                else:
+                    os.replace(source, destination)
+                return
+            except OSError as error:
+                # Точка монтирования внутри того же устройства: переходим к копированию
+                if error.errno != errno.EXDEV:
+                    raise
+                with self.lock:
+                    self.total_bytes += tree_size(source)
+
+        # Между устройствами: копия под временным именем, затем rename на месте назначения и удаление источника,
+        # так что ни прерванная, ни неудачная копия не оставляет наполовину перемещённый объект
+        temporary = self.temporary_path(source)
+        errors = len(self.errors)
+        try:
+            if is_directory(source):
+                copy_tree(source, temporary, self, self.workers)
+            else:
+                copy_file(source, temporary, self)
+        except (JobCancelled, OSError):
+            if os.path.lexists(temporary):
+                remove_path(temporary)
+            raise
+        if len(self.errors) > errors:
+            remove_path(temporary)
+            return
+
+        self.put_in_place(temporary, destination, replace)
+        remove_path(source)
+
+    def report(self):
+        names = describe_paths(self.sources)
+        paths = queue_paths(self.sources)
+        skipped = f" Пропущено из-за совпадения имён: {len(self.skipped)}." if self.skipped else ""
+        if self.state == CANCELLED:
+            return (f"MOVE_CANCELLED|{paths}",
+                    f"Перемещение {names} в {self.destination_folder} отменено.", "../logs/actions.log")
+        if self.state == FAILED:
+            return (f"MOVE_FAILED|{paths}",
+                    f"Перемещение {names} в {self.destination_folder} завершено с ошибками: "
+                    f"{len(self.errors)}.{skipped}", "../logs/actions.log")
+        return (f"MOVE_ITEM|{paths}",
+                f"Файл {names} успешно перемещён в {self.destination_folder}.{skipped}", "../logs/actions.log")
+
+
+class FileOperationManager(QObject):
+    job_added = pyqtSignal(object)
+    job_finished = pyqtSignal(object)
+
+    def __init__(self, workers=OPERATION_WORKERS, background_workers=BACKGROUND_WORKERS):
+        super().__init__()
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(workers)
+        self.background_pool = QThreadPool(self)
+        self.background_pool.setMaxThreadCount(background_workers)
+        self.jobs = []
+        self.job_finished.connect(self.forget_job)
+
+    def start(self, job):
+        self.jobs.append(job)
+        self.job_added.emit(job)
+        (self.background_pool if job.background else self.pool).start(job)
+        return job
+
+    def forget_job(self, job):
+        if job in self.jobs:
+            self.jobs.remove(job)
+
+    def cancel_all(self):
+        for job in self.jobs:
+            job.cancel()
+
+
+class OperationsPanel(QWidget):
+    def __init__(self, manager):
+        super().__init__()
+
+        self.manager = manager
+        self.manager.job_added.connect(self.add_job)
+        self.manager.job_finished.connect(self.update_job)
+        self.rows = []
+        # Сглаженная скорость и предыдущий замер по каждой операции
+        self.samples = {}
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels(['Операция', 'Файл', 'Прогресс', 'Скорость', 'Осталось', ''])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        clear_button = QPushButton('Убрать завершённые')
+        clear_button.clicked.connect(self.clear_finished)
+        layout.addWidget(clear_button)
+
+        self.setLayout(layout)
+
+        # Счётчики операций опрашиваются по таймеру, а не сигналом на каждый скопированный блок
+        self.timer = QTimer(self)
+        self.timer.setInterval(PROGRESS_INTERVAL)
+        self.timer.timeout.connect(self.update_progress)
+
+    def add_job(self, job):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        self.rows.append(job)
+        self.samples[job] = (time.monotonic(), 0, 0.0)
+
+        self.table.setItem(row, 0, QTableWidgetItem(job.title))
+        self.table.setItem(row, 1, QTableWidgetItem())
+        progress = QProgressBar()
+        progress.setRange(0, 1000)
+        self.table.setCellWidget(row, 2, progress)
+        self.table.setItem(row, 3, QTableWidgetItem())
+        self.table.setItem(row, 4, QTableWidgetItem())
+
+        buttons = QWidget()
+        buttons_layout = QHBoxLayout()
+        buttons_layout.setContentsMargins(0, 0, 0, 0)
+        pause_button = QPushButton('Пауза')
+        pause_button.clicked.connect(lambda: self.toggle_pause(job, pause_button))
+        cancel_button = QPushButton('Отмена')
+        cancel_button.clicked.connect(job.cancel)
+        buttons_layout.addWidget(pause_button)
+        buttons_layout.addWidget(cancel_button)
+        buttons.setLayout(buttons_layout)
+        self.table.setCellWidget(row, 5, buttons)
+
+        self.update_job(job)
+        self.timer.start()
+
+    def toggle_pause(self, job, button):
+        if job.state == PAUSED:
+            job.resume()
+            button.setText('Пауза')
+        else:
+            job.pause()
+            button.setText('Продолжить')
+        self.update_job(job)
+
+    def update_progress(self):
+        for job in self.rows:
+            if job.active:
+                self.update_job(job)
+        if not any(job.active for job in self.rows):
+            self.timer.stop()
+
+    def update_job(self, job):
+        if job not in self.rows:
+            return
+        row = self.rows.index(job)
+
+        with job.lock:
+            done, total = job.done_bytes, job.total_bytes
+            current_file, file_done, file_bytes = job.current_file, job.file_done, job.file_bytes
+
+        now = time.monotonic()
+        sampled_at, sampled_bytes, speed = self.samples[job]
+        if now > sampled_at:
+            current_speed = (done - sampled_bytes) / (now - sampled_at)
+            speed = current_speed if not speed else speed + SPEED_SMOOTHING * (current_speed - speed)
+            self.samples[job] = (now, done, speed)
+
+        file_text = os.path.basename(current_file)
+        if file_bytes:
+            file_text += f' ({file_done * 100 // file_bytes}%)'
+        self.table.item(row, 1).setText(file_text)
+        self.table.item(row, 1).setToolTip(current_file)
+
+        progress = self.table.cellWidget(row, 2)
+        progress.setValue(int(done * 1000 / total) if total else 0)
+        if job.counts_items:
+            progress.setFormat(f'{job.state}: {done} из {total}')
+        else:
+            progress.setFormat(f'{job.state}: {format_size(done)} из {format_size(total)}')
+
+        if job.state == RUNNING and speed > 0:
+            self.table.item(row, 3).setText(f'{speed:.0f} шт./с' if job.counts_items else f'{format_size(speed)}/с')
+            self.table.item(row, 4).setText(format_duration((total - done) / speed))
+        else:
+            self.table.item(row, 3).setText('')
+            self.table.item(row, 4).setText('')
+
+        if not job.active:
+            self.table.cellWidget(row, 5).setEnabled(False)
+            if job.state == FINISHED:
+                progress.setValue(1000)
+            if job.errors:
+                self.table.item(row, 1).setToolTip('\n'.join(job.errors[:20]))
+
+    def clear_finished(self):
+        for row in reversed(range(len(self.rows))):
+            job = self.rows[row]
+            if not job.active:
+                self.table.removeRow(row)
+                del self.rows[row]
+                del self.samples[job]
@@ -0,0 +1,622 @@
+import datetime
+import heapq
+import os
+import re
+import shlex
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, islice
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QObject, QRunnable, QThreadPool, QTimer, Qt, pyqtSignal
+from PyQt5.QtWidgets import QLabel, QListView, QVBoxLayout, QWidget
+
+from System.shared import DEFAULT_DIR_CATALOG
+
+# Доля удалённых записей, после которой таблицы индекса перестраиваются
+COMPACT_RATIO = 0.5
+# Кандидаты проверяются порциями: первые совпадения уходят в интерфейс сразу
+SEARCH_CHUNK = 5000
+SEARCH_DELAY = 250
+# Ранжированный поиск возвращает только лучшие совпадения
+RANK_LIMIT = 1000
+# Нечёткий поиск оценивает не больше стольких кандидатов, иначе короткий запрос не укладывается в нажатие клавиши
+FUZZY_CANDIDATES = 5000
+RECENCY_PERIOD = 24 * 60 * 60
+
+SUBSTRING = 'substring'
+GLOB = 'glob'
+REGEX = 'regex'
+FUZZY = 'fuzzy'
+FILTER = 'filter'
+
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60, 'w': 7 * 24 * 60 * 60, 'y': 365 * 24 * 60 * 60}
+COMPARISON = re.compile(r'(size|mtime)(>=|<=|>|<|=)(.+)', re.IGNORECASE)
+PREDICATE = re.compile(r'(ext|type|in):(.+)', re.IGNORECASE)
+
+WORD_SEPARATORS = ' ._-'
+
+
+def trigrams(name):
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+
+def translate_glob(pattern):
+    # Шаблон не должен выходить за пределы своей строки в общей таблице имён, а якорь ^ в режиме MULTILINE
+    # заметно медленнее поиска литерального перевода строки, поэтому fnmatch.translate не подходит
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        i += 1
+        if char == '*':
+            parts.append(r'[^\n]*')
+        elif char == '?':
+            parts.append(r'[^\n]')
+        elif char == '[':
+            end = pattern.find(']', i + 1 if pattern[i:i + 1] in ('!', ']') else i)
+            end = pattern.find(']', end + 1) if pattern[i:i + 2] == '!]' else end
+            if end < 0:
+                parts.append(r'\[')
+                continue
+            chars = pattern[i:end]
+            i = end + 1
+            negate = chars.startswith('!')
+            if negate:
+                chars = chars[1:]
+            chars = chars.replace('\\', r'\\').replace('[', r'\[').replace(']', r'\]').replace('^', r'\^')
+            parts.append(rf'[^\n{chars}]' if negate else f'[{chars}]')
+        else:
+            parts.append(re.escape(char))
+
+    # Ведущая звёздочка снимает привязку к началу имени
+    if pattern.startswith('*'):
+        while parts and parts[0] == r'[^\n]*':
+            parts.pop(0)
+        return re.compile('(' + ''.join(parts) + r')(?=\n)')
+    return re.compile(r'\n(' + ''.join(parts) + r')(?=\n)')
+
+
+def fuzzy_pattern(query):
+    # Жадный вариант заметно быстрее ленивого, но находит самое широкое окно; для оценки окно сужает tightest_window
+    return re.compile('(' + r'[^\n]*'.join(re.escape(char) for char in query) + ')')
+
+
+def tightest_window(name, query):
+    # Самое короткое окно имени, в котором буквы запроса идут по порядку: проход вперёд находит конец
+    # очередного вхождения, проход назад от этого конца - самое позднее начало
+    best = None
+    start = 0
+    while True:
+        position = start
+        for char in query:
+            position = name.find(char, position)
+            if position < 0:
+                return best
+            position += 1
+        end = position
+        for char in reversed(query):
+            position = name.rfind(char, 0, position)
+        if best is None or end - position < best[1] - best[0]:
+            best = (position, end)
+        start = position + 1
+
+
+def compile_query(query, mode):
+    if mode == REGEX:
+        # Имена в индексе уже приведены к нижнему регистру, а IGNORECASE замедляет поиск в разы
+        literal = re.sub(r'\\.', '', query)
+        return re.compile(query, re.MULTILINE | (re.IGNORECASE if literal != literal.casefold() else 0))
+    query = query.casefold()
+    if mode == GLOB:
+        return translate_glob(query)
+    if mode == FUZZY:
+        return fuzzy_pattern(query)
+    return query
+
+
+def name_matcher(query, mode):
+    # Проверка одного имени - для обхода каталога, пока индекс не построен
+    pattern = compile_query(query, mode)
+    if mode == SUBSTRING:
+        return lambda name: pattern in name.casefold()
+    if mode == GLOB:
+        return lambda name: pattern.search(f'\n{name.casefold()}\n') is not None
+    return lambda name: pattern.search(name.casefold()) is not None
+
+
+def parse_size(value):
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?', value.strip().lower())
+    if match is None:
+        raise ValueError(f'непонятный размер "{value}", пример: 500K, 1.5G')
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def parse_filters(query, root=DEFAULT_DIR_CATALOG, now=None):
+    # Запрос вида "size>1G mtime<7d ext:mp4,mkv type:file in:folder2 отчёт": предикаты по метаданным,
+    # остальные слова ищутся в имени. mtime с длительностью - возраст файла, с датой ГГГГ-ММ-ДД - момент изменения
+    now = time.time() if now is None else now
+    filters = {}
+    words = []
+
+    try:
+        tokens = shlex.split(query)
+    except ValueError:
+        raise ValueError('не закрыта кавычка') from None
+
+    for token in tokens:
+        comparison = COMPARISON.fullmatch(token)
+        predicate = PREDICATE.fullmatch(token)
+        if comparison is not None:
+            field, operator, value = comparison.group(1).lower(), comparison.group(2), comparison.group(3)
+            if field == 'size':
+                size = parse_size(value)
+                if operator in ('>', '>=', '='):
+                    filters['min_size'] = size + (operator == '>')
+                if operator in ('<', '<=', '='):
+                    filters['max_size'] = size - (operator == '<')
+                continue
+
+            duration = re.fullmatch(r'(\d+(?:\.\d+)?)([smhdwy])', value.lower())
+            if duration is not None:
+                if operator == '=':
+                    raise ValueError('для возраста нужен оператор < или >, например mtime<7d')
+                moment = now - float(duration.group(1)) * DURATION_UNITS[duration.group(2)]
+                # Меньший возраст - более позднее время изменения
+                filters['min_mtime' if operator.startswith('<') else 'max_mtime'] = moment
+                continue
+
+            try:
+                moment = datetime.datetime.strptime(value, '%Y-%m-%d').timestamp()
+            except ValueError:
+                raise ValueError(f'непонятное время "{value}", пример: 7d, 12h, 2024-01-31') from None
+            if operator in ('>', '>=', '='):
+                filters['min_mtime'] = moment + (24 * 60 * 60 if operator == '>' else 0)
+            if operator in ('<', '<=', '='):
+                filters['max_mtime'] = moment + (0 if operator == '<' else 24 * 60 * 60)
+        elif predicate is not None:
+            field, value = predicate.group(1).lower(), predicate.group(2)
+            if field == 'ext':
+                filters['extensions'] = [ext.strip().lstrip('.').lower() for ext in value.split(',') if ext.strip()]
+            elif field == 'type':
+                if value.lower() not in ('file', 'dir'):
+                    raise ValueError('type может быть file или dir')
+                filters['is_dir'] = value.lower() == 'dir'
+            else:
+                filters['under'] = os.path.join(root, value)
+        else:
+            words.append(token)
+
+    if words:
+        filters['name'] = ' '.join(words)
+    return filters
+
+
+def recency(mtime, now):
+    return 1 / (1 + max(0.0, now - mtime) / RECENCY_PERIOD)
+
+
+def fuzzy_score(name, query_length, start, end):
+    # Плотное совпадение с начала слова в коротком имени важнее разбросанных по длинному имени букв
+    score = 3 * query_length / (end - start) + query_length / len(name)
+    if start == 0 or name[start - 1] in WORD_SEPARATORS:
+        score += 1
+    return score
+
+
+class FilenameIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ready = False
+        self.generation = 0
+        self.clear()
+
+    def clear(self):
+        # Идентификатор записи - позиция в paths; удалённые записи помечаются None до уплотнения
+        self.paths = []
+        self.names = []
+        self.mtimes = array('d')
+        self.ids = {}
+        self.postings = {}
+        self.removed_count = 0
+        # Общая таблица имён: строка, смещения начала каждого имени и число уже внесённых записей
+        self.table = '\n'
+        self.offsets = array('Q', [1])
+
+    def build(self, entries):
+        with self.lock:
+            self.clear()
+            for path, _is_dir, mtime in entries:
+                self.add(path, mtime)
+            self.ready = True
+
+    def add(self, path, mtime):
+        entry_id = self.ids.get(path)
+        if entry_id is not None:
+            self.mtimes[entry_id] = mtime
+            return
+
+        entry_id = len(self.paths)
+        name = os.path.basename(path).casefold()
+        self.paths.append(path)
+        self.names.append(name)
+        self.mtimes.append(mtime)
+        self.ids[path] = entry_id
+        for trigram in trigrams(name):
+            postings = self.postings.get(trigram)
+            if postings is None:
+                postings = self.postings[trigram] = array('I')
+            postings.append(entry_id)
+
+    def remove(self, path):
+        entry_id = self.ids.pop(path, None)
+        if entry_id is not None:
+            self.paths[entry_id] = None
+            self.names[entry_id] = None
+            self.removed_count += 1
+
+    def apply_changes(self, added, removed):
+        with self.lock:
+            if not self.ready:
+                return
+            for path in removed:
+                self.remove(path)
+            for path, _is_dir, mtime in added:
+                self.add(path, mtime)
+            if self.removed_count > len(self.paths) * COMPACT_RATIO:
+                self.compact()
+
+    def compact(self):
+        entries = [(path, mtime) for path, mtime in zip(self.paths, self.mtimes) if path is not None]
+        self.generation += 1
+        self.clear()
+        for path, mtime in entries:
+            self.add(path, mtime)
+
+    def name_table(self):
+        # Все имена одной строкой через перевод строки: регулярное выражение проходит её целиком в C,
+        # а Python тратит время только на совпавшие строки. Новые записи дописываются в конец,
+        # удалённые остаются в таблице до уплотнения и отбрасываются при просмотре
+        tabled = len(self.offsets) - 1
+        if tabled < len(self.names):
+            names = [name.replace('\n', ' ') if name else '' for name in self.names[tabled:]]
+            self.table += '\n'.join(names) + '\n'
+            self.offsets.extend(accumulate((len(name) + 1 for name in names), initial=self.offsets[-1]))
+            del self.offsets[tabled]
+        return self.table, self.offsets
+
+    def scan(self, pattern, group=0):
+        table, offsets = self.name_table()
+        count = len(offsets) - 1
+        line_end = 0
+        position = 0
+        # finditer заметно дешевле повторных search с позиции; лишние совпадения в той же строке пропускаются
+        while True:
+            for match in pattern.finditer(table, position):
+                start, end = match.span(group)
+                if start < line_end:
+                    continue
+                entry_id = bisect_right(offsets, start) - 1
+                if entry_id < 0 or entry_id >= count:
+                    continue
+                line_end = offsets[entry_id + 1]
+                name = self.names[entry_id]
+                if table.find('\n', start, end) < 0:
+                    if name is not None:
+                        yield entry_id, start - offsets[entry_id], end - offsets[entry_id]
+                    continue
+                # Регулярное выражение захватило перевод строки и часть следующих имён: имя проверяется
+                # отдельно, а просмотр продолжается с начала следующего имени, а не с конца совпадения
+                if name is not None:
+                    match = pattern.search(name)
+                    if match is not None:
+                        yield entry_id, match.start(), match.end()
+                position = line_end
+                break
+            else:
+                return
+
+    def ranked(self, query, mode):
+        pattern = compile_query(query, mode)
+        with self.lock:
+            if mode == FUZZY:
+                entry_ids = self.fuzzy_ranked(query.casefold(), pattern)
+            else:
+                # Все совпадения шаблона равноценны - выше те, что изменялись недавно
+                matches = (entry_id for entry_id, _start, _end in self.scan(pattern, 0 if mode == REGEX else 1))
+                entry_ids = heapq.nlargest(RANK_LIMIT, matches, key=self.mtimes.__getitem__)
+            return [self.paths[entry_id] for entry_id in entry_ids]
+
+    def fuzzy_ranked(self, query, pattern):
+        now = time.time()
+        # Сначала имена со сплошным вхождением запроса: они всегда выше разбросанных совпадений,
+        # и при достаточном их числе подпоследовательности можно не искать
+        contiguous = list(islice(self.scan(re.compile(re.escape(query))), FUZZY_CANDIDATES))
+        scored = [((1, fuzzy_score(self.names[entry_id], len(query), start, end) +
+                    recency(self.mtimes[entry_id], now)), entry_id) for entry_id, start, end in contiguous]
+
+        if len(scored) < RANK_LIMIT:
+            scattered = (entry_id for entry_id, _start, _end in self.scan(pattern, 1)
+                         if query not in self.names[entry_id])
+            for entry_id in islice(scattered, FUZZY_CANDIDATES):
+                name = self.names[entry_id]
+                start, end = tightest_window(name, query)
+                scored.append(((0, fuzzy_score(name, len(query), start, end) + recency(self.mtimes[entry_id], now)),
+                               entry_id))
+
+        return [entry_id for _score, entry_id in heapq.nlargest(RANK_LIMIT, scored)]
+
+    def candidates(self, query):
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return range(len(self.names))
+
+        lists = sorted((self.postings.get(trigram, ()) for trigram in query_trigrams), key=len)
+        # Пересечение начинается с самого короткого списка вхождений
+        candidates = set(lists[0])
+        for postings in lists[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(postings)
+        return sorted(candidates)
+
+    def search(self, query):
+        query = query.casefold()
+        with self.lock:
+            return [self.paths[entry_id] for entry_id in self.candidates(query)
+                    if self.names[entry_id] is not None and query in self.names[entry_id]]
+
+    def search_chunks(self, query, mode=SUBSTRING):
+        if mode != SUBSTRING:
+            matches = self.ranked(query, mode)
+            if matches:
+                yield matches
+            return
+
+        query = query.casefold()
+        with self.lock:
+            generation = self.generation
+            candidates = self.candidates(query)
+
+        for start in range(0, len(candidates), SEARCH_CHUNK):
+            with self.lock:
+                # После уплотнения идентификаторы записей другие, оставшиеся кандидаты недействительны
+                if self.generation != generation:
+                    return
+                matches = [self.paths[entry_id] for entry_id in candidates[start:start + SEARCH_CHUNK]
+                           if self.names[entry_id] is not None and query in self.names[entry_id]]
+            if matches:
+                yield matches
+
+
+def walk_chunks(root, query, mode=SUBSTRING):
+    matches_name = name_matcher(query, mode)
+    for dir_path, dir_names, file_names in os.walk(root):
+        matches = [os.path.join(dir_path, name) for name in dir_names + file_names if matches_name(name)]
+        if matches:
+            yield matches
+
+
+class SearchJob(QRunnable):
+    def __init__(self, query, chunks, searcher):
+        super().__init__()
+
+        self.query = query
+        self.chunks = chunks
+        self.searcher = searcher
+        self.cancelled = threading.Event()
+
+    def run(self):
+        for matches in self.chunks:
+            if self.cancelled.is_set():
+                return
+            self.searcher.job_matches.emit(matches, self)
+
+        if not self.cancelled.is_set():
+            self.searcher.job_finished.emit(self)
+
+
+class Searcher(QObject):
+    matches_found = pyqtSignal(list)
+    search_finished = pyqtSignal(str, int)
+    job_matches = pyqtSignal(list, object)
+    job_finished = pyqtSignal(object)
+
+    # Поиск по индексу имён быстрый, поэтому запускается прямо при наборе текста
+    live = True
+
+    def __init__(self, filename_index, mode=SUBSTRING, root=DEFAULT_DIR_CATALOG):
+        super().__init__()
+
+        self.filename_index = filename_index
+        self.mode = mode
+        self.root = root
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.job = None
+        self.count = 0
+
+        self.job_matches.connect(self.forward_matches)
+        self.job_finished.connect(self.finish_job)
+
+    def start(self, query):
+        self.cancel()
+        self.count = 0
+        self.job = SearchJob(query, self.chunks(query), self)
+        self.pool.start(self.job)
+
+    def chunks(self, query):
+        # Ошибка в регулярном выражении должна дойти до интерфейса, а не оборвать фоновую задачу
+        compile_query(query, self.mode)
+
+        if self.filename_index.ready:
+            return self.filename_index.search_chunks(query, self.mode)
+        # Индекс имён ещё строится - ищем обходом каталога
+        return walk_chunks(self.root, query, self.mode)
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancelled.set()
+            self.job = None
+
+    def forward_matches(self, matches, job):
+        if job is self.job:
+            self.count += len(matches)
+            self.matches_found.emit(matches)
+
+    def finish_job(self, job):
+        if job is self.job:
+            self.job = None
+            self.search_finished.emit(job.query, self.count)
+
+
+class MetadataSearcher(Searcher):
+    def __init__(self, metadata_index, root=DEFAULT_DIR_CATALOG):
+        super().__init__(None, FILTER, root)
+        self.metadata_index = metadata_index
+
+    def chunks(self, query):
+        filters = parse_filters(query, self.root)
+        return self.find_chunks(filters)
+
+    def find_chunks(self, filters):
+        # Запрос обслуживается индексом метаданных, дерево заново не обходится
+        paths = self.metadata_index.find(**filters)
+        for start in range(0, len(paths), SEARCH_CHUNK):
+            yield paths[start:start + SEARCH_CHUNK]
+
+
+class SearchResultsModel(QAbstractListModel):
+    def __init__(self, root=DEFAULT_DIR_CATALOG):
+        super().__init__()
+        self.root = root
+        # Результат - путь, а для поиска по содержимому кортеж (путь, номер строки, строка)
+        self.matches = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.matches)
+
+    def path(self, row):
+        match = self.matches[row]
+        return match if isinstance(match, str) else match[0]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        match = self.matches[index.row()]
+        if role == Qt.DisplayRole:
+            if isinstance(match, str):
+                return os.path.relpath(match, self.root)
+            path, line_number, line = match
+            return f"{os.path.relpath(path, self.root)}:{line_number}: {line}"
+        if role == Qt.ToolTipRole:
+            return self.path(index.row())
+        return None
+
+    def clear(self):
+        self.beginResetModel()
+        self.matches = []
+        self.endResetModel()
+
+    def append(self, matches):
+        first = len(self.matches)
+        self.beginInsertRows(QModelIndex(), first, first + len(matches) - 1)
+        self.matches.extend(matches)
+        self.endInsertRows()
+
+
+class SearchPanel(QWidget):
+    result_activated = pyqtSignal(str)
+
+    def __init__(self, searchers):
+        super().__init__()
+
+        # Режимы поиска: название режима -> поисковик с сигналами matches_found и search_finished
+        self.searchers = searchers
+        self.mode = next(iter(searchers))
+        for searcher in searchers.values():
+            searcher.matches_found.connect(self.add_matches)
+            searcher.search_finished.connect(self.show_finished)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.status_label = QLabel('Введите строку для поиска')
+        layout.addWidget(self.status_label)
+
+        self.results = SearchResultsModel()
+        self.view = QListView()
+        self.view.setModel(self.results)
+        # Одинаковая высота строк нужна, чтобы список не замедлялся на миллионах результатов
+        self.view.setUniformItemSizes(True)
+        self.view.activated.connect(self.activate)
+        self.view.clicked.connect(self.activate)
+        layout.addWidget(self.view)
+
+        self.setLayout(layout)
+
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(SEARCH_DELAY)
+        self.debounce.timeout.connect(self.run_pending)
+        self.pending_query = ''
+
+    @property
+    def searcher(self):
+        return self.searchers[self.mode]
+
+    def set_mode(self, mode):
+        self.cancel()
+        self.mode = mode
+
+    def cancel(self):
+        self.debounce.stop()
+        for searcher in self.searchers.values():
+            searcher.cancel()
+
+    def schedule(self, query):
+        if not self.searcher.live:
+            return
+        self.pending_query = query.strip()
+        self.debounce.start()
+
+    def run_pending(self):
+        self.start(self.pending_query)
+
+    def start(self, query):
+        self.cancel()
+        self.results.clear()
+        if not query:
+            self.status_label.setText('Введите строку для поиска')
+            return
+
+        try:
+            self.searcher.start(query)
+        except (re.error, ValueError) as error:
+            self.status_label.setText(f'Ошибка в выражении "{query}": {error}')
+            return
+        self.status_label.setText(f'Поиск "{query}"…')
+
+    def add_matches(self, matches):
+        self.results.append(matches)
+        self.status_label.setText(f'Найдено {self.results.rowCount()}…')
+
+    def show_finished(self, query, count):
+        if count:
+            self.status_label.setText(f'Найдено {count} совпадений для "{query}"')
+        else:
+            self.status_label.setText(f'Совпадения для "{query}" не найдены')
+
+    def activate(self, index):
+        self.result_activated.emit(self.results.path(index.row()))
+
+    def select_next(self):
+        rows = self.results.rowCount()
+        if not rows:
+            return
+        row = (self.view.currentIndex().row() + 1) % rows
+        index = self.results.index(row)
+        self.view.setCurrentIndex(index)
+        self.activate(index)
@@ -1,8 +1,22 @@
+import math
 import os
+import random
+import threading
+import time
 
 DEFAULT_DIR_CATALOG = "/home/user/superapp/"
 
 
+def is_inside(path, directory):
+    return path.startswith(directory.rstrip(os.sep) + os.sep)
+
+
+def path_range(path):
+    # Все пути внутри каталога лежат в диапазоне [path/, path0): '0' идёт сразу после '/'
+    path = path.rstrip(os.sep)
+    return path + os.sep, path + chr(ord(os.sep) + 1)
+
+
 def format_size(size):
     for unit in ['', 'K', 'M', 'G', 'T', 'P', 'E', 'Z']:
         if abs(size) < 1024.0:
@@ -11,10 +25,137 @@ def format_size(size):
     return "%.1f%sB" % (size, 'Y')
 
 
+def parallel_map(func, items, workers, cancel_event=None):
+    # concurrent.futures импортирует модуль queue стандартной библиотеки, который перекрывает пакет System/queue,
+    # поэтому пул потоков простой: потоки разбирают позиции из общего итератора под блокировкой
+    items = list(items)
+    results = [None] * len(items)
+    positions = iter(range(len(items)))
+    lock = threading.Lock()
+
+    def work():
+        while cancel_event is None or not cancel_event.is_set():
+            with lock:
+                position = next(positions, None)
+            if position is None:
+                return
+            results[position] = func(items[position])
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(max(1, min(workers, len(items))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def scan_directory_sizes(path, cancel_event=None, checkpoint=None, on_file=None):
+    # Один проход os.scandir по поддереву: размеры каталогов сворачиваются от листьев к корню
+    path = os.path.normpath(path)
+    totals = {}
+    parents = {}
+    order = []
+    stack = [path]
+
+    while stack:
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+
+        if checkpoint is not None:
+            checkpoint()
+
+        current = stack.pop()
+        order.append(current)
+        total = 0
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        # Тип берётся из dirent без лишнего stat, stat нужен только файлам ради размера
+                        if entry.is_dir(follow_symlinks=False):
+                            parents[entry.path] = current
+                            stack.append(entry.path)
+                        else:
+                            size = entry.stat(follow_symlinks=False).st_size
+                            total += size
+                            if on_file is not None:
+                                on_file(entry.path, size)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        totals[current] = total
+
+    # В прямом порядке обхода родитель идёт раньше детей, поэтому в обратном дети уже посчитаны
+    for directory in reversed(order):
+        parent = parents.get(directory)
+        if parent is not None:
+            totals[parent] += totals[directory]
+
+    return totals
+
+
+def estimate_directory_size(path, time_budget, sample_size=32, min_probes=8, max_probes=256):
+    # Оценка Кнута: случайный спуск от корня к листу, размер каждого узла умножается
+    # на произведение ветвлений по пути. Среднее по спускам - несмещённая оценка суммы по дереву.
+    deadline = time.monotonic() + time_budget
+    nodes = {}
+    estimates = []
+
+    def node(directory):
+        if directory not in nodes:
+            subdirectories = []
+            files = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            (subdirectories if entry.is_dir(follow_symlinks=False) else files).append(entry)
+                        except OSError:
+                            continue
+            except OSError:
+                pass
+
+            # Размер файлов узла тоже оценивается по выборке, чтобы не делать stat на каждый
+            sample = files if len(files) <= sample_size else random.sample(files, sample_size)
+            sizes = []
+            for entry in sample:
+                try:
+                    sizes.append(entry.stat(follow_symlinks=False).st_size)
+                except OSError:
+                    continue
+            files_size = sum(sizes) / len(sizes) * len(files) if sizes else 0
+            nodes[directory] = ([entry.path for entry in subdirectories], files_size)
+        return nodes[directory]
+
+    while len(estimates) < max_probes:
+        if len(estimates) >= min_probes and time.monotonic() > deadline:
+            break
+
+        estimate = 0
+        weight = 1
+        current = path
+        while True:
+            subdirectories, files_size = node(current)
+            estimate += weight * files_size
+            if not subdirectories:
+                break
+            weight *= len(subdirectories)
+            current = random.choice(subdirectories)
+        estimates.append(estimate)
+
+    mean = sum(estimates) / len(estimates)
+    variance = sum((e - mean) ** 2 for e in estimates) / max(len(estimates) - 1, 1)
+    # Полуширина 95% доверительного интервала
+    return mean, 1.96 * math.sqrt(variance / len(estimates))
+
+
+def calculate_directory_size(path, cancel_event=None):
+    sizes = scan_directory_sizes(path, cancel_event)
+    if sizes is None:
+        return None
+    return sizes[os.path.normpath(path)]
+
+
 def directory_size(path):
-    total_size = 0
-    for dir_path, _, filenames in os.walk(path):
-        for f in filenames:
-            fp = os.path.join(dir_path, f)
-            total_size += os.path.getsize(fp)
-    return format_size(total_size)
+    return format_size(calculate_directory_size(path))
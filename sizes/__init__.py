@@ -0,0 +1,184 @@
+import bisect
+import os
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from System.shared import scan_directory_sizes, estimate_directory_size, format_size, is_inside, path_range
+
+SIZE_PLACEHOLDER = 'вычисление…'
+# Если точный подсчёт идёт дольше APPROXIMATE_AFTER секунд, сначала показывается оценка
+APPROXIMATE_AFTER = 1.0
+ESTIMATE_TIME_BUDGET = 0.5
+
+
+def format_estimate(estimate):
+    size, error = estimate
+    percent = error / size * 100 if size else 0
+    return f"≈{format_size(size).strip()} ±{percent:.0f}%"
+
+
+class DirectorySizeCache:
+    def __init__(self):
+        self._sizes = {}
+        # Отсортированные ключи _sizes: поддерево каталога удаляется срезом, без перебора всего кэша
+        self._paths = []
+        self._estimates = {}
+
+    def get(self, path):
+        return self._sizes.get(os.path.normpath(path))
+
+    def get_estimate(self, path):
+        return self._estimates.get(os.path.normpath(path))
+
+    def set_estimate(self, path, estimate):
+        self._estimates[os.path.normpath(path)] = estimate
+
+    def set(self, path, size):
+        self.update({os.path.normpath(path): size})
+
+    def update(self, sizes):
+        new_paths = [p for p in sizes if p not in self._sizes]
+        self._sizes.update(sizes)
+        if len(new_paths) > len(self._paths) // 8:
+            self._paths = sorted(self._sizes)
+        else:
+            for path in new_paths:
+                bisect.insort(self._paths, path)
+
+        for path in sizes:
+            self._estimates.pop(path, None)
+
+    def discard(self, path):
+        self._estimates.pop(path, None)
+        if self._sizes.pop(path, None) is not None:
+            del self._paths[bisect.bisect_left(self._paths, path)]
+
+    def invalidate(self, path):
+        path = os.path.normpath(path)
+
+        # Изменение внутри каталога меняет размер всех его потомков (при удалении/переименовании)
+        low, high = path_range(path)
+        start = bisect.bisect_left(self._paths, low)
+        end = bisect.bisect_left(self._paths, high)
+        for cached_path in self._paths[start:end]:
+            del self._sizes[cached_path]
+        del self._paths[start:end]
+        for cached_path in [p for p in self._estimates if is_inside(p, path)]:
+            del self._estimates[cached_path]
+
+        # ...и размер каждого каталога выше по дереву
+        while True:
+            self.discard(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+
+    def clear(self):
+        self._sizes.clear()
+        self._paths.clear()
+        self._estimates.clear()
+
+
+class DirectorySizeJob(QRunnable):
+    def __init__(self, path, calculator):
+        super().__init__()
+
+        self.path = path
+        self.calculator = calculator
+        self.cancelled = threading.Event()
+        self.started = None
+        self.estimated = False
+
+    def run(self):
+        if self.cancelled.is_set():
+            return
+
+        self.started = time.monotonic()
+        checkpoint = self.check_estimate if self.calculator.approximate_after is not None else None
+        sizes = scan_directory_sizes(self.path, self.cancelled, checkpoint)
+        if sizes is not None and not self.cancelled.is_set():
+            self.calculator.job_finished.emit(self.path, sizes, self)
+
+    def check_estimate(self):
+        if self.estimated or time.monotonic() - self.started < self.calculator.approximate_after:
+            return
+
+        # Точный обход затянулся: даём оценку по выборке, затем продолжаем точный подсчёт
+        self.estimated = True
+        estimate = estimate_directory_size(self.path, self.calculator.estimate_budget)
+        if not self.cancelled.is_set():
+            self.calculator.job_estimated.emit(self.path, estimate, self)
+
+
+class DirectorySizeCalculator(QObject):
+    sizes_calculated = pyqtSignal(object, list)
+    size_estimated = pyqtSignal(str, object)
+    job_finished = pyqtSignal(str, object, object)
+    job_estimated = pyqtSignal(str, object, object)
+
+    def __init__(self, max_workers=None, approximate_after=APPROXIMATE_AFTER, estimate_budget=ESTIMATE_TIME_BUDGET):
+        super().__init__()
+
+        self.approximate_after = approximate_after
+        self.estimate_budget = estimate_budget
+
+        self.pool = QThreadPool(self)
+        if max_workers:
+            self.pool.setMaxThreadCount(max_workers)
+        self.jobs = {}
+        self.waiting = set()
+
+        # Результат приходит из рабочего потока, слот выполняется уже в потоке GUI
+        self.job_finished.connect(self.finish_job)
+        self.job_estimated.connect(self.estimate_job)
+
+    def request(self, path):
+        path = os.path.normpath(path)
+        if path in self.jobs or path in self.waiting:
+            return
+
+        # Размер уже считается вместе с поддеревом одного из предков
+        if any(is_inside(path, p) for p in self.jobs):
+            self.waiting.add(path)
+            return
+
+        job = DirectorySizeJob(path, self)
+        self.jobs[path] = job
+        self.pool.start(job)
+
+    def estimate_job(self, path, estimate, job):
+        if self.jobs.get(path) is job:
+            self.size_estimated.emit(path, estimate)
+
+    def finish_job(self, path, sizes, job):
+        if self.jobs.get(path) is not job:
+            return
+
+        del self.jobs[path]
+
+        # Один проход посчитал всё поддерево - закрываем и запросы для вложенных каталогов
+        resolved = [p for p in list(self.jobs) + list(self.waiting) if p in sizes]
+        self.cancel(resolved)
+        self.sizes_calculated.emit(sizes, [path] + resolved)
+
+    def cancel(self, paths):
+        for path in paths:
+            self.waiting.discard(path)
+            job = self.jobs.pop(path, None)
+            if job is not None:
+                job.cancelled.set()
+
+    def cancel_descendants(self, path):
+        path = os.path.normpath(path)
+        self.cancel([p for p in list(self.jobs) + list(self.waiting) if is_inside(p, path)])
+
+    def cancel_affected(self, path):
+        path = os.path.normpath(path)
+        self.cancel([p for p in list(self.jobs) + list(self.waiting)
+                     if p == path or is_inside(p, path) or is_inside(path, p)])
+
+    def cancel_all(self):
+        self.cancel(list(self.jobs) + list(self.waiting))
@@ -0,0 +1,13 @@
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# В каталоге приложения код лежит пакетом System; здесь каталог репозитория подставляется под этим именем.
+# Сам каталог в sys.path не нужен: пакет System/queue перекрыл бы стандартный queue
+sys.path[:] = [path for path in sys.path if os.path.abspath(path or os.curdir) != ROOT]
+if 'System' not in sys.modules:
+    package = types.ModuleType('System')
+    package.__path__ = [ROOT]
+    sys.modules['System'] = package
@@ -0,0 +1,106 @@
+import io
+import os
+import shutil
+import tarfile
+import zipfile
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from System.archives import TAR_GZ, TAR_ZST, ZIP, CompressJob, ExtractJob
+from System.operations import FAILED, FINISHED
+
+
+class Manager:
+    class job_finished:
+        @staticmethod
+        def emit(job):
+            pass
+
+
+@pytest.fixture
+def sources(tmp_path):
+    folder = tmp_path / 'src' / 'folder'
+    (folder / 'sub').mkdir(parents=True)
+    (folder / 'sub' / 'data.bin').write_bytes(os.urandom(300 * 1024))
+    (folder / 'отчёт.txt').write_text('текст')
+    (folder / 'empty').mkdir()
+    single = tmp_path / 'src' / 'single.txt'
+    single.write_text('single')
+    return [str(folder), str(single)]
+
+
+def snapshot(root):
+    result = {}
+    for dir_path, dir_names, file_names in os.walk(root):
+        for name in dir_names:
+            result[os.path.relpath(os.path.join(dir_path, name), root)] = None
+        for name in file_names:
+            path = os.path.join(dir_path, name)
+            with open(path, 'rb') as file:
+                result[os.path.relpath(path, root)] = file.read()
+    return result
+
+
+@pytest.mark.parametrize('format_name, suffix', [(ZIP, '.zip'), (TAR_GZ, '.tar.gz'), (TAR_ZST, '.tar.zst')])
+def test_round_trip(tmp_path, sources, format_name, suffix):
+    if format_name == TAR_ZST and shutil.which('zstd') is None:
+        pytest.skip('нет программы zstd')
+    archive_path = str(tmp_path / f'archive{suffix}')
+
+    job = CompressJob(Manager, sources, archive_path, format_name)
+    job.run()
+    assert (job.state, job.errors) == (FINISHED, [])
+    assert not os.path.exists(tmp_path / f'.archive{suffix}.part')
+
+    job = ExtractJob(Manager, archive_path, str(tmp_path / 'out'))
+    job.run()
+    assert (job.state, job.errors) == (FINISHED, [])
+    assert snapshot(tmp_path / 'out') == snapshot(tmp_path / 'src')
+
+
+def test_zip_rejects_paths_outside_destination(tmp_path):
+    archive_path = tmp_path / 'evil.zip'
+    with zipfile.ZipFile(archive_path, 'w') as archive:
+        archive.writestr('../evil.txt', 'evil')
+        archive.writestr('good.txt', 'good')
+
+    job = ExtractJob(Manager, str(archive_path), str(tmp_path / 'out'))
+    job.run()
+    assert job.state == FAILED
+    assert len(job.errors) == 1
+    assert not (tmp_path / 'evil.txt').exists()
+    assert (tmp_path / 'out' / 'good.txt').read_text() == 'good'
+
+
+def test_tar_rejects_paths_outside_destination(tmp_path):
+    archive_path = tmp_path / 'evil.tar.gz'
+    with tarfile.open(archive_path, 'w:gz') as archive:
+        for name, data in (('../evil.txt', b'evil'), ('/abs.txt', b'abs'), ('good.txt', b'good')):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+    job = ExtractJob(Manager, str(archive_path), str(tmp_path / 'out'))
+    job.run()
+    assert not (tmp_path / 'evil.txt').exists()
+    assert (tmp_path / 'out' / 'good.txt').read_text() == 'good'
+    # Абсолютный путь фильтр data делает относительным, выход через .. отклоняется
+    assert len(job.errors) == 1
+
+
+def test_corrupt_archive_fails_without_leftovers(tmp_path):
+    archive_path = tmp_path / 'broken.zip'
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('data.txt', 'x' * 10000)
+    data = bytearray(archive_path.read_bytes())
+    # Портим сжатые данные сразу за локальным заголовком
+    header_end = 30 + len('data.txt')
+    data[header_end:header_end + 16] = b'\xff' * 16
+    archive_path.write_bytes(bytes(data))
+
+    job = ExtractJob(Manager, str(archive_path), str(tmp_path / 'out'))
+    job.run()
+    assert job.state == FAILED
+    assert not (tmp_path / 'out').exists()
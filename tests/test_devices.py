@@ -0,0 +1,73 @@
+import errno
+import os
+
+import pytest
+
+pytest.importorskip('PyQt5')
+pytest.importorskip('psutil')
+
+import System.devices as devices
+from System.devices import DeviceImportJob
+from System.operations import FAILED, FINISHED
+
+
+class Manager:
+    class job_finished:
+        @staticmethod
+        def emit(job):
+            pass
+
+
+@pytest.fixture
+def device(tmp_path, monkeypatch):
+    mountpoint = tmp_path / 'device'
+    (mountpoint / 'photos').mkdir(parents=True)
+    (mountpoint / 'photos' / 'a.jpg').write_bytes(b'a' * 100)
+    (mountpoint / 'b.txt').write_bytes(b'b')
+    (tmp_path / 'catalog').mkdir()
+    monkeypatch.setattr(devices, 'find_mountpoint', lambda device_node: str(mountpoint))
+    return mountpoint
+
+
+def run_import(tmp_path):
+    job = DeviceImportJob(Manager, 'CARD', '/dev/sdz1', str(tmp_path / 'catalog'), rate=0,
+                          manifest_path=str(tmp_path / 'imports.db'))
+    job.run()
+    return job
+
+
+def test_unchanged_files_are_skipped(tmp_path, device):
+    job = run_import(tmp_path)
+    assert (job.state, job.copied, job.skipped) == (FINISHED, 2, 0)
+    assert (tmp_path / 'catalog' / 'photos' / 'a.jpg').read_bytes() == b'a' * 100
+
+    job = run_import(tmp_path)
+    assert (job.state, job.copied, job.skipped) == (FINISHED, 0, 2)
+
+
+def test_changed_and_missing_files_are_copied_again(tmp_path, device):
+    run_import(tmp_path)
+    (device / 'b.txt').write_bytes(b'changed')
+    os.remove(tmp_path / 'catalog' / 'photos' / 'a.jpg')
+
+    job = run_import(tmp_path)
+    assert (job.copied, job.skipped) == (2, 0)
+    assert (tmp_path / 'catalog' / 'b.txt').read_bytes() == b'changed'
+
+
+def test_failed_copy_keeps_previous_copy(tmp_path, device, monkeypatch):
+    run_import(tmp_path)
+    (device / 'b.txt').write_bytes(b'changed')
+
+    def failing_copy(source, destination, job):
+        with open(destination, 'wb') as destination_file:
+            destination_file.write(b'cha')
+        # copy_file сам удаляет недокопированный файл
+        os.remove(destination)
+        raise OSError(errno.EIO, 'Input/output error', source)
+
+    monkeypatch.setattr(devices, 'copy_file', failing_copy)
+    job = run_import(tmp_path)
+    assert job.state == FAILED
+    assert (tmp_path / 'catalog' / 'b.txt').read_bytes() == b'b'
+    assert sorted(os.listdir(tmp_path / 'catalog')) == ['b.txt', 'photos']
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from System.index import MetadataIndex
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    root = tmp_path / 'catalog'
+    (root / 'docs' / 'old').mkdir(parents=True)
+    (root / 'docs' / 'a.txt').write_bytes(b'x' * 10)
+    (root / 'docs' / 'old' / 'b.txt').write_bytes(b'x' * 20)
+    (root / 'c.bin').write_bytes(b'x' * 5)
+    return root
+
+
+@pytest.fixture
+def index(tmp_path, catalog):
+    metadata_index = MetadataIndex(str(catalog), str(tmp_path / 'index.db'))
+    yield metadata_index
+    metadata_index.close()
+
+
+def rewrite_in_place(path, data):
+    # Перезапись содержимого не меняет mtime каталога
+    directory_stat = os.stat(os.path.dirname(path))
+    with open(path, 'wb') as file:
+        file.write(data)
+    os.utime(os.path.dirname(path), ns=(directory_stat.st_atime_ns, directory_stat.st_mtime_ns))
+
+
+def test_revalidate_sizes(index, catalog):
+    sizes = index.revalidate()
+    assert sizes[str(catalog)] == 35
+    assert sizes[str(catalog / 'docs')] == 30
+    assert sizes[str(catalog / 'docs' / 'old')] == 20
+    assert index.directory_sizes()[str(catalog / 'docs')] == 30
+
+
+def test_revalidate_picks_up_new_and_removed_entries(index, catalog):
+    index.revalidate()
+    (catalog / 'docs' / 'new.txt').write_bytes(b'x' * 100)
+    os.remove(catalog / 'c.bin')
+    sizes = index.revalidate()
+    assert sizes[str(catalog)] == 130
+    assert index.entry(str(catalog / 'c.bin')) is None
+
+
+def test_unchanged_directories_are_not_rescanned(index, catalog):
+    index.revalidate()
+    rewrite_in_place(catalog / 'docs' / 'a.txt', b'x' * 50)
+    assert index.revalidate() == {}
+
+
+def test_restat_batch_picks_up_rewrites(index, catalog):
+    index.revalidate()
+    rewrite_in_place(catalog / 'docs' / 'old' / 'b.txt', b'x' * 60)
+
+    sizes = index.restat_batch(limit=1)
+    assert sizes is None
+    assert index.restat_cursor != ''
+    while sizes is None and index.restat_cursor:
+        sizes = index.restat_batch(limit=1)
+    assert sizes[str(catalog / 'docs' / 'old')] == 60
+    assert sizes[str(catalog)] == 75
+
+
+def test_find(index, catalog):
+    index.revalidate()
+    assert index.find(min_size=10, is_dir=False) == [str(catalog / 'docs' / 'old' / 'b.txt'),
+                                                     str(catalog / 'docs' / 'a.txt')]
+    assert index.find(extensions=['bin']) == [str(catalog / 'c.bin')]
+    assert index.find(under=str(catalog / 'docs'), is_dir=False) == [str(catalog / 'docs' / 'a.txt'),
+                                                                     str(catalog / 'docs' / 'old' / 'b.txt')]
+    assert index.find(is_dir=True) == [str(catalog / 'docs'), str(catalog / 'docs' / 'old')]
+
+
+def test_find_name_ignores_case_beyond_ascii(index, catalog):
+    (catalog / 'Годовой_Отчёт 100%.txt').write_bytes(b'x')
+    index.revalidate()
+    expected = [str(catalog / 'Годовой_Отчёт 100%.txt')]
+    assert index.find(name='ОТЧЁТ') == expected
+    assert index.find(name='_отчёт 100%') == expected
+    assert index.find(name='%') == expected
+    assert index.find(name='отчёт_') == []
@@ -0,0 +1,258 @@
+import errno
+import os
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+import System.operations as operations
+from System.operations import (
+    CANCELLED, FAILED, KEEP_BOTH, REPLACE, CopyJob, DeleteJob, FileOperation, MoveJob
+)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    source = tmp_path / 'a' / 'x'
+    source.mkdir(parents=True)
+    (source / 'new').write_text('new')
+    destination_folder = tmp_path / 'b'
+    (destination_folder / 'x').mkdir(parents=True)
+    (destination_folder / 'x' / 'old').write_text('old')
+    return str(source), str(destination_folder)
+
+
+@pytest.fixture
+def cross_device(monkeypatch, tree):
+    # rename источника не проходит, как при переносе через границу точки монтирования
+    source, _destination_folder = tree
+    rename = os.rename
+
+    def cross_device_rename(path, target):
+        if path == source:
+            raise OSError(errno.EXDEV, 'Invalid cross-device link')
+        rename(path, target)
+
+    monkeypatch.setattr(os, 'rename', cross_device_rename)
+
+
+def move(source, destination_folder, resolution):
+    job = MoveJob(None, [source], destination_folder, {source: resolution}, workers=2)
+    job.prepare()
+    job.execute()
+    return job
+
+
+def test_replace_directory(tree):
+    source, destination_folder = tree
+    job = move(source, destination_folder, REPLACE)
+    assert job.errors == []
+    assert os.listdir(destination_folder) == ['x']
+    assert os.listdir(os.path.join(destination_folder, 'x')) == ['new']
+    assert not os.path.exists(source)
+
+
+def test_replace_directory_across_devices(tree, cross_device):
+    source, destination_folder = tree
+    job = move(source, destination_folder, REPLACE)
+    assert job.errors == []
+    assert os.listdir(destination_folder) == ['x']
+    assert os.listdir(os.path.join(destination_folder, 'x')) == ['new']
+    assert not os.path.exists(source)
+
+
+def test_failed_copy_keeps_destination(tree, cross_device, monkeypatch):
+    source, destination_folder = tree
+
+    def failing_copy_tree(source, destination, job, workers):
+        os.mkdir(destination)
+        raise OSError(errno.EIO, 'Input/output error', source)
+
+    monkeypatch.setattr(operations, 'copy_tree', failing_copy_tree)
+    job = move(source, destination_folder, REPLACE)
+    assert job.errors
+    assert os.listdir(destination_folder) == ['x']
+    assert os.listdir(os.path.join(destination_folder, 'x')) == ['old']
+    assert os.listdir(source) == ['new']
+
+
+def test_keep_both(tree):
+    source, destination_folder = tree
+    job = move(source, destination_folder, KEEP_BOTH)
+    assert job.errors == []
+    assert sorted(os.listdir(destination_folder)) == ['x', 'x (1)']
+
+
+def test_copy_continues_after_failed_item(tmp_path):
+    (tmp_path / 'first').write_text('1')
+    (tmp_path / 'last').write_text('3')
+    (tmp_path / 'target').mkdir()
+    sources = [str(tmp_path / 'first'), str(tmp_path / 'missing'), str(tmp_path / 'last')]
+    job = CopyJob(None, sources, str(tmp_path / 'target'))
+    job.execute()
+    assert len(job.errors) == 1
+    assert sorted(os.listdir(tmp_path / 'target')) == ['first', 'last']
+
+
+def test_delete_continues_after_failed_item(tmp_path):
+    (tmp_path / 'tree' / 'sub').mkdir(parents=True)
+    (tmp_path / 'tree' / 'sub' / 'file').write_text('x')
+    (tmp_path / 'file').write_text('x')
+    job = DeleteJob(None, [str(tmp_path / 'missing'), str(tmp_path / 'tree'), str(tmp_path / 'file')])
+    job.execute()
+    assert len(job.errors) == 1
+    assert os.listdir(tmp_path) == []
+
+
+class Manager:
+    def __init__(self):
+        self.finished = []
+
+    @property
+    def job_finished(self):
+        return self
+
+    def emit(self, job):
+        self.finished.append(job)
+
+
+def test_unexpected_error_finishes_job():
+    manager = Manager()
+    job = FileOperation(manager)
+    job.execute = lambda: int('x')
+    job.run()
+    assert manager.finished == [job]
+    assert job.state == FAILED
+    assert job.errors[0].startswith('ValueError')
+
+
+def test_cancelled_tree_copy_is_removed(tmp_path, monkeypatch):
+    (tmp_path / 'tree' / 'sub').mkdir(parents=True)
+    for index in range(4):
+        (tmp_path / 'tree' / 'sub' / f'file{index}').write_text('x')
+    (tmp_path / 'target').mkdir()
+    job = CopyJob(Manager(), [str(tmp_path / 'tree')], str(tmp_path / 'target'))
+    advance = job.advance
+
+    def cancel_after_first(count):
+        advance(count)
+        job.cancel()
+
+    monkeypatch.setattr(job, 'advance', cancel_after_first)
+    job.run()
+    assert job.state == CANCELLED
+    assert os.listdir(tmp_path / 'target') == []
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / 'source'
+    path.write_bytes(os.urandom(5 * 4096 + 123))
+    return path
+
+
+def copy_with(tmp_path, source_file):
+    job = FileOperation(None)
+    destination = tmp_path / 'destination'
+    operations.copy_file(str(source_file), str(destination), job)
+    assert destination.read_bytes() == source_file.read_bytes()
+    assert job.done_bytes == source_file.stat().st_size
+    return job
+
+
+def test_copy_file(tmp_path, source_file):
+    copy_with(tmp_path, source_file)
+
+
+def test_copy_data_falls_back_from_offset(tmp_path, source_file, monkeypatch):
+    # Ядро копирует по две порции каждым способом и отказывается: следующий способ продолжает с того же смещения
+    calls = {'copy_file_range': 0, 'sendfile': 0}
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    sendfile = os.sendfile
+
+    def limited(name, transfer, error):
+        def wrapper(*args):
+            calls[name] += 1
+            if calls[name] > 2:
+                raise OSError(error, os.strerror(error))
+            return transfer(*args)
+        return wrapper
+
+    monkeypatch.setattr(operations, 'KERNEL_CHUNK', 4096)
+    monkeypatch.setattr(operations, 'reflink', lambda source_fd, destination_fd: False)
+    if copy_file_range is not None:
+        monkeypatch.setattr(os, 'copy_file_range', limited('copy_file_range', copy_file_range, errno.EXDEV))
+    monkeypatch.setattr(os, 'sendfile', limited('sendfile', sendfile, errno.EINVAL))
+    copy_with(tmp_path, source_file)
+    assert calls['sendfile'] == 3
+
+
+def test_copy_data_reflink_counts_whole_file(tmp_path, source_file, monkeypatch):
+    def clone(source_fd, destination_fd):
+        os.sendfile(destination_fd, source_fd, 0, os.fstat(source_fd).st_size)
+        return True
+
+    monkeypatch.setattr(operations, 'reflink', clone)
+    copy_with(tmp_path, source_file)
+
+
+def test_cancelled_copy_removes_partial_file(tmp_path, source_file, monkeypatch):
+    job = FileOperation(None)
+    monkeypatch.setattr(operations, 'KERNEL_CHUNK', 4096)
+    monkeypatch.setattr(operations, 'reflink', lambda source_fd, destination_fd: False)
+    advance = job.advance
+
+    def cancel_after_first(count):
+        advance(count)
+        job.cancel()
+
+    monkeypatch.setattr(job, 'advance', cancel_after_first)
+    with pytest.raises(operations.JobCancelled):
+        operations.copy_file(str(source_file), str(tmp_path / 'destination'), job)
+    assert not (tmp_path / 'destination').exists()
+
+
+def test_copy_tree(tmp_path):
+    source = tmp_path / 'tree'
+    (source / 'a' / 'b').mkdir(parents=True)
+    (source / 'empty').mkdir()
+    for index in range(20):
+        (source / 'a' / f'file{index}').write_bytes(os.urandom(index * 100))
+    (source / 'a' / 'b' / 'deep').write_text('deep')
+    os.symlink('a/b', source / 'link')
+    os.utime(source / 'a', (1_000_000_000, 1_000_000_000))
+
+    job = FileOperation(None)
+    job.total_bytes = operations.tree_size(str(source))
+    operations.copy_tree(str(source), str(tmp_path / 'copy'), job, workers=4)
+
+    copy = tmp_path / 'copy'
+    assert job.errors == []
+    assert job.done_bytes == job.total_bytes
+    for index in range(20):
+        assert (copy / 'a' / f'file{index}').read_bytes() == (source / 'a' / f'file{index}').read_bytes()
+    assert (copy / 'a' / 'b' / 'deep').read_text() == 'deep'
+    assert (copy / 'empty').is_dir()
+    assert os.readlink(copy / 'link') == 'a/b'
+    assert os.stat(copy / 'a').st_mtime == 1_000_000_000
+    # Пока потоки копировали параллельно, текущим объектом было дерево целиком
+    assert (job.current_file, job.file_bytes, job.aggregate_only) == (str(source), 0, False)
+
+
+def test_copy_tree_collects_errors(tmp_path, monkeypatch):
+    source = tmp_path / 'tree'
+    source.mkdir()
+    for name in 'abc':
+        (source / name).write_text(name)
+    copy_file = operations.copy_file
+
+    def failing_copy_file(path, destination, job):
+        if path.endswith('b'):
+            raise OSError(errno.EIO, 'Input/output error', path)
+        copy_file(path, destination, job)
+
+    monkeypatch.setattr(operations, 'copy_file', failing_copy_file)
+    job = FileOperation(None)
+    operations.copy_tree(str(source), str(tmp_path / 'copy'), job, workers=3)
+    assert job.errors == [f'{source / "b"}: Input/output error']
+    assert sorted(os.listdir(tmp_path / 'copy')) == ['a', 'c']
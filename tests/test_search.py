@@ -0,0 +1,87 @@
+import datetime
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from System.search import FUZZY, REGEX, FilenameIndex, parse_filters, tightest_window, translate_glob
+
+
+def glob_matches(pattern, name):
+    return translate_glob(pattern).search(f'\n{name}\n') is not None
+
+
+@pytest.mark.parametrize('pattern, name, expected', [
+    ('*.txt', 'отчёт.txt', True),
+    ('*.txt', 'отчёт.txt.bak', False),
+    ('a?c', 'abc', True),
+    ('a?c', 'xabc', False),
+    ('[ab]x', 'bx', True),
+    ('[!ab]x', 'bx', False),
+    ('[!ab]x', 'cx', True),
+    ('[]a]x', ']x', True),
+    ('[!]]*', ']b', False),
+    ('[!]]*', 'ab', True),
+    ('[a', '[a', True),
+    ('a^b', 'a^b', True),
+])
+def test_translate_glob(pattern, name, expected):
+    assert glob_matches(pattern, name) is expected
+
+
+def test_glob_stays_within_name():
+    assert translate_glob('a*b').search('\nax\nyb\n') is None
+
+
+def test_tightest_window():
+    assert tightest_window('a_b_c_abc', 'abc') == (6, 9)
+    assert tightest_window('xaxbxc', 'abc') == (1, 6)
+    assert tightest_window('ab', 'abc') is None
+
+
+def build_index(names):
+    index = FilenameIndex()
+    index.build([(f'/root/{name}', False, 0) for name in names])
+    return index
+
+
+def test_fuzzy_ranking():
+    index = build_index(['a_very_long_b_name_c', 'a_b_c', 'abc', 'xyz'])
+    # Сплошное вхождение выше разбросанного, плотное окно выше широкого
+    assert index.ranked('abc', FUZZY) == ['/root/abc', '/root/a_b_c', '/root/a_very_long_b_name_c']
+
+
+def test_fuzzy_ranking_uses_tightest_window():
+    index = build_index(['a__b__c_abxc', 'a_b_c__'])
+    assert index.ranked('abc', FUZZY) == ['/root/a__b__c_abxc', '/root/a_b_c__']
+
+
+def test_regex_does_not_match_across_names():
+    index = build_index(['foo a', 'b bar', 'a b'])
+    assert index.ranked(r'a\sb', REGEX) == ['/root/a b']
+    assert index.ranked(r'o[^x]+b', REGEX) == []
+
+
+def test_parse_filters():
+    now = 1_700_000_000
+    filters = parse_filters('size>1G mtime<7d ext:.MP4,mkv type:file in:folder2 "годовой отчёт"', root='/c', now=now)
+    assert filters == {
+        'min_size': 1024 ** 3 + 1,
+        'min_mtime': now - 7 * 24 * 60 * 60,
+        'extensions': ['mp4', 'mkv'],
+        'is_dir': False,
+        'under': '/c/folder2',
+        'name': 'годовой отчёт',
+    }
+
+
+def test_parse_filters_ranges():
+    filters = parse_filters('size=500K mtime>=2024-01-31')
+    assert (filters['min_size'], filters['max_size']) == (500 * 1024, 500 * 1024)
+    assert filters['min_mtime'] == datetime.datetime(2024, 1, 31).timestamp()
+
+
+@pytest.mark.parametrize('query', ['size>lots', 'mtime=7d', 'type:link', '"незакрытая'])
+def test_parse_filters_errors(query):
+    with pytest.raises(ValueError):
+        parse_filters(query)
@@ -0,0 +1,42 @@
+import os
+import threading
+
+from System.shared import path_range, scan_directory_sizes
+
+
+def test_scan_directory_sizes(tmp_path):
+    (tmp_path / 'a' / 'b').mkdir(parents=True)
+    (tmp_path / 'c').mkdir()
+    (tmp_path / 'top').write_bytes(b'x' * 1)
+    (tmp_path / 'a' / 'f').write_bytes(b'x' * 10)
+    (tmp_path / 'a' / 'b' / 'g').write_bytes(b'x' * 100)
+    (tmp_path / 'c' / 'h').write_bytes(b'x' * 1000)
+    # Ссылка на каталог не раскрывается, считается размер самой ссылки
+    os.symlink(tmp_path / 'c', tmp_path / 'a' / 'link')
+    link_size = os.lstat(tmp_path / 'a' / 'link').st_size
+
+    totals = scan_directory_sizes(str(tmp_path))
+    assert totals[str(tmp_path / 'a' / 'b')] == 100
+    assert totals[str(tmp_path / 'a')] == 110 + link_size
+    assert totals[str(tmp_path / 'c')] == 1000
+    assert totals[str(tmp_path)] == 1111 + link_size
+    assert len(totals) == 4
+
+
+def test_scan_directory_sizes_reports_files(tmp_path):
+    (tmp_path / 'f').write_bytes(b'x' * 3)
+    files = []
+    scan_directory_sizes(str(tmp_path), on_file=lambda path, size: files.append((path, size)))
+    assert files == [(str(tmp_path / 'f'), 3)]
+
+
+def test_scan_directory_sizes_cancelled(tmp_path):
+    cancel_event = threading.Event()
+    cancel_event.set()
+    assert scan_directory_sizes(str(tmp_path), cancel_event) is None
+
+
+def test_path_range():
+    low, high = path_range('/c/a/')
+    assert low <= '/c/a/x' < high
+    assert not low <= '/c/ab' < high
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from System.sizes import DirectorySizeCache
+
+
+@pytest.fixture
+def cache():
+    size_cache = DirectorySizeCache()
+    size_cache.update({'/c': 100, '/c/a': 60, '/c/a/x': 10, '/c/a/y': 20, '/c/ab': 5, '/c/b': 40})
+    size_cache.set_estimate('/c/a/x/deep', (7, 1))
+    size_cache.set_estimate('/c/b/deep', (3, 1))
+    return size_cache
+
+
+def test_invalidate_drops_subtree_and_ancestors(cache):
+    cache.invalidate('/c/a')
+    assert [cache.get(path) for path in ('/c', '/c/a', '/c/a/x', '/c/a/y')] == [None] * 4
+    assert cache.get_estimate('/c/a/x/deep') is None
+
+
+def test_invalidate_keeps_siblings(cache):
+    cache.invalidate('/c/a/')
+    # /c/ab - не потомок /c/a, хотя его путь начинается так же
+    assert cache.get('/c/ab') == 5
+    assert cache.get('/c/b') == 40
+    assert cache.get_estimate('/c/b/deep') == (3, 1)
+
+
+def test_invalidate_file_drops_only_ancestors(cache):
+    cache.invalidate('/c/a/x/file.txt')
+    assert cache.get('/c/a/x') is None
+    assert cache.get('/c/a') is None
+    assert cache.get('/c/a/y') == 20
+
+
+def test_update_replaces_estimate(cache):
+    cache.set('/c/b/deep', 4)
+    assert cache.get('/c/b/deep') == 4
+    assert cache.get_estimate('/c/b/deep') is None
+    cache.invalidate('/c/b')
+    assert cache.get('/c/b/deep') is None
@@ -0,0 +1,161 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from System.trash import TrashIndex, TrashReaper
+
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def trash(tmp_path):
+    (tmp_path / 'trash').mkdir()
+    index = TrashIndex(str(tmp_path / 'trash'), str(tmp_path / 'trash.db'))
+    yield index
+    index.close()
+
+
+def trash_file(tmp_path, trash, name, size, deleted_at):
+    path = tmp_path / name
+    path.write_bytes(b'x' * size)
+    trash_path = trash.move_to_trash(str(path))
+    trash.db.execute('UPDATE items SET deleted_at = ? WHERE name = ?', (deleted_at, os.path.basename(trash_path)))
+    trash.db.commit()
+
+
+def evicted_names(trash, tmp_path, now):
+    return [name for name, *_rest in trash.evict(now, str(tmp_path / 'reap'))]
+
+
+def test_no_eviction_without_policy(tmp_path, trash):
+    trash_file(tmp_path, trash, 'old', 10, 0)
+    trash.measure_pending()
+    assert trash.policy() is None
+    assert evicted_names(trash, tmp_path, time.time()) == []
+    assert trash.count == 1
+
+
+def test_evict_by_age(tmp_path, trash):
+    now = time.time()
+    trash_file(tmp_path, trash, 'old', 10, now - 10 * DAY)
+    trash_file(tmp_path, trash, 'new', 10, now - DAY)
+    trash.measure_pending()
+    trash.set_policy(0, 7 * DAY)
+    assert evicted_names(trash, tmp_path, now) == ['old']
+    assert (trash.count, trash.total_size) == (1, 10)
+
+
+def test_unknown_deletion_time_is_not_expired(tmp_path, trash):
+    (tmp_path / 'trash' / 'stray').write_bytes(b'x' * 5)
+    trash.reconcile()
+    trash.measure_pending()
+    assert trash.items()[0][2] is None
+    trash.set_policy(0, DAY)
+    assert evicted_names(trash, tmp_path, time.time() + 365 * DAY) == []
+
+
+def test_evict_by_size_oldest_first(tmp_path, trash):
+    now = time.time()
+    (tmp_path / 'trash' / 'stray').write_bytes(b'x' * 30)
+    trash.reconcile()
+    trash_file(tmp_path, trash, 'first', 30, now - 3 * DAY)
+    trash_file(tmp_path, trash, 'second', 30, now - 2 * DAY)
+    trash_file(tmp_path, trash, 'third', 30, now - DAY)
+    assert trash.total_size == 0
+    trash.measure_pending()
+    assert trash.total_size == 120
+    trash.set_policy(70, 0)
+    # Объект с неизвестным временем удаления вытесняется последним
+    assert evicted_names(trash, tmp_path, now) == ['first', 'second']
+    assert trash.total_size == 60
+    assert sorted(os.listdir(tmp_path / 'trash')) == ['stray', 'third']
+
+
+def test_forget_entries_deleted_inside_trash(tmp_path, trash):
+    trash_file(tmp_path, trash, 'file', 10, time.time())
+    folder = tmp_path / 'folder'
+    folder.mkdir()
+    (folder / 'a').write_bytes(b'x' * 20)
+    (folder / 'b').write_bytes(b'x' * 30)
+    trash.move_to_trash(str(folder))
+    trash.measure_pending()
+    assert (trash.count, trash.total_size) == (2, 60)
+
+    # Удаление навсегда прямо из корзины, мимо индекса
+    os.remove(tmp_path / 'trash' / 'file')
+    os.remove(tmp_path / 'trash' / 'folder' / 'a')
+    assert trash.forget([str(tmp_path / 'trash' / 'file'), str(tmp_path / 'trash' / 'folder' / 'a'),
+                         str(tmp_path / 'elsewhere')])
+    trash.measure_pending()
+    assert (trash.count, trash.total_size) == (1, 30)
+    assert [name for name, *_rest in trash.items()] == ['folder']
+
+
+def test_restore_returns_item_and_updates_counters(tmp_path, trash):
+    (tmp_path / 'docs').mkdir()
+    path = tmp_path / 'docs' / 'note.txt'
+    path.write_bytes(b'x' * 10)
+    trash_path = trash.move_to_trash(str(path))
+    trash_file(tmp_path, trash, 'other', 20, time.time())
+    trash.measure_pending()
+    assert (trash.count, trash.total_size) == (2, 30)
+
+    # Папку, из которой удалён объект, тоже удалили - восстановление создаёт её заново
+    os.rmdir(tmp_path / 'docs')
+    assert trash.restore(trash_path) == str(path)
+    assert path.read_bytes() == b'x' * 10
+    assert not os.path.lexists(trash_path)
+    assert (trash.count, trash.total_size) == (1, 20)
+    assert [name for name, *_rest in trash.items()] == ['other']
+
+
+def test_restore_conflict_and_unknown_origin(tmp_path, trash):
+    path = tmp_path / 'note.txt'
+    path.write_bytes(b'old')
+    trash_path = trash.move_to_trash(str(path))
+    path.write_bytes(b'new')
+
+    with pytest.raises(FileExistsError):
+        trash.restore(trash_path)
+    assert path.read_bytes() == b'new'
+    assert trash.count == 1
+    assert trash.restore(trash_path, 'note (1).txt') == str(tmp_path / 'note (1).txt')
+    assert (tmp_path / 'note (1).txt').read_bytes() == b'old'
+
+    # Исходный путь объекта, найденного сверкой, неизвестен
+    (tmp_path / 'trash' / 'stray').write_bytes(b'x')
+    trash.reconcile()
+    with pytest.raises(FileNotFoundError):
+        trash.restore(str(tmp_path / 'trash' / 'stray'))
+    assert trash.count == 1
+    assert os.path.exists(tmp_path / 'trash' / 'stray')
+
+
+def test_empty_and_reap(tmp_path, trash):
+    trash_file(tmp_path, trash, 'file', 10, time.time())
+    folder = tmp_path / 'folder'
+    (folder / 'sub').mkdir(parents=True)
+    (folder / 'sub' / 'data').write_bytes(b'x' * 20)
+    trash.move_to_trash(str(folder))
+    trash.measure_pending()
+
+    reap_path = tmp_path / 'reap'
+    reaped_path = trash.empty(str(reap_path))
+    assert (trash.count, trash.total_size, trash.items()) == (0, 0, [])
+    assert os.listdir(tmp_path / 'trash') == []
+    assert sorted(os.listdir(reaped_path)) == ['file', 'folder']
+
+    # После очистки корзина снова принимает объекты
+    trash_file(tmp_path, trash, 'again', 5, time.time())
+    assert trash.count == 1
+
+    reaper = TrashReaper(str(reap_path))
+    reaper.reap()
+    # Поток сам сбрасывает reaper.worker по окончании, поэтому ждём опустевшего каталога
+    deadline = time.time() + 10
+    while os.listdir(reap_path) and time.time() < deadline:
+        time.sleep(0.01)
+    assert os.listdir(reap_path) == []
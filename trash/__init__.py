@@ -0,0 +1,322 @@
+import errno
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from System.operations import is_directory, tree_size, unique_path
+from System.shared import DEFAULT_DIR_CATALOG, is_inside
+
+TRASH_PATH = os.path.join(DEFAULT_DIR_CATALOG, 'Корзина')
+TRASH_DB_PATH = os.path.join(DEFAULT_DIR_CATALOG, 'System', '.trash.db')
+# Очищенные корзины ждут удаления здесь; каталог на той же файловой системе, что и корзина, иначе rename невозможен
+REAP_PATH = os.path.join(DEFAULT_DIR_CATALOG, 'System', '.reap')
+# Удаление не должно отнимать процессор у интерфейса
+REAP_NICENESS = 19
+# Правила хранения, которые предлагаются при первой настройке; 0 - без ограничения.
+# Пока пользователь не сохранил правила, из корзины ничего не вытесняется
+DEFAULT_MAX_SIZE = 10 * 1024 ** 3
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+SWEEP_INTERVAL = 10 * 60
+SCHEMA_VERSION = 1
+
+
+class TrashIndex:
+    def __init__(self, trash_path=TRASH_PATH, db_path=TRASH_DB_PATH):
+        self.trash_path = os.path.normpath(trash_path)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        self.create_schema()
+
+        self.reconcile()
+
+    def create_schema(self):
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        migrate = version < SCHEMA_VERSION and self.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items'").fetchone() is not None
+        if migrate:
+            self.db.execute('ALTER TABLE items RENAME TO items_old')
+
+        # Одна запись на объект верхнего уровня в корзине; name - его имя внутри корзины.
+        # deleted_at пуст, если время удаления неизвестно (объект найден сверкой), size - пока размер не измерен
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS items (
+                name TEXT PRIMARY KEY,
+                original_path TEXT NOT NULL,
+                deleted_at REAL,
+                size INTEGER,
+                is_dir INTEGER NOT NULL
+            )
+        ''')
+        if migrate:
+            # Записи сверки из прежней схемы хранили время изменения файла вместо времени удаления
+            self.db.execute("INSERT INTO items (name, original_path, deleted_at, size, is_dir) "
+                            "SELECT name, original_path, CASE WHEN original_path = '' THEN NULL ELSE deleted_at END, "
+                            "size, is_dir FROM items_old")
+            self.db.execute('DROP TABLE items_old')
+        self.db.execute('CREATE INDEX IF NOT EXISTS items_deleted_at ON items(deleted_at)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value REAL NOT NULL)')
+        self.db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self.db.commit()
+
+    def reconcile(self):
+        # Сверка с содержимым корзины после сбоя или ручных правок: читается только её верхний уровень
+        with self.lock:
+            names = set(os.listdir(self.trash_path))
+            stored = {name for name, in self.db.execute('SELECT name FROM items')}
+            self.db.executemany('DELETE FROM items WHERE name = ?', [(name,) for name in stored - names])
+            # Время удаления таких объектов неизвестно (время изменения файла - не оно), размер измерит measure_pending
+            self.db.executemany(
+                'INSERT INTO items (name, original_path, deleted_at, size, is_dir) VALUES (?, ?, NULL, NULL, ?)',
+                [(name, '', is_directory(os.path.join(self.trash_path, name))) for name in names - stored])
+            self.db.commit()
+            # Размер корзины ведётся счётчиком, обходить её ради него не нужно; ещё не измеренные объекты
+            # добавляет measure_pending
+            self.total_size, self.count = self.db.execute(
+                'SELECT COALESCE(SUM(size), 0), COUNT(*) FROM items').fetchone()
+
+    def trash_file_path(self, name):
+        return os.path.join(self.trash_path, name)
+
+    def move_to_trash(self, file_path):
+        file_path = os.path.normpath(file_path)
+        is_dir = is_directory(file_path)
+
+        # Вызывается из фоновых операций: подбор свободного имени и перенос не должны пересекаться
+        with self.lock:
+            # Одноимённые файлы не должны затирать друг друга в корзине
+            trash_file_path = unique_path(self.trash_file_path(os.path.basename(file_path)))
+            # Перенос - один rename, а обход большой папки ради размера его бы затянул: размер измерит measure_pending
+            self.db.execute(
+                'INSERT INTO items (name, original_path, deleted_at, size, is_dir) VALUES (?, ?, ?, NULL, ?)',
+                (os.path.basename(trash_file_path), file_path, time.time(), is_dir))
+            # Запись фиксируется только после успешного переноса
+            try:
+                os.rename(file_path, trash_file_path)
+            except OSError:
+                self.db.rollback()
+                raise
+            self.db.commit()
+            self.count += 1
+        return trash_file_path
+
+    def measure_pending(self):
+        # Размеры считаются вне блокировки: корзина тем временем доступна. Объект, восстановленный или
+        # вытесненный за время замера, к счётчику не добавляется
+        with self.lock:
+            names = [name for name, in self.db.execute('SELECT name FROM items WHERE size IS NULL')]
+        for name in names:
+            try:
+                size = tree_size(self.trash_file_path(name))
+            except OSError:
+                size = 0
+            with self.lock:
+                if self.db.execute('UPDATE items SET size = ? WHERE name = ? AND size IS NULL',
+                                   (size, name)).rowcount:
+                    self.total_size += size
+                self.db.commit()
+
+    def entry_name(self, trash_file_path):
+        # Восстанавливаются только объекты верхнего уровня корзины, а не файлы внутри удалённых папок
+        trash_file_path = os.path.normpath(trash_file_path)
+        if os.path.dirname(trash_file_path) != self.trash_path:
+            return None
+        return os.path.basename(trash_file_path)
+
+    def forget(self, paths):
+        # Объекты внутри корзины, удалённые мимо индекса (операцией удаления навсегда): запись удалённого
+        # объекта верхнего уровня убирается, а у папки, из которой удалили часть, размер измеряется заново
+        changed = False
+        with self.lock:
+            for path in paths:
+                path = os.path.normpath(path)
+                if not is_inside(path, self.trash_path):
+                    continue
+                name = os.path.relpath(path, self.trash_path).split(os.sep)[0]
+                row = self.db.execute('SELECT size FROM items WHERE name = ?', (name,)).fetchone()
+                if row is None:
+                    continue
+                if os.path.lexists(self.trash_file_path(name)):
+                    self.db.execute('UPDATE items SET size = NULL WHERE name = ?', (name,))
+                else:
+                    self.db.execute('DELETE FROM items WHERE name = ?', (name,))
+                    self.count -= 1
+                self.total_size -= row[0] or 0
+                changed = True
+            self.db.commit()
+        return changed
+
+    def original_path(self, trash_file_path):
+        with self.lock:
+            row = self.db.execute('SELECT original_path FROM items WHERE name = ?',
+                                  (self.entry_name(trash_file_path),)).fetchone()
+        return row[0] if row else None
+
+    def restore(self, trash_file_path, new_name=None):
+        name = self.entry_name(trash_file_path)
+
+        with self.lock:
+            row = self.db.execute('SELECT original_path, size FROM items WHERE name = ?', (name,)).fetchone()
+            if not row or not row[0]:
+                raise FileNotFoundError(errno.ENOENT, 'Исходный путь объекта неизвестен', trash_file_path)
+            original_path, size = row
+
+            restored_path = os.path.join(os.path.dirname(original_path), new_name or os.path.basename(original_path))
+            if os.path.lexists(restored_path):
+                raise FileExistsError(errno.EEXIST, 'Объект с таким именем уже существует', restored_path)
+
+            os.makedirs(os.path.dirname(restored_path), exist_ok=True)
+            os.rename(self.trash_file_path(name), restored_path)
+            self.db.execute('DELETE FROM items WHERE name = ?', (name,))
+            self.db.commit()
+            self.total_size -= size or 0
+            self.count -= 1
+        return restored_path
+
+    def items(self):
+        # (имя в корзине, исходный путь, время удаления, размер, каталог ли) - от недавно удалённых к старым
+        with self.lock:
+            return self.db.execute('SELECT name, original_path, deleted_at, size, is_dir FROM items '
+                                   'ORDER BY deleted_at DESC').fetchall()
+
+    def empty(self, reap_path=REAP_PATH):
+        # Вся корзина уходит в каталог на удаление одним rename, на её месте сразу появляется пустая.
+        # Если приложение прервётся посередине, reconcile при запуске сверит записи с тем, что осталось в корзине
+        with self.lock:
+            os.makedirs(reap_path, exist_ok=True)
+            reaped_path = unique_path(os.path.join(reap_path, f'{time.time():.0f}'))
+            os.rename(self.trash_path, reaped_path)
+            os.mkdir(self.trash_path)
+            self.db.execute('DELETE FROM items')
+            self.db.commit()
+            self.total_size = self.count = 0
+        return reaped_path
+
+    def policy(self):
+        # (наибольший размер, наибольший возраст) или None, если правила ещё не сохранялись
+        with self.lock:
+            settings = dict(self.db.execute('SELECT key, value FROM settings'))
+        if not settings:
+            return None
+        return int(settings.get('max_size', 0)), int(settings.get('max_age', 0))
+
+    def set_policy(self, max_size, max_age):
+        with self.lock:
+            self.db.executemany('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                                [('max_size', max_size), ('max_age', max_age)])
+            self.db.commit()
+
+    def evict(self, now=None, reap_path=REAP_PATH):
+        # Самые старые объекты уходят первыми, пока корзина не уложится в правила хранения.
+        # Записи читаются по индексу deleted_at, сама корзина не обходится
+        now = time.time() if now is None else now
+        policy = self.policy()
+        if policy is None:
+            return []
+        max_size, max_age = policy
+        evicted = []
+
+        with self.lock:
+            total_size = self.total_size
+            reaped_path = None
+            # Объекты с неизвестным временем удаления идут последними и по возрасту не вытесняются
+            rows = self.db.execute('SELECT name, original_path, deleted_at, COALESCE(size, 0) FROM items '
+                                   'WHERE deleted_at IS NOT NULL ORDER BY deleted_at').fetchall()
+            rows += self.db.execute('SELECT name, original_path, deleted_at, COALESCE(size, 0) FROM items '
+                                    'WHERE deleted_at IS NULL').fetchall()
+            for name, original_path, deleted_at, size in rows:
+                expired = max_age and deleted_at is not None and deleted_at < now - max_age
+                oversized = max_size and total_size > max_size
+                if not expired and not oversized:
+                    break
+
+                if reaped_path is None:
+                    os.makedirs(reap_path, exist_ok=True)
+                    reaped_path = unique_path(os.path.join(reap_path, f'{now:.0f}'))
+                    os.mkdir(reaped_path)
+                try:
+                    os.rename(self.trash_file_path(name), os.path.join(reaped_path, name))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                self.db.execute('DELETE FROM items WHERE name = ?', (name,))
+                total_size -= size
+                evicted.append((name, original_path, deleted_at, size, 'возраст' if expired else 'размер'))
+
+            self.db.commit()
+            self.total_size = total_size
+            self.count -= len(evicted)
+        return evicted
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class TrashReaper:
+    def __init__(self, reap_path=REAP_PATH):
+        self.reap_path = reap_path
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def reap(self):
+        # Запускается после каждой очистки и при старте: дочищает то, что не успели удалить до выхода
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, daemon=True)
+                self.worker.start()
+
+    def run(self):
+        # В Linux nice действует на вызвавший поток, а не на весь процесс
+        os.nice(REAP_NICENESS)
+        previous = None
+        while True:
+            with self.lock:
+                try:
+                    names = sorted(os.listdir(self.reap_path))
+                except FileNotFoundError:
+                    names = []
+                # То, что не удалось удалить за прошлый проход (например, нет прав), повторно не перебирается
+                if not names or names == previous:
+                    self.worker = None
+                    return
+            previous = names
+            for name in names:
+                shutil.rmtree(os.path.join(self.reap_path, name), ignore_errors=True)
+
+
+class TrashSweeper:
+    def __init__(self, trash_index, reaper, interval=SWEEP_INTERVAL):
+        self.trash_index = trash_index
+        self.reaper = reaper
+        self.interval = interval
+        # Получает список вытесненных объектов (имя, исходный путь, время удаления, размер, причина)
+        self.evicted_callback = None
+        self.woken = threading.Event()
+        self.worker = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.worker.start()
+
+    def wake(self):
+        # После удаления в корзину или смены правил проверка запускается сразу, не дожидаясь интервала
+        self.woken.set()
+
+    def run(self):
+        while True:
+            try:
+                # Без размеров новых объектов корзина казалась бы меньше, чем есть
+                self.trash_index.measure_pending()
+                evicted = self.trash_index.evict()
+            except (OSError, sqlite3.Error):
+                evicted = []
+            if evicted:
+                self.reaper.reap()
+                if self.evicted_callback is not None:
+                    self.evicted_callback(evicted)
+            self.woken.wait(self.interval)
+            self.woken.clear()
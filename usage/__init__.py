@@ -0,0 +1,245 @@
+import heapq
+import os
+
+from PyQt5.QtCore import QObject, QThread, Qt, pyqtSignal
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSpinBox, QTabWidget, QTableWidget,
+    QTableWidgetItem, QProgressBar, QHeaderView
+)
+
+from System.shared import DEFAULT_DIR_CATALOG, format_size, is_inside, scan_directory_sizes
+
+TOP_LIMIT = 50
+# Во сколько раз набор кандидатов больше показываемого топа: запас на удаления без пересканирования
+RESERVE_FACTOR = 4
+
+
+class LargestEntries:
+    def __init__(self, limit=TOP_LIMIT):
+        self.limit = limit
+        self.capacity = limit * RESERVE_FACTOR
+        self.sizes = {}
+        # Мин-куча (размер, путь); устаревшие элементы отбрасываются лениво при вытеснении
+        self.heap = []
+        self.truncated = False
+
+    def push(self, path, size):
+        if path not in self.sizes and len(self.sizes) >= self.capacity:
+            smallest = self.smallest()
+            if size <= smallest[0]:
+                self.truncated = True
+                return
+            heapq.heappop(self.heap)
+            del self.sizes[smallest[1]]
+            self.truncated = True
+
+        self.sizes[path] = size
+        heapq.heappush(self.heap, (size, path))
+        if len(self.heap) > self.capacity * 2:
+            self.heap = [(entry_size, entry_path) for entry_path, entry_size in self.sizes.items()]
+            heapq.heapify(self.heap)
+
+    def smallest(self):
+        while self.sizes.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0]
+
+    def discard(self, path):
+        self.sizes.pop(path, None)
+        for inner_path in [p for p in self.sizes if is_inside(p, path)]:
+            del self.sizes[inner_path]
+
+    @property
+    def stale(self):
+        # Кандидаты за пределами набора были отброшены, после удалений топ может оказаться неполным
+        return self.truncated and len(self.sizes) < self.limit
+
+    def top(self):
+        return heapq.nlargest(self.limit, self.sizes.items(), key=lambda item: item[1])
+
+
+class UsageScanner(QObject):
+    scanned = pyqtSignal(object, object, object)
+
+    def __init__(self, root, limit):
+        super().__init__()
+        self.root = root
+        self.limit = limit
+
+    def run(self):
+        files = LargestEntries(self.limit)
+        directories = LargestEntries(self.limit)
+
+        # Один проход: файлы попадают в топ по ходу обхода, каталоги - после свёртки размеров
+        sizes = scan_directory_sizes(self.root, on_file=files.push)
+        for path, size in sizes.items():
+            if path != self.root:
+                directories.push(path, size)
+
+        self.scanned.emit(files, directories, sizes)
+
+
+class DiskUsageWindow(QWidget):
+    def __init__(self, root=DEFAULT_DIR_CATALOG):
+        super().__init__()
+
+        self.root = os.path.normpath(root)
+        self.files = None
+        self.directories = None
+        self.directory_sizes = {}
+        self.breakdown_path = self.root
+        self.thread = None
+        self.scanner = None
+
+        self.setWindowTitle('Использование диска')
+        self.setGeometry(200, 200, 800, 600)
+
+        layout = QVBoxLayout()
+
+        controls = QHBoxLayout()
+        self.status_label = QLabel()
+        controls.addWidget(self.status_label)
+        controls.addStretch()
+        controls.addWidget(QLabel('Показывать:'))
+        self.limit_input = QSpinBox()
+        self.limit_input.setRange(10, 1000)
+        self.limit_input.setValue(TOP_LIMIT)
+        controls.addWidget(self.limit_input)
+        self.refresh_button = QPushButton('Обновить')
+        self.refresh_button.clicked.connect(self.scan)
+        controls.addWidget(self.refresh_button)
+        layout.addLayout(controls)
+
+        self.tabs = QTabWidget()
+        self.files_table = self.create_table(['Размер', 'Файл'])
+        self.directories_table = self.create_table(['Размер', 'Папка'])
+        self.directories_table.cellDoubleClicked.connect(self.open_breakdown_from_top)
+        self.breakdown_label = QLabel()
+        self.breakdown_table = self.create_table(['Имя', 'Размер', 'Доля'])
+        self.breakdown_table.cellDoubleClicked.connect(self.open_breakdown_child)
+        breakdown = QWidget()
+        breakdown_layout = QVBoxLayout()
+        breakdown_layout.addWidget(self.breakdown_label)
+        breakdown_layout.addWidget(self.breakdown_table)
+        breakdown.setLayout(breakdown_layout)
+        self.tabs.addTab(self.files_table, 'Крупные файлы')
+        self.tabs.addTab(self.directories_table, 'Крупные папки')
+        self.tabs.addTab(breakdown, 'Разбивка по папке')
+        layout.addWidget(self.tabs)
+
+        self.setLayout(layout)
+
+        self.scan()
+
+    def create_table(self, headers):
+        table = QTableWidget()
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        table.setSelectionBehavior(QTableWidget.SelectRows)
+        table.horizontalHeader().setSectionResizeMode(len(headers) - 1, QHeaderView.Stretch)
+        return table
+
+    def scan(self):
+        if self.thread is not None and self.thread.isRunning():
+            return
+
+        self.status_label.setText('Сканирование…')
+        self.refresh_button.setEnabled(False)
+
+        self.scanner = UsageScanner(self.root, self.limit_input.value())
+        self.thread = QThread()
+        self.scanner.moveToThread(self.thread)
+        self.thread.started.connect(self.scanner.run)
+        self.scanner.scanned.connect(self.show_scan)
+        self.scanner.scanned.connect(self.thread.quit)
+        self.thread.start()
+
+    def show_scan(self, files, directories, sizes):
+        self.files = files
+        self.directories = directories
+        self.directory_sizes = sizes
+        self.refresh_button.setEnabled(True)
+        self.status_label.setText(f'Всего в {self.root}: {format_size(sizes.get(self.root, 0))}')
+        self.show_top()
+        self.show_breakdown(self.breakdown_path)
+
+    def show_top(self):
+        for table, entries in (self.files_table, self.files), (self.directories_table, self.directories):
+            top = entries.top()
+            table.setRowCount(len(top))
+            for row, (path, size) in enumerate(top):
+                size_item = QTableWidgetItem(format_size(size))
+                size_item.setData(Qt.UserRole, path)
+                table.setItem(row, 0, size_item)
+                table.setItem(row, 1, QTableWidgetItem(os.path.relpath(path, self.root)))
+
+    def show_breakdown(self, path):
+        self.breakdown_path = path
+        children = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            size = self.directory_sizes.get(entry.path, 0)
+                        else:
+                            size = entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+                    children.append((entry.name, entry.path, size))
+        except OSError:
+            pass
+
+        children.sort(key=lambda child: child[2], reverse=True)
+        total = sum(child[2] for child in children) or 1
+
+        self.breakdown_label.setText(f'{path} (двойной щелчок - открыть вложенную папку)')
+        self.breakdown_table.setRowCount(len(children))
+        for row, (name, child_path, size) in enumerate(children):
+            name_item = QTableWidgetItem(name)
+            name_item.setData(Qt.UserRole, child_path)
+            self.breakdown_table.setItem(row, 0, name_item)
+            self.breakdown_table.setItem(row, 1, QTableWidgetItem(format_size(size)))
+            share = QProgressBar()
+            share.setRange(0, 1000)
+            share.setValue(int(size * 1000 / total))
+            share.setFormat(f'{size * 100 / total:.1f}%')
+            self.breakdown_table.setCellWidget(row, 2, share)
+
+    def open_breakdown_from_top(self, row, _column):
+        self.show_breakdown(self.directories_table.item(row, 0).data(Qt.UserRole))
+        self.tabs.setCurrentIndex(2)
+
+    def open_breakdown_child(self, row, _column):
+        path = self.breakdown_table.item(row, 0).data(Qt.UserRole)
+        if os.path.isdir(path):
+            self.show_breakdown(path)
+
+    def update_paths(self, paths):
+        if self.files is None:
+            return
+
+        for path in paths:
+            path = os.path.normpath(path)
+            self.files.discard(path)
+            self.directories.discard(path)
+            if os.path.isfile(path) and not os.path.islink(path):
+                self.files.push(path, os.path.getsize(path))
+
+        if self.files.stale or self.directories.stale:
+            self.scan()
+        else:
+            self.show_top()
+
+    def update_directory_sizes(self, sizes):
+        if self.directories is None:
+            return
+
+        self.directory_sizes.update(sizes)
+        for path, size in sizes.items():
+            if path != self.root:
+                self.directories.push(path, size)
+        self.show_top()
+        if self.breakdown_path in sizes or any(os.path.dirname(p) == self.breakdown_path for p in sizes):
+            self.show_breakdown(self.breakdown_path)